@@ -0,0 +1,154 @@
+from functools import cache
+from app.engine.store import airline_prefix
+
+GROUPS = ("airport", "airline", "class")
+
+
+@cache
+def aircraft_class(plane_type):
+    """Coarse aircraft class: "regional", "narrow-body" or "wide-body"."""
+    if any(x in plane_type for x in ["Dash 8", "E195"]):
+        return "regional"
+    if any(x in plane_type for x in ["787", "777", "767", "A330", "A300"]):
+        return "wide-body"
+    return "narrow-body"
+
+
+class _Totals:
+    __slots__ = ("flights", "passengers", "cargo", "altitude_sum", "involved")
+
+    def __init__(self):
+        self.flights = 0
+        self.passengers = 0
+        self.cargo = 0
+        self.altitude_sum = 0
+        self.involved = 0
+
+    def add(self, flight, sign):
+        self.flights += sign
+        self.passengers += sign * flight["passengers"]
+        self.cargo += sign * bool(flight["is_cargo"])
+        self.altitude_sum += sign * flight["altitude"]
+
+    def to_dict(self):
+        return {
+            "flights": self.flights,
+            "passengers": self.passengers,
+            "cargo_flights": self.cargo,
+            "avg_altitude": (
+                round(self.altitude_sum / self.flights, 0) if self.flights else 0
+            ),
+            "conflict_flights": self.involved,
+        }
+
+
+class StatsAggregator:
+    """Running dashboard totals, overall and grouped, kept up to date in place.
+
+    Holds counts and sums (flights, passengers, cargo flights, altitude)
+    for the whole schedule and per group value: airport (a flight counts at
+    both ends), airline and aircraft class. Conflicts are kept as a set of
+    partners per flight, so the number of unique conflict pairs and of
+    flights involved in one are known without a rescan.
+
+    ``replace_flight`` and ``set_partners`` cost O(1) and O(pairs touched);
+    only construction walks every flight and conflict.
+    """
+
+    def __init__(self, flights, conflicts=()):
+        self.total = _Totals()
+        self.groups = {name: {} for name in GROUPS}
+        self._keys = {}
+        self._partners = {}
+        self.pairs = 0
+        for f in flights:
+            self.add_flight(f)
+        for c in conflicts:
+            self._link(c["acid1"], c["acid2"])
+
+    def _group_keys(self, flight):
+        airports = {flight["departure airport"], flight["arrival airport"]}
+        return (
+            [("airport", a) for a in sorted(airports)]
+            + [("airline", airline_prefix(flight["ACID"]))]
+            + [("class", aircraft_class(flight["Plane type"]))]
+        )
+
+    def _buckets(self, acid):
+        return [self.groups[name][key] for name, key in self._keys[acid]]
+
+    def _apply(self, flight, sign):
+        self.total.add(flight, sign)
+        for bucket in self._buckets(flight["ACID"]):
+            bucket.add(flight, sign)
+
+    def add_flight(self, flight):
+        acid = flight["ACID"]
+        self._keys[acid] = keys = self._group_keys(flight)
+        for name, key in keys:
+            if key not in self.groups[name]:
+                self.groups[name][key] = _Totals()
+        self._apply(flight, 1)
+
+    def replace_flight(self, old_flight, new_flight):
+        """Swaps one flight record for its changed version (same ACID)."""
+        acid = new_flight["ACID"]
+        involved = bool(self._partners.get(acid))
+        if involved:
+            self._count_involved(acid, -1)
+        self._apply(old_flight, -1)
+        self.add_flight(new_flight)
+        if involved:
+            self._count_involved(acid, 1)
+
+    def _count_involved(self, acid, sign):
+        self.total.involved += sign
+        for bucket in self._buckets(acid):
+            bucket.involved += sign
+
+    def _link(self, a, b):
+        for x, y in ((a, b), (b, a)):
+            partners = self._partners.setdefault(x, set())
+            if y in partners:
+                return
+            if not partners:
+                self._count_involved(x, 1)
+            partners.add(y)
+        self.pairs += 1
+
+    def _unlink(self, a, b):
+        self.pairs -= 1
+        for x, y in ((a, b), (b, a)):
+            partners = self._partners[x]
+            partners.discard(y)
+            if not partners:
+                self._count_involved(x, -1)
+
+    def set_partners(self, acid, partners):
+        """Replaces the conflict pairs of one flight with ``partners``."""
+        for other in list(self._partners.get(acid, ())):
+            self._unlink(acid, other)
+        for other in partners:
+            if other != acid:
+                self._link(acid, other)
+
+    def summary(self):
+        """Schedule-wide totals in the shape of the dashboard stats."""
+        total = self.total.to_dict()
+        return {
+            "total_flights": total["flights"],
+            "total_passengers": total["passengers"],
+            "cargo_flights": total["cargo_flights"],
+            "avg_altitude": total["avg_altitude"],
+            "conflict_pairs": self.pairs,
+        }
+
+    def grouped(self, name):
+        """Rows per value of group ``name``, busiest first."""
+        rows = [
+            {"key": key, **bucket.to_dict()}
+            for key, bucket in self.groups[name].items()
+            if bucket.flights
+        ]
+        rows.sort(key=lambda r: (-r["flights"], r["key"]))
+        return rows
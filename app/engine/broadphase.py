@@ -0,0 +1,275 @@
+import numpy as np
+from math import ceil, cos, radians, tan
+from app.engine.geometry import EARTH_RADIUS_NM, GreatCircleMotion, haversine_vec
+
+
+class SpatioTemporalIndex:
+    """Broad-phase index over flight legs.
+
+    Every leg is cut into fixed time windows; each slice is hashed into the
+    lat/lon grid cells covered by its (separation-padded) bounding box and
+    into a flight-level band. Two legs can only be in conflict if they share
+    a window, a cell and the same or an adjacent band, so only those pairs are
+    handed to the exact test.
+
+    The padding follows the linear lon/lat model used by the quadratic prune
+    in ``check_pair_conflict``, so any pair that could produce a candidate
+    interval there is guaranteed to be reported here. With ``geodesic`` set,
+    slices follow the great circle path instead (the "exact" separation
+    method), padded by how far the path can bow away from a straight lat/lon
+    segment within one window.
+
+    Leg columns are referenced, not copied: after legs are changed in place,
+    call ``refresh_rows`` for the affected rows.
+    """
+
+    # Packed key layout: window | band | lat cell | lon cell
+    BAND_OFFSET = 64
+    BANDS = 256
+
+    def __init__(
+        self,
+        t0,
+        t1,
+        alt,
+        lat0,
+        lon0,
+        lat1,
+        lon1,
+        owner,
+        window_sec=600.0,
+        cell_deg=1.0,
+        sep_nm=5.0,
+        vsep_ft=2000.0,
+        geodesic=False,
+    ):
+        self.t0 = np.asarray(t0, dtype=np.float64)
+        self.t1 = np.asarray(t1, dtype=np.float64)
+        self.alt = np.asarray(alt, dtype=np.float64)
+        self.lat0 = np.asarray(lat0, dtype=np.float64)
+        self.lon0 = np.asarray(lon0, dtype=np.float64)
+        self.lat1 = np.asarray(lat1, dtype=np.float64)
+        self.lon1 = np.asarray(lon1, dtype=np.float64)
+        self.owner = np.asarray(owner, dtype=np.int64)
+        self.window_sec = window_sec
+        self.cell_deg = cell_deg
+        self.sep_nm = sep_nm
+        self.vsep_ft = vsep_ft
+        self.geodesic = geodesic
+
+        self._lat_offset = ceil(91.0 / cell_deg) + 1
+        self._lon_offset = ceil(400.0 / cell_deg) + 1
+        self._lon_cells = 2 * self._lon_offset + 1
+        self._band_stride = (2 * self._lat_offset + 1) * self._lon_cells
+
+        self._max_lat = self._abs_lat(self.lat0, self.lat1)
+        self._rebuild()
+
+    @staticmethod
+    def _abs_lat(lat0, lat1):
+        if len(lat0) == 0:
+            return 0.0
+        return float(max(np.abs(lat0).max(), np.abs(lat1).max()))
+
+    def _margins(self, extra_nm=0.0):
+        # The prune scales longitude by cos(mean start latitude), which is
+        # never smaller than cos of the largest latitude involved.
+        cos_lat = max(cos(radians(min(self._max_lat, 89.0))), 1e-3)
+        lat_margin = (self.sep_nm + extra_nm) / 60.0 + 1e-9
+        lon_margin = (self.sep_nm + extra_nm) / (60.0 * cos_lat) + 1e-9
+        return lat_margin, lon_margin
+
+    def _rebuild(self):
+        keys, ids = self._hash(
+            np.arange(len(self.t0)),
+            self.t0,
+            self.t1,
+            self.alt,
+            self.lat0,
+            self.lon0,
+            self.lat1,
+            self.lon1,
+        )
+        order = np.argsort(keys, kind="stable")
+        self._keys = keys[order]
+        self._ids = ids[order]
+
+    def _hash(self, ids, t0, t1, alt, lat0, lon0, lat1, lon1):
+        """Returns (packed key, leg id) entries for every window/cell a leg touches."""
+        live = t1 > t0
+        ids, t0, t1, alt = ids[live], t0[live], t1[live], alt[live]
+        lat0, lon0, lat1, lon1 = lat0[live], lon0[live], lat1[live], lon1[live]
+        if len(ids) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+        # 1. Split legs into time windows
+        w = self.window_sec
+        b0 = np.floor(t0 / w).astype(np.int64)
+        b1 = np.floor(t1 / w).astype(np.int64)
+        n_slices = b1 - b0 + 1
+        leg = np.repeat(np.arange(len(ids)), n_slices)
+        starts = np.cumsum(n_slices) - n_slices
+        bucket = b0[leg] + np.arange(len(leg)) - np.repeat(starts, n_slices)
+
+        ts = np.maximum(t0[leg], bucket * w)
+        te = np.minimum(t1[leg], (bucket + 1) * w)
+        dur = t1[leg] - t0[leg]
+        fs = (ts - t0[leg]) / dur
+        fe = (te - t0[leg]) / dur
+        if self.geodesic:
+            # Consecutive slices of a leg share a boundary: interpolate each
+            # boundary once (slice k spans points k and k + 1 of its leg)
+            at = starts + np.arange(len(ids))  # first point of each leg
+            at = at[leg] + np.arange(len(leg)) - starts[leg]
+            point_leg = np.repeat(np.arange(len(ids)), n_slices + 1)
+            point_f = np.ones(len(point_leg))
+            point_f[at] = fs
+            # Leg time measured in fractions of the leg
+            ones = np.ones(len(ids))
+            motion = GreatCircleMotion(lat0, lon0, lat1, lon1, 0.0 * ones, ones)
+            lat_p, lon_p = motion.take(point_leg).lat_lon(point_f)
+            lat_s, lon_s = lat_p[at], lon_p[at]
+            lat_e, lon_e = lat_p[at + 1], lon_p[at + 1]
+            # A great circle arc of length L bows at most ~L^2 tan(lat) / 8R
+            # away from the straight lat/lon segment between its ends; pad
+            # by twice that. Both sides of a pair carry the full separation
+            # margin, which also absorbs paths bulging poleward of their ends.
+            length = haversine_vec(lat_s, lon_s, lat_e, lon_e)
+            tan_lat = tan(radians(min(self._max_lat, 85.0)))
+            bow_nm = length**2 * tan_lat / (4.0 * EARTH_RADIUS_NM)
+        else:
+            dlat = lat1[leg] - lat0[leg]
+            dlon = lon1[leg] - lon0[leg]
+            lat_s = lat0[leg] + dlat * fs
+            lat_e = lat0[leg] + dlat * fe
+            lon_s = lon0[leg] + dlon * fs
+            lon_e = lon0[leg] + dlon * fe
+            bow_nm = 0.0
+
+        # 2. Grid cells covered by each padded slice
+        lat_margin, lon_margin = self._margins(bow_nm)
+        c = self.cell_deg
+        cy0 = np.floor((np.minimum(lat_s, lat_e) - lat_margin) / c).astype(np.int64)
+        cy1 = np.floor((np.maximum(lat_s, lat_e) + lat_margin) / c).astype(np.int64)
+        cx0 = np.floor((np.minimum(lon_s, lon_e) - lon_margin) / c).astype(np.int64)
+        cx1 = np.floor((np.maximum(lon_s, lon_e) + lon_margin) / c).astype(np.int64)
+        ny = cy1 - cy0 + 1
+        nx = cx1 - cx0 + 1
+        n_cells = ny * nx
+
+        sl = np.repeat(np.arange(len(leg)), n_cells)
+        starts = np.cumsum(n_cells) - n_cells
+        k = np.arange(len(sl)) - np.repeat(starts, n_cells)
+        cy = cy0[sl] + k // nx[sl]
+        cx = cx0[sl] + k % nx[sl]
+        # Out-of-range bands are clamped, which only adds candidates
+        band = np.clip(
+            np.floor(alt[leg[sl]] / self.vsep_ft).astype(np.int64),
+            1 - self.BAND_OFFSET,
+            self.BANDS - self.BAND_OFFSET - 2,
+        )
+
+        key = (bucket[sl] * self.BANDS + band + self.BAND_OFFSET) * self._band_stride
+        key += (cy + self._lat_offset) * self._lon_cells + cx + self._lon_offset
+        return key, ids[leg[sl]]
+
+    def _match(self, keys_a, ids_a):
+        """(a, indexed) id pairs sharing a window, a cell and a nearby band."""
+        ia_list, ib_list = [], []
+        for shift in (-1, 0, 1):
+            shifted = keys_a + shift * self._band_stride
+            lo = np.searchsorted(self._keys, shifted, "left")
+            hi = np.searchsorted(self._keys, shifted, "right")
+            counts = hi - lo
+            total = int(counts.sum())
+            ia_list.append(np.repeat(ids_a, counts))
+            starts = np.cumsum(counts) - counts
+            pos = np.repeat(lo - starts, counts) + np.arange(total)
+            ib_list.append(self._ids[pos])
+        return np.concatenate(ia_list), np.concatenate(ib_list)
+
+    def _exact_filter(self, ia, ib, t0_a, t1_a, alt_a):
+        t_start = np.maximum(t0_a[ia], self.t0[ib])
+        t_end = np.minimum(t1_a[ia], self.t1[ib])
+        keep = (t_start < t_end) & (np.abs(alt_a[ia] - self.alt[ib]) < self.vsep_ft)
+        return ia[keep], ib[keep]
+
+    @property
+    def nbytes(self):
+        return self._keys.nbytes + self._ids.nbytes
+
+    def leg_pairs(self):
+        """Candidate leg pairs (i, j) from different flights, i < j, sorted."""
+        ia, ib = self._match(self._keys, self._ids)
+        keep = (ia < ib) & (self.owner[ia] != self.owner[ib])
+        ia, ib = ia[keep], ib[keep]
+        n = len(self.t0)
+        uniq = np.unique(ia * n + ib)
+        ia, ib = uniq // n, uniq % n
+        return self._exact_filter(ia, ib, self.t0, self.t1, self.alt)
+
+    def flight_pairs(self):
+        """Candidate flight pairs (owner_i, owner_j), owner_i < owner_j, sorted."""
+        ia, ib = self.leg_pairs()
+        fa, fb = self.owner[ia], self.owner[ib]
+        lo, hi = np.minimum(fa, fb), np.maximum(fa, fb)
+        n = int(self.owner.max()) + 1 if len(self.owner) else 1
+        uniq = np.unique(lo * n + hi)
+        return uniq // n, uniq % n
+
+    def query(self, t0, t1, alt, lat0, lon0, lat1, lon1):
+        """Candidate pairs between external query legs and the indexed legs.
+
+        Returns (query leg index, indexed leg index) arrays sorted by both.
+        """
+        t0 = np.asarray(t0, dtype=np.float64)
+        t1 = np.asarray(t1, dtype=np.float64)
+        alt = np.asarray(alt, dtype=np.float64)
+        lat0 = np.asarray(lat0, dtype=np.float64)
+        lon0 = np.asarray(lon0, dtype=np.float64)
+        lat1 = np.asarray(lat1, dtype=np.float64)
+        lon1 = np.asarray(lon1, dtype=np.float64)
+        empty = np.empty(0, dtype=np.int64)
+        if len(t0) == 0:
+            return empty, empty
+
+        max_lat = self._abs_lat(lat0, lat1)
+        if max_lat > self._max_lat:
+            # Legs further from the equator need a wider longitude pad;
+            # rehash the index with it so the test stays conservative.
+            self._max_lat = max_lat
+            self._rebuild()
+
+        keys, ids = self._hash(np.arange(len(t0)), t0, t1, alt, lat0, lon0, lat1, lon1)
+        qa, ib = self._match(keys, ids)
+        n = len(self.t0)
+        uniq = np.unique(qa * n + ib)
+        qa, ib = uniq // n, uniq % n
+        return self._exact_filter(qa, ib, t0, t1, alt)
+
+    def refresh_rows(self, rows):
+        """Re-hashes the legs in ``rows`` after their columns changed in place."""
+        rows = np.asarray(rows, dtype=np.int64)
+        max_lat = self._abs_lat(self.lat0[rows], self.lat1[rows])
+        if max_lat > self._max_lat:
+            self._max_lat = max_lat
+            self._rebuild()
+            return
+
+        keep = ~np.isin(self._ids, rows)
+        keys, ids = self._hash(
+            rows,
+            self.t0[rows],
+            self.t1[rows],
+            self.alt[rows],
+            self.lat0[rows],
+            self.lon0[rows],
+            self.lat1[rows],
+            self.lon1[rows],
+        )
+        order = np.argsort(keys, kind="stable")
+        keys, ids = keys[order], ids[order]
+        old_keys, old_ids = self._keys[keep], self._ids[keep]
+        pos = np.searchsorted(old_keys, keys, "right")
+        self._keys = np.insert(old_keys, pos, keys)
+        self._ids = np.insert(old_ids, pos, ids)
@@ -0,0 +1,46 @@
+import numpy as np
+
+
+def airborne_intervals(legs):
+    """(takeoff, landing) time arrays, one entry per flight that has legs."""
+    starts = legs.offsets[:-1]
+    stops = legs.offsets[1:]
+    flying = stops > starts
+    return legs.t0[starts[flying]], legs.t1[stops[flying] - 1]
+
+
+def peak_occupancy(takeoff, landing):
+    """Exact maximum number of simultaneously airborne flights.
+
+    Sweeps takeoff (+1) and landing (-1) events in time order. Flights are
+    airborne over [takeoff, landing), so landings at a given instant are
+    applied before takeoffs. Returns (peak count, time the peak starts).
+    """
+    if len(takeoff) == 0:
+        return 0, None
+    times = np.concatenate([takeoff, landing])
+    deltas = np.concatenate(
+        [np.ones(len(takeoff), dtype=np.int64), -np.ones(len(landing), dtype=np.int64)]
+    )
+    order = np.lexsort((deltas, times))
+    counts = np.cumsum(deltas[order])
+    peak = int(np.argmax(counts))
+    return int(counts[peak]), float(times[order][peak])
+
+
+def occupancy_series(takeoff, landing, step_sec=60, start=None, end=None):
+    """Airborne flight count sampled every ``step_sec`` seconds.
+
+    Returns (times, counts) arrays covering [start, end], which default to
+    the first takeoff and last landing rounded to whole steps.
+    """
+    if len(takeoff) == 0:
+        return np.empty(0), np.empty(0, dtype=np.int64)
+    if start is None:
+        start = np.floor(takeoff.min() / step_sec) * step_sec
+    if end is None:
+        end = np.ceil(landing.max() / step_sec) * step_sec
+    times = np.arange(start, end + step_sec, step_sec, dtype=np.float64)
+    up = np.searchsorted(np.sort(takeoff), times, "right")
+    down = np.searchsorted(np.sort(landing), times, "right")
+    return times, up - down
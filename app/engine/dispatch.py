@@ -0,0 +1,172 @@
+import asyncio
+import threading
+import weakref
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+
+class DeadlineExceeded(Exception):
+    """An engine call did not finish within its request deadline."""
+
+    def __init__(self, op, timeout):
+        super().__init__(f"{op} did not finish within {timeout:g}s")
+        self.op = op
+        self.timeout = timeout
+
+
+class ReadWriteLock:
+    """Many concurrent readers or one writer; waiting writers block new readers."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    def acquire_read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._cond:
+            self._readers -= 1
+            if self._readers == 0:
+                self._cond.notify_all()
+
+    @contextmanager
+    def reading(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    def acquire_write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+
+class EngineDispatcher:
+    """Runs blocking engine calls on a thread pool for async routes.
+
+    Each operation name has its own concurrency limit (``limits``, falling
+    back to ``default_limit``) and deadline (``deadlines``). Calls given a
+    ``key`` are coalesced: while one is in flight, identical calls await the
+    same result instead of computing it again. Calls given an ``engine``
+    hold that engine's lock (``lock_for``): ``write`` calls exclusively,
+    others shared, so a write on one engine never stalls readers of another.
+    Calls without an engine take no lock. A ``profiler``
+    (``metrics.SlowCallProfiler``) wraps every call, named by operation.
+    """
+
+    def __init__(
+        self,
+        max_workers=4,
+        limits=None,
+        default_limit=4,
+        deadlines=None,
+        default_deadline=None,
+        profiler=None,
+    ):
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="engine"
+        )
+        self.limits = dict(limits or {})
+        self.default_limit = default_limit
+        self.deadlines = dict(deadlines or {})
+        self.default_deadline = default_deadline
+        self.profiler = profiler
+        self._locks = weakref.WeakKeyDictionary()
+        self._locks_guard = threading.Lock()
+        self._semaphores = {}
+        self._in_flight = {}
+
+    def lock_for(self, engine):
+        """The ReadWriteLock of ``engine``, dropped along with the engine."""
+        with self._locks_guard:
+            lock = self._locks.get(engine)
+            if lock is None:
+                lock = self._locks[engine] = ReadWriteLock()
+            return lock
+
+    def _semaphore(self, op):
+        sem = self._semaphores.get(op)
+        if sem is None:
+            sem = asyncio.Semaphore(self.limits.get(op, self.default_limit))
+            self._semaphores[op] = sem
+        return sem
+
+    def _call(self, op, write, engine, fn, args):
+        if self.profiler is not None:
+            fn, args = self.profiler.call, (op, fn, *args)
+        if engine is None:
+            return fn(*args)
+        lock = self.lock_for(engine)
+        if write:
+            lock.acquire_write()
+            try:
+                return fn(*args)
+            finally:
+                lock.release_write()
+        lock.acquire_read()
+        try:
+            return fn(*args)
+        finally:
+            lock.release_read()
+
+    async def _run(self, op, write, engine, fn, args):
+        async with self._semaphore(op):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.executor, self._call, op, write, engine, fn, args
+            )
+
+    async def run(
+        self, op, fn, *args, key=None, engine=None, write=False, timeout=None
+    ):
+        """Awaits ``fn(*args)`` run off the event loop.
+
+        Raises ``DeadlineExceeded`` if the result (including time spent
+        waiting for a slot) takes longer than the deadline. The call itself
+        keeps running so that coalesced callers still receive its result.
+        """
+        if timeout is None:
+            timeout = self.deadlines.get(op, self.default_deadline)
+
+        task = None
+        if key is not None:
+            task = self._in_flight.get((op, key))
+        if task is None:
+            task = asyncio.ensure_future(self._run(op, write, engine, fn, args))
+            if key is not None:
+                self._in_flight[(op, key)] = task
+            task.add_done_callback(lambda t: self._finished(op, key, t))
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(op, timeout) from None
+
+    def _finished(self, op, key, task):
+        if key is not None:
+            self._in_flight.pop((op, key), None)
+        # Mark errors as retrieved when every caller already timed out
+        if not task.cancelled():
+            task.exception()
+
+    def in_flight(self):
+        return len(self._in_flight)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,145 @@
+import numpy as np
+from app.engine.store import airline_prefix
+
+DAY_SEC = 86400
+
+
+class FlightTable:
+    """Columnar flight attributes indexed for filtered, sorted paging.
+
+    Categorical columns (departure and arrival airport, airline, aircraft
+    type) are dictionary encoded, with a packed bitmap of the flights
+    holding each value. Numeric columns keep an argsort, so a range filter
+    is a pair of binary searches. A query ANDs the bitmaps of its filters,
+    then walks the precomputed order of the sort key, keeping the flights
+    that match; cost is O(N / 8) for the bitmaps plus one pass over the
+    order, with no per-flight Python work. Rows are flight indexes.
+    """
+
+    CATEGORIES = ("dep", "arr", "airline", "type")
+    SORT_KEYS = ("acid", "departure", "altitude", "speed", "type", "dep", "arr")
+
+    def __init__(self, flights, involved=None):
+        n = len(flights)
+        self.n = n
+        acid = np.array([f["ACID"] for f in flights], dtype=np.str_)
+        self.departure = np.array(
+            [f["departure time"] for f in flights], dtype=np.float64
+        )
+        self.altitude = np.array([f["altitude"] for f in flights], dtype=np.float64)
+        self.speed = np.array([f["aircraft speed"] for f in flights], dtype=np.float64)
+        columns = {
+            "dep": [f["departure airport"] for f in flights],
+            "arr": [f["arrival airport"] for f in flights],
+            "airline": [airline_prefix(f["ACID"]) for f in flights],
+            "type": [f["Plane type"] for f in flights],
+        }
+
+        self._values = {}
+        self._codes = {}
+        self._bitmaps = {}
+        for name, values in columns.items():
+            uniq, codes = np.unique(
+                np.asarray(values, dtype=np.str_).reshape(n), return_inverse=True
+            )
+            self._values[name] = {v: k for k, v in enumerate(uniq.tolist())}
+            self._codes[name] = codes
+            self._bitmaps[name] = [np.packbits(codes == k) for k in range(len(uniq))]
+        self._involved = np.packbits(
+            np.zeros(n, dtype=bool) if involved is None else np.asarray(involved)
+        )
+
+        # Sort orders; codes follow value order, so they sort like the names
+        self._orders = {
+            "acid": np.argsort(acid, kind="stable"),
+            "departure": np.argsort(self.departure, kind="stable"),
+            "altitude": np.argsort(self.altitude, kind="stable"),
+            "speed": np.argsort(self.speed, kind="stable"),
+        }
+        for name in ("type", "dep", "arr"):
+            self._orders[name] = np.argsort(self._codes[name], kind="stable")
+        time_of_day = self.departure % DAY_SEC
+        tod_order = np.argsort(time_of_day, kind="stable")
+        self._ranges = {
+            "time_of_day": (tod_order, time_of_day[tod_order]),
+            "altitude": (
+                self._orders["altitude"],
+                self.altitude[self._orders["altitude"]],
+            ),
+        }
+
+    def values(self, name):
+        """Distinct values of a categorical column, sorted."""
+        return list(self._values[name])
+
+    def _category(self, name, value):
+        k = self._values[name].get(value)
+        if k is None:
+            return np.zeros((self.n + 7) // 8, dtype=np.uint8)
+        return self._bitmaps[name][k]
+
+    def _range(self, column, lo=None, hi=None):
+        order, values = self._ranges[column]
+        a = 0 if lo is None else int(np.searchsorted(values, lo, "left"))
+        b = self.n if hi is None else int(np.searchsorted(values, hi, "right"))
+        mask = np.zeros(self.n, dtype=bool)
+        mask[order[a:b]] = True
+        return np.packbits(mask)
+
+    def query(
+        self,
+        sort="departure",
+        descending=False,
+        offset=0,
+        limit=20,
+        dep=None,
+        arr=None,
+        airport=None,
+        airline=None,
+        type=None,
+        alt_min=None,
+        alt_max=None,
+        time_from=None,
+        time_to=None,
+        conflict=None,
+    ):
+        """One page of matching flights as (flight indexes, total matches).
+
+        ``airport`` matches either end. ``time_from``/``time_to`` are UTC
+        seconds of the day, inclusive, compared with the departure time;
+        a range ending before it starts wraps past midnight. ``conflict``
+        True/False keeps flights with/without a conflict. Equal sort keys
+        keep file order (reversed when ``descending``).
+        """
+        bits = []
+        for name, value in (("dep", dep), ("arr", arr), ("airline", airline)):
+            if value:
+                bits.append(self._category(name, value))
+        if type:
+            bits.append(self._category("type", type))
+        if airport:
+            bits.append(self._category("dep", airport) | self._category("arr", airport))
+        if alt_min is not None or alt_max is not None:
+            bits.append(self._range("altitude", alt_min, alt_max))
+        if time_from is not None or time_to is not None:
+            if time_from is not None and time_to is not None and time_to < time_from:
+                bits.append(
+                    self._range("time_of_day", time_from, None)
+                    | self._range("time_of_day", None, time_to)
+                )
+            else:
+                bits.append(self._range("time_of_day", time_from, time_to))
+        if conflict is not None:
+            bits.append(self._involved if conflict else ~self._involved)
+
+        order = self._orders[sort]
+        if descending:
+            order = order[::-1]
+        if not bits:
+            return order[offset : offset + limit], self.n
+        combined = bits[0]
+        for b in bits[1:]:
+            combined = combined & b
+        mask = np.unpackbits(combined, count=self.n).view(bool)
+        hits = order[mask[order]]
+        return hits[offset : offset + limit], len(hits)
@@ -0,0 +1,331 @@
+import numpy as np
+from math import radians, cos, sin, asin, sqrt, atan2, degrees
+
+# Radius of Earth in nautical miles is approximately 3440.06
+EARTH_RADIUS_NM = 3440.06
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Calculate the great circle distance between two points in nautical miles."""
+    # Convert decimal degrees to radians
+    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
+    # Haversine formula
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
+    c = 2 * asin(sqrt(a))
+    nm = EARTH_RADIUS_NM * c
+    return nm
+
+
+def interpolate_position(start_lat, start_lon, end_lat, end_lon, fraction):
+    """Interpolate position along a great circle path."""
+    if fraction <= 0:
+        return start_lat, start_lon
+    if fraction >= 1:
+        return end_lat, end_lon
+
+    lat1, lon1, lat2, lon2 = map(radians, [start_lat, start_lon, end_lat, end_lon])
+
+    # Distance between points
+    d = 2 * asin(
+        sqrt(
+            sin((lat1 - lat2) / 2) ** 2
+            + cos(lat1) * cos(lat2) * sin((lon1 - lon2) / 2) ** 2
+        )
+    )
+
+    A = sin((1 - fraction) * d) / sin(d)
+    B = sin(fraction * d) / sin(d)
+
+    x = A * cos(lat1) * cos(lon1) + B * cos(lat2) * cos(lon2)
+    y = A * cos(lat1) * sin(lon1) + B * cos(lat2) * sin(lon2)
+    z = A * sin(lat1) + B * sin(lat2)
+
+    lat = atan2(z, sqrt(x**2 + y**2))
+    lon = atan2(y, x)
+
+    return degrees(lat), degrees(lon)
+
+
+def haversine_vec(lat1, lon1, lat2, lon2):
+    """Vectorized haversine over arrays of points, in nautical miles."""
+    lat1, lon1, lat2, lon2 = (
+        np.radians(np.asarray(x, dtype=np.float64)) for x in (lat1, lon1, lat2, lon2)
+    )
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return EARTH_RADIUS_NM * 2 * np.arcsin(np.sqrt(a))
+
+
+def interpolate_position_vec(start_lat, start_lon, end_lat, end_lon, fraction):
+    """Vectorized great circle interpolation. Returns (lat, lon) arrays.
+
+    Fractions are clamped to the segment ends like ``interpolate_position``.
+    """
+    start_lat, start_lon, end_lat, end_lon, fraction = np.broadcast_arrays(
+        *(
+            np.asarray(x, dtype=np.float64)
+            for x in (start_lat, start_lon, end_lat, end_lon, fraction)
+        )
+    )
+    lat1, lon1, lat2, lon2 = (
+        np.radians(x) for x in (start_lat, start_lon, end_lat, end_lon)
+    )
+    d = 2 * np.arcsin(
+        np.sqrt(
+            np.sin((lat1 - lat2) / 2) ** 2
+            + np.cos(lat1) * np.cos(lat2) * np.sin((lon1 - lon2) / 2) ** 2
+        )
+    )
+
+    inside = (fraction > 0) & (fraction < 1) & (d > 0)
+    sin_d = np.where(inside, np.sin(d), 1.0)
+    f = np.where(inside, fraction, 0.0)
+    A = np.sin((1 - f) * d) / sin_d
+    B = np.sin(f * d) / sin_d
+
+    x = A * np.cos(lat1) * np.cos(lon1) + B * np.cos(lat2) * np.cos(lon2)
+    y = A * np.cos(lat1) * np.sin(lon1) + B * np.cos(lat2) * np.sin(lon2)
+    z = A * np.sin(lat1) + B * np.sin(lat2)
+
+    lat = np.degrees(np.arctan2(z, np.sqrt(x**2 + y**2)))
+    lon = np.degrees(np.arctan2(y, x))
+
+    # Degenerate (zero length) segments stay on their start point
+    at_start = (fraction <= 0) | ((fraction < 1) & (d <= 0))
+    lat = np.where(at_start, start_lat, np.where(fraction >= 1, end_lat, lat))
+    lon = np.where(at_start, start_lon, np.where(fraction >= 1, end_lon, lon))
+    return lat, lon
+
+
+def parse_waypoints(tokens):
+    """Vectorized version of ``FlightEngine.parse_waypoint``.
+
+    Takes an array of "49.97N/110.935W" strings, returns (lat, lon) arrays.
+    """
+    tokens = np.asarray(tokens, dtype=np.str_)
+    if tokens.size == 0:
+        return np.empty(0), np.empty(0)
+    lat_str, _, lon_str = np.strings.partition(tokens, "/")
+    lat = np.strings.slice(lat_str, 0, -1).astype(np.float64)
+    lon = np.strings.slice(lon_str, 0, -1).astype(np.float64)
+    lat = np.where(np.strings.endswith(lat_str, "S"), -lat, lat)
+    lon = np.where(np.strings.endswith(lon_str, "W"), -lon, lon)
+    return lat, lon
+
+
+def unit_vectors(lat, lon):
+    """ECEF unit vectors (n x 3) of points given in degrees."""
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.stack(
+        [cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=-1
+    )
+
+
+class GreatCircleMotion:
+    """Constant-speed motion along great circle legs, as ECEF unit vectors.
+
+    The position at time t is ``cos(r (t - t0)) u + sin(r (t - t0)) v``:
+    ``u`` is the leg start, ``v`` the unit tangent towards the leg end and
+    ``r`` the angular rate. Inside a leg's time span this is the same path
+    and timing as ``interpolate_position_vec``.
+    """
+
+    def __init__(self, lat0, lon0, lat1, lon1, t0, duration):
+        u = unit_vectors(lat0, lon0)
+        end = unit_vectors(lat1, lon1)
+        cos_d = np.clip(np.sum(u * end, axis=-1), -1.0, 1.0)
+        v = end - cos_d[:, None] * u
+        norm = np.linalg.norm(v, axis=-1)
+        duration = np.asarray(duration, dtype=np.float64)
+        # Zero length or zero duration legs stay on their start point
+        moving = (norm > 0) & (duration > 0)
+        self.u = u
+        self.v = v / np.where(moving, norm, 1.0)[:, None]
+        self.v[~moving] = 0.0
+        self.t0 = np.asarray(t0, dtype=np.float64)
+        self.rate = np.where(
+            moving, np.arctan2(norm, cos_d) / np.where(moving, duration, 1.0), 0.0
+        )
+
+    def take(self, rows):
+        motion = object.__new__(GreatCircleMotion)
+        for name, value in vars(self).items():
+            setattr(motion, name, value[rows])
+        return motion
+
+    def lat_lon(self, t):
+        """Positions at times ``t`` as (lat, lon) arrays in degrees."""
+        angle = self.rate * (t - self.t0)
+        pos = np.cos(angle)[:, None] * self.u + np.sin(angle)[:, None] * self.v
+        lat = np.degrees(np.arcsin(np.clip(pos[:, 2], -1.0, 1.0)))
+        return lat, np.degrees(np.arctan2(pos[:, 1], pos[:, 0]))
+
+    def state(self, t):
+        """Position and velocity (per second) at times ``t``."""
+        angle = self.rate * (t - self.t0)
+        c = np.cos(angle)[:, None]
+        s = np.sin(angle)[:, None]
+        pos = c * self.u + s * self.v
+        vel = self.rate[:, None] * (c * self.v - s * self.u)
+        return pos, vel
+
+
+def _gap(a, b, t, chord2):
+    """Squared chord between a and b minus ``chord2``, with two time derivatives."""
+    pa, va = a.state(t)
+    pb, vb = b.state(t)
+    d = pa - pb
+    dv = va - vb
+    da = (b.rate**2)[:, None] * pb - (a.rate**2)[:, None] * pa
+    g = np.sum(d * d, axis=-1) - chord2
+    g1 = 2.0 * np.sum(d * dv, axis=-1)
+    g2 = 2.0 * (np.sum(dv * dv, axis=-1) + np.sum(d * da, axis=-1))
+    return g, g1, g2
+
+
+def _newton_root(fn, neg, pos, x, tol, max_iter):
+    """Roots of ``fn`` bracketed by fn(neg) < 0 <= fn(pos), by safeguarded Newton.
+
+    ``fn(x, rows)`` returns (value, derivative) for the bracket ``rows``
+    still being solved. Steps leaving the bracket fall back to bisection.
+    A root is done once a step or its bracket is within ``tol``. Returns
+    (roots, evaluations).
+    """
+    neg = np.array(neg, dtype=np.float64)
+    pos = np.array(pos, dtype=np.float64)
+    x = np.clip(x, np.minimum(neg, pos), np.maximum(neg, pos))
+    rows = np.arange(len(x))
+    evals = 0
+    for _ in range(max_iter):
+        if not len(rows):
+            break
+        xr = x[rows]
+        h, dh = fn(xr, rows)
+        evals += len(rows)
+        below = h < 0
+        neg_r = np.where(below, xr, neg[rows])
+        pos_r = np.where(below, pos[rows], xr)
+        neg[rows] = neg_r
+        pos[rows] = pos_r
+        lo, hi = np.minimum(neg_r, pos_r), np.maximum(neg_r, pos_r)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            nxt = xr - h / dh
+        nxt = np.where((nxt > lo) & (nxt < hi), nxt, (lo + hi) / 2)
+        done = (np.abs(nxt - xr) <= tol) | (hi - lo <= tol) | (h == 0)
+        x[rows] = np.where(h != 0, nxt, xr)
+        rows = rows[~done]
+    return x, evals
+
+
+def may_lose_separation(a, b, t_start, t_end, sep_nm):
+    """Conservative screen: False where a pair provably stays ``sep_nm`` apart.
+
+    The relative motion is linearised at the window midpoint. A position
+    strays from its tangent line by at most rate**2 * dt**2 / 2, so pairs
+    whose linear miss distance beats the separation by that much are clear.
+    """
+    chord = 2.0 * np.sin(sep_nm / (2.0 * EARTH_RADIUS_NM))
+    mid = (t_start + t_end) / 2
+    half = (t_end - t_start) / 2
+    pa, va = a.state(mid)
+    pb, vb = b.state(mid)
+    d = pa - pb
+    dv = va - vb
+    dv2 = np.sum(dv * dv, axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tau = np.where(dv2 > 0, -np.sum(d * dv, axis=-1) / dv2, 0.0)
+    tau = np.clip(tau, -half, half)
+    miss = np.linalg.norm(d + dv * tau[:, None], axis=-1)
+    slack = 0.5 * (a.rate**2 + b.rate**2) * half**2
+    return miss - slack < chord * (1 + 1e-9)
+
+
+def closest_approach_times(a, b, t_start, t_end, tol_sec=1e-3, max_iter=50, guess=None):
+    """Time of closest approach of paired motions within [t_start, t_end].
+
+    A root of the separation's time derivative by safeguarded Newton steps
+    to ``tol_sec``, or a window end when the pair only closes in or only
+    draws apart. ``guess`` optionally gives first estimates. Returns
+    (times, evaluations).
+    """
+    t_start = np.asarray(t_start, dtype=np.float64)
+    t_end = np.asarray(t_end, dtype=np.float64)
+    g1_s = _gap(a, b, t_start, 0.0)[1]
+    g1_e = _gap(a, b, t_end, 0.0)[1]
+    evals = 2 * len(t_start)
+    t_min = np.where(g1_s >= 0, t_start, t_end)
+    idx = np.nonzero((g1_s < 0) & (g1_e > 0))[0]
+    if len(idx):
+        sa, sb = a.take(idx), b.take(idx)
+        if guess is None:
+            x0 = (t_start[idx] + t_end[idx]) / 2
+        else:
+            x0 = np.asarray(guess, dtype=np.float64)[idx]
+        t_min[idx], k = _newton_root(
+            lambda t, rows: _gap(sa.take(rows), sb.take(rows), t, 0.0)[1:],
+            t_start[idx],
+            t_end[idx],
+            x0,
+            tol_sec,
+            max_iter,
+        )
+        evals += k
+    return t_min, evals
+
+
+def separation_intervals(
+    a, b, t_start, t_end, sep_nm, tol_sec=1e-3, max_iter=50, guess=None
+):
+    """Times two great circle motions spend closer than ``sep_nm``.
+
+    ``a`` and ``b`` are ``GreatCircleMotion`` rows paired element-wise and
+    [t_start, t_end] their common time window. Solves for the closest
+    approach, then for the entry and exit times where the separation
+    crosses ``sep_nm``, each by safeguarded Newton steps to ``tol_sec``.
+    ``guess`` optionally gives a first estimate of the closest approach
+    time. The separation is assumed to have a single minimum per window,
+    which holds for legs much shorter than half the globe.
+
+    Returns (start, end, found, evaluations).
+    """
+    chord2 = (2.0 * np.sin(sep_nm / (2.0 * EARTH_RADIUS_NM))) ** 2
+    t_start = np.asarray(t_start, dtype=np.float64)
+    t_end = np.asarray(t_end, dtype=np.float64)
+    g_s = _gap(a, b, t_start, chord2)[0]
+    g_e = _gap(a, b, t_end, chord2)[0]
+    t_min, k = closest_approach_times(a, b, t_start, t_end, tol_sec, max_iter, guess)
+    evals = 2 * len(t_start) + k
+    g_min, _, g2_min = _gap(a, b, t_min, chord2)
+    evals += len(t_start)
+    hit = g_min < 0
+
+    # Entry and exit: roots of the gap between the closest approach and
+    # each end of the window, unless already inside at that end. Newton
+    # starts from the parabola through the closest approach.
+    with np.errstate(divide="ignore", invalid="ignore"):
+        half_width = np.sqrt(-2.0 * g_min / g2_min)
+    entry = np.where(g_s < 0, t_start, t_min)
+    leave = np.where(g_e < 0, t_end, t_min)
+    for bound, g_bound, out, sign in (
+        (t_start, g_s, entry, -1.0),
+        (t_end, g_e, leave, 1.0),
+    ):
+        idx = np.nonzero(hit & (g_bound >= 0))[0]
+        if len(idx):
+            sa, sb = a.take(idx), b.take(idx)
+            x0 = t_min[idx] + sign * half_width[idx]
+            out[idx], k = _newton_root(
+                lambda t, rows: _gap(sa.take(rows), sb.take(rows), t, chord2)[:2],
+                t_min[idx],
+                bound[idx],
+                np.where(np.isfinite(x0), x0, (t_min[idx] + bound[idx]) / 2),
+                tol_sec,
+                max_iter,
+            )
+            evals += k
+    return entry, leave, hit & (entry < leave), evals
@@ -0,0 +1,114 @@
+import numpy as np
+
+LAT_OFFSET = 90.0
+LON_OFFSET = 180.0
+
+
+def severity_weight(dist, sep_nm=5.0):
+    """Conflict weight: 1.0 at 0 NM down to 0.1 at the separation minimum."""
+    return np.maximum(0.1, (sep_nm - np.asarray(dist, dtype=np.float64)) / sep_nm)
+
+
+class HotspotCube:
+    """Sparse lat x lon x time density cube of conflict points.
+
+    Points are binned into ``cell_deg`` cells and ``bucket_sec`` time
+    buckets. Only occupied bins are stored, as packed int64 keys sorted by
+    (bucket, lat cell, lon cell) with their weight sum, point count and
+    weighted position sums (for centroids). A time window is then a
+    contiguous key range, and a bounding box a mask over that range.
+    """
+
+    def __init__(self, lat, lon, time, weight, cell_deg=0.25, bucket_sec=900):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        time = np.asarray(time, dtype=np.float64)
+        weight = np.asarray(weight, dtype=np.float64)
+        self.cell_deg = cell_deg
+        self.bucket_sec = bucket_sec
+        self.n_lat = int(np.ceil(180.0 / cell_deg)) + 1
+        self.n_lon = int(np.ceil(360.0 / cell_deg)) + 1
+        self.t_min = float(time.min()) if len(time) else None
+        self.t_max = float(time.max()) if len(time) else None
+
+        bucket = np.floor(time / bucket_sec).astype(np.int64)
+        keys = self._pack(bucket, self._lat_cell(lat), self._lon_cell(lon))
+        self.keys, inverse = np.unique(keys, return_inverse=True)
+        n = len(self.keys)
+        self.weight = np.bincount(inverse, weight, minlength=n)
+        self.count = np.bincount(inverse, minlength=n).astype(np.int64)
+        self.lat_sum = np.bincount(inverse, weight * lat, minlength=n)
+        self.lon_sum = np.bincount(inverse, weight * lon, minlength=n)
+        self.bucket, cell = np.divmod(self.keys, self.n_lat * self.n_lon)
+        self.lat_idx, self.lon_idx = np.divmod(cell, self.n_lon)
+
+    @classmethod
+    def from_conflicts(cls, conflicts, **kwargs):
+        lat = np.array([c["lat"] for c in conflicts], dtype=np.float64)
+        lon = np.array([c["lon"] for c in conflicts], dtype=np.float64)
+        time = np.array([c["time"] for c in conflicts], dtype=np.float64)
+        dist = np.array([c["dist"] for c in conflicts], dtype=np.float64)
+        return cls(lat, lon, time, severity_weight(dist), **kwargs)
+
+    def _lat_cell(self, lat):
+        return np.floor((lat + LAT_OFFSET) / self.cell_deg).astype(np.int64)
+
+    def _lon_cell(self, lon):
+        return np.floor((lon + LON_OFFSET) / self.cell_deg).astype(np.int64)
+
+    def _pack(self, bucket, lat_idx, lon_idx):
+        return (bucket * self.n_lat + lat_idx) * self.n_lon + lon_idx
+
+    def __len__(self):
+        return len(self.keys)
+
+    def query(self, start=None, end=None, bbox=None):
+        """Aggregated cells for a time window and bounding box.
+
+        ``start``/``end`` select whole buckets overlapping [start, end];
+        ``bbox`` is (west, south, east, north) and selects whole cells that
+        intersect it. Returns a dict of arrays, one entry per occupied cell:
+        lat, lon (weighted centroid), weight, count.
+        """
+        lo, hi = 0, len(self.keys)
+        cells = self.n_lat * self.n_lon
+        if start is not None:
+            first = int(np.floor(start / self.bucket_sec))
+            lo = int(np.searchsorted(self.keys, first * cells, "left"))
+        if end is not None:
+            last = int(np.floor(end / self.bucket_sec))
+            hi = int(np.searchsorted(self.keys, (last + 1) * cells, "left"))
+        sel = np.arange(lo, max(lo, hi))
+
+        if bbox is not None:
+            west, south, east, north = bbox
+            lat_idx = self.lat_idx[sel]
+            lon_idx = self.lon_idx[sel]
+            inside = (lat_idx >= self._lat_cell(south)) & (
+                lat_idx <= self._lat_cell(north)
+            )
+            if west <= east:
+                inside &= (lon_idx >= self._lon_cell(west)) & (
+                    lon_idx <= self._lon_cell(east)
+                )
+            else:
+                # Box crossing the antimeridian
+                inside &= (lon_idx >= self._lon_cell(west)) | (
+                    lon_idx <= self._lon_cell(east)
+                )
+            sel = sel[inside]
+
+        # Collapse the time axis
+        cell, inverse = np.unique(
+            self.lat_idx[sel] * self.n_lon + self.lon_idx[sel], return_inverse=True
+        )
+        n = len(cell)
+        weight = np.bincount(inverse, self.weight[sel], minlength=n)
+        return {
+            "lat": np.bincount(inverse, self.lat_sum[sel], minlength=n) / weight,
+            "lon": np.bincount(inverse, self.lon_sum[sel], minlength=n) / weight,
+            "weight": weight,
+            "count": np.bincount(inverse, self.count[sel], minlength=n).astype(
+                np.int64
+            ),
+        }
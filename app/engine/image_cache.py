@@ -0,0 +1,251 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends stay atomic, compaction is unguarded
+    fcntl = None
+
+EXTENSION = re.compile(r"^[a-z0-9]{1,5}$")
+# File names given by ``store``: safe to serve as immutable
+HASHED_NAME = re.compile(r"^[0-9a-f]{32}\.[a-z0-9]{1,5}$")
+
+
+class ImageCache:
+    """Content-addressed image files with an append-only registry.
+
+    Images are stored once, named by a hash of their bytes, so a file name
+    always refers to the same content and browsers may cache it forever.
+    Registry entries (one dict per key, e.g. per plane type) are updated by
+    appending a JSON line to ``registry.jsonl`` in a single O_APPEND write,
+    which several processes sharing the directory can do at once; each
+    picks up the others' lines on its next read. Later lines win, and a
+    damaged line costs only its own entry. Once the log holds
+    ``compact_factor`` times more lines than entries it is rewritten
+    through a temporary file and a rename, headed by a line unique to that
+    compaction (renames may hand back a freed inode, so readers tell logs
+    apart by inode and first line); appends and compaction are
+    serialized across processes with flock.
+
+    Beyond ``max_bytes`` of images, the least recently used files (by
+    mtime, bumped on every hit) are deleted along with their entries.
+    """
+
+    def __init__(self, directory, max_bytes=64 << 20, compact_factor=4):
+        self.directory = directory
+        self.images_dir = os.path.join(directory, "aircraft_images")
+        self.log_path = os.path.join(directory, "registry.jsonl")
+        self.lock_path = os.path.join(directory, "registry.lock")
+        self.max_bytes = max_bytes
+        self.compact_factor = compact_factor
+        os.makedirs(self.images_dir, exist_ok=True)
+        self._entries = {}
+        self._lines = 0
+        self._offset = 0
+        self._identity = None
+        self._lock = threading.Lock()
+        if not os.path.exists(self.log_path):
+            self._import_legacy(os.path.join(directory, "registry.json"))
+
+    def _import_legacy(self, path):
+        # registry.json, rewritten whole by earlier versions
+        try:
+            with open(path) as f:
+                legacy = json.load(f)
+        except (OSError, ValueError):
+            return
+        # Their images were named after the key; store them by content hash
+        renamed = {}
+        for key, entry in legacy.items():
+            if not isinstance(entry, dict):
+                continue
+            if entry.get("local_path"):
+                url, slash, old = entry["local_path"].rpartition("/")
+                if old not in renamed:
+                    try:
+                        with open(self._path(old), "rb") as f:
+                            data = f.read()
+                    except OSError:
+                        continue
+                    renamed[old] = self.store(data, os.path.splitext(old)[1][1:])
+                entry["file"] = renamed[old]
+                entry["local_path"] = url + slash + renamed[old]
+            self.put(key, entry)
+        for old, name in renamed.items():
+            if old != name:
+                _remove(self._path(old))
+
+    @contextmanager
+    def _flock(self, exclusive):
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        """Applies lines appended since the last read (by any process)."""
+        try:
+            f = open(self.log_path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            st = os.fstat(f.fileno())
+            identity = (st.st_ino, f.readline())
+            if identity != self._identity or st.st_size < self._offset:
+                # Compacted by someone else: read it from the start
+                self._entries, self._lines, self._offset = {}, 0, 0
+                self._identity = identity
+            if st.st_size == self._offset:
+                return
+            f.seek(self._offset)
+            data = f.read()
+        # Whole lines only; one being appended right now is read next time
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            try:
+                record = json.loads(line)
+                key, entry = record["key"], record["entry"]
+            except (ValueError, KeyError, TypeError):
+                continue
+            self._lines += 1
+            if entry is None:
+                self._entries.pop(key, None)
+            else:
+                self._entries[key] = entry
+        self._offset += end
+
+    def _path(self, name):
+        return os.path.join(self.images_dir, name)
+
+    def get(self, key):
+        """Entry for ``key``, or None; an entry whose file is gone is a miss."""
+        with self._lock:
+            self._refresh()
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.get("file"):
+            try:
+                os.utime(self._path(entry["file"]))
+            except OSError:
+                return None
+        return dict(entry)
+
+    def entries(self):
+        with self._lock:
+            self._refresh()
+            return {key: dict(entry) for key, entry in self._entries.items()}
+
+    def put(self, key, entry):
+        """Records ``entry`` for ``key`` (None deletes it)."""
+        line = json.dumps({"key": key, "entry": entry}).encode() + b"\n"
+        with self._lock:
+            with self._flock(exclusive=False):
+                fd = os.open(
+                    self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644
+                )
+                try:
+                    os.write(fd, line)
+                finally:
+                    os.close(fd)
+            self._refresh()
+            if self._lines > self.compact_factor * len(self._entries) + 64:
+                self._compact()
+
+    def _compact(self):
+        with self._flock(exclusive=True):
+            self._refresh()
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    header = json.dumps({"compacted": os.urandom(8).hex()})
+                    f.write(header.encode() + b"\n")
+                    for key, entry in self._entries.items():
+                        f.write(json.dumps({"key": key, "entry": entry}).encode())
+                        f.write(b"\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, self.log_path)
+            except BaseException:
+                _remove(tmp)
+                raise
+            st = os.stat(self.log_path)
+            self._identity = (st.st_ino, header.encode() + b"\n")
+            self._offset = st.st_size
+            self._lines = len(self._entries)
+
+    def store(self, data, ext):
+        """Saves image bytes and returns their file name (``<hash>.<ext>``)."""
+        ext = ext.lower() if EXTENSION.match(ext.lower()) else "img"
+        name = f"{hashlib.sha256(data).hexdigest()[:32]}.{ext}"
+        path = self._path(name)
+        if os.path.exists(path):
+            os.utime(path)
+        else:
+            fd, tmp = tempfile.mkstemp(dir=self.images_dir, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, path)
+            except BaseException:
+                _remove(tmp)
+                raise
+        self.evict(keep=name)
+        return name
+
+    def nbytes(self):
+        return sum(size for _, size, _ in self._files())
+
+    def _files(self):
+        files = []
+        now = time.time()
+        for name in os.listdir(self.images_dir):
+            path = self._path(name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if name.endswith(".tmp"):
+                # Left by a crashed write
+                if now - st.st_mtime > 3600:
+                    _remove(path)
+                continue
+            files.append((st.st_mtime_ns, st.st_size, name))
+        return files
+
+    def evict(self, keep=None):
+        """Deletes least recently used images until they fit ``max_bytes``."""
+        files = sorted(self._files())
+        total = sum(size for _, size, _ in files)
+        removed = set()
+        for _, size, name in files:
+            if total <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            _remove(self._path(name))
+            total -= size
+            removed.add(name)
+        if removed:
+            for key, entry in self.entries().items():
+                if entry.get("file") in removed:
+                    self.put(key, None)
+        return removed
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,112 @@
+import numpy as np
+
+
+class IntervalIndex:
+    """Static centered interval tree over closed intervals [start, end].
+
+    Each node keeps the intervals containing its center, sorted once by
+    start and once by end; intervals entirely left or right of the center go
+    to the children. A stabbing query walks one root-to-leaf path and takes
+    a contiguous slice of each node it visits, so it costs O(log N + k) for
+    k results. Nodes with at most ``leaf_size`` intervals are scanned
+    directly instead of being split further.
+
+    Queries return interval ids (positions in the arrays given) in
+    ascending order.
+    """
+
+    def __init__(self, start, end, leaf_size=32):
+        self.start = np.ascontiguousarray(start, dtype=np.float64)
+        self.end = np.ascontiguousarray(end, dtype=np.float64)
+        self.leaf_size = leaf_size
+        # Node: (center, left, right, lo, hi); center is None for leaves
+        self._nodes = []
+        by_start, by_end = [], []
+        size = 0
+        stack = [(np.arange(len(self.start), dtype=np.int64), None, None)]
+        while stack:
+            ids, parent, side = stack.pop()
+            node = len(self._nodes)
+            if parent is not None:
+                self._nodes[parent][side] = node
+            center, here = None, ids
+            if len(ids) > leaf_size:
+                # An endpoint as center, so at least one interval stays here
+                points = np.concatenate([self.start[ids], self.end[ids]])
+                center = float(np.partition(points, len(ids))[len(ids)])
+                left = self.end[ids] < center
+                right = self.start[ids] > center
+                here = ids[~(left | right)]
+                for side, mask in ((1, left), (2, right)):
+                    if mask.any():
+                        stack.append((ids[mask], node, side))
+            s = here[np.argsort(self.start[here], kind="stable")]
+            e = here[np.argsort(self.end[here], kind="stable")]
+            by_start.append(s)
+            by_end.append(e)
+            self._nodes.append([center, -1, -1, size, size + len(here)])
+            size += len(here)
+        self._nodes = [tuple(n) for n in self._nodes]
+        self._start_ids = (
+            np.concatenate(by_start) if by_start else np.empty(0, np.int64)
+        )
+        self._end_ids = np.concatenate(by_end) if by_end else np.empty(0, np.int64)
+        self._starts = self.start[self._start_ids]
+        self._ends = self.end[self._end_ids]
+        # All intervals by start, for the "starts inside the window" half
+        self._order = np.argsort(self.start, kind="stable")
+        self._sorted_start = self.start[self._order]
+
+    def __len__(self):
+        return len(self.start)
+
+    @property
+    def nbytes(self):
+        return (
+            self.start.nbytes
+            + self.end.nbytes
+            + 2 * (self._start_ids.nbytes + self._starts.nbytes)
+            + self._order.nbytes
+            + self._sorted_start.nbytes
+        )
+
+    def _stab(self, t):
+        parts = []
+        node = 0 if self._nodes else -1
+        while node >= 0:
+            center, left, right, lo, hi = self._nodes[node]
+            if center is None:
+                ids = self._start_ids[lo:hi]
+                parts.append(ids[(self._starts[lo:hi] <= t) & (self.end[ids] >= t)])
+                break
+            if t < center:
+                k = int(np.searchsorted(self._starts[lo:hi], t, "right"))
+                parts.append(self._start_ids[lo : lo + k])
+                node = left
+            elif t > center:
+                k = int(np.searchsorted(self._ends[lo:hi], t, "left"))
+                parts.append(self._end_ids[lo + k : hi])
+                node = right
+            else:
+                parts.append(self._start_ids[lo:hi])
+                break
+        return parts
+
+    def at(self, t):
+        """Ids of the intervals containing ``t``."""
+        parts = self._stab(t)
+        return np.sort(np.concatenate(parts)) if parts else np.empty(0, np.int64)
+
+    def overlapping(self, start, end):
+        """Ids of the intervals overlapping the window [start, end].
+
+        Those are the intervals containing ``start`` plus those starting in
+        (start, end]; the two sets are disjoint.
+        """
+        if end < start:
+            return np.empty(0, dtype=np.int64)
+        parts = self._stab(start)
+        lo = int(np.searchsorted(self._sorted_start, start, "right"))
+        hi = int(np.searchsorted(self._sorted_start, end, "right"))
+        parts.append(self._order[lo:hi])
+        return np.sort(np.concatenate(parts))
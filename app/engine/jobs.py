@@ -0,0 +1,172 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobCancelled(Exception):
+    """Raised inside a job function once the job has been cancelled."""
+
+
+class JobNotFound(LookupError):
+    def __init__(self, job_id):
+        super().__init__(f"unknown job: {job_id}")
+        self.job_id = job_id
+
+
+class Job:
+    """A long-running engine operation run in the background.
+
+    The job function receives the job and reports through it: ``report``
+    sets the progress (0 to 1) and a status message, ``emit`` appends an
+    event for streaming (e.g. each conflict found) and ``check`` raises
+    ``JobCancelled`` once cancellation was requested. ``report`` checks
+    too, so a loop reporting every step can be cancelled between steps.
+    """
+
+    FINISHED = ("done", "failed", "cancelled")
+
+    def __init__(self, kind, params=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.params = dict(params or {})
+        self.state = "queued"
+        self.progress = 0.0
+        self.message = ""
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self._events = []
+        self._events_lock = threading.Lock()
+        self._cancel = threading.Event()
+
+    @property
+    def done(self):
+        return self.state in self.FINISHED
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        """Requests cancellation; the job stops at its next check."""
+        self._cancel.set()
+
+    def check(self):
+        if self._cancel.is_set():
+            raise JobCancelled(self.id)
+
+    def report(self, progress=None, message=None):
+        self.check()
+        if progress is not None:
+            self.progress = min(max(float(progress), 0.0), 1.0)
+        if message is not None:
+            self.message = message
+
+    def emit(self, kind, data=None):
+        with self._events_lock:
+            self._events.append((kind, data))
+
+    def events_since(self, cursor):
+        """(kind, data) events from position ``cursor`` on."""
+        with self._events_lock:
+            return self._events[cursor:]
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "params": self.params,
+            "state": self.state,
+            "progress": round(self.progress, 4),
+            "message": self.message,
+            "result": self.result,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "events": len(self._events),
+        }
+
+
+class JobManager:
+    """Runs jobs on a thread pool and keeps them for status polling.
+
+    ``submit(kind, fn, *args)`` runs ``fn(job, *args)``; its return value
+    becomes ``job.result``. Jobs given a ``key`` are coalesced: while an
+    unfinished job with the same key exists, submitting returns it. The
+    ``keep`` most recent finished jobs are retained.
+    """
+
+    def __init__(self, max_workers=2, keep=100):
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="job"
+        )
+        self.keep = keep
+        self._jobs = OrderedDict()
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind, fn, *args, key=None, params=None):
+        with self._lock:
+            job = self._active.get(key) if key is not None else None
+            if job is not None:
+                return job
+            job = Job(kind, params)
+            self._jobs[job.id] = job
+            if key is not None:
+                self._active[key] = job
+        self.executor.submit(self._run, job, fn, args, key)
+        return job
+
+    def _run(self, job, fn, args, key):
+        job.started = time.time()
+        try:
+            job.check()
+            job.state = "running"
+            job.result = fn(job, *args)
+            job.progress = 1.0
+            job.state = "done"
+        except JobCancelled:
+            job.state = "cancelled"
+        except Exception as exc:
+            job.error = f"{type(exc).__name__}: {exc}"
+            job.state = "failed"
+        finally:
+            job.finished = time.time()
+            with self._lock:
+                if key is not None and self._active.get(key) is job:
+                    del self._active[key]
+                self._prune()
+
+    def _prune(self):
+        finished = [j.id for j in self._jobs.values() if j.done]
+        for job_id in finished[: max(len(finished) - self.keep, 0)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None:
+            raise JobNotFound(job_id)
+        return job
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        job.cancel()
+        return job
+
+    def jobs(self):
+        """All retained jobs, newest first."""
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+    def running(self):
+        return sum(1 for job in self.jobs() if not job.done)
+
+    def shutdown(self):
+        for job in self.jobs():
+            job.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,342 @@
+import numpy as np
+from app.engine.geometry import haversine_vec, interpolate_position_vec, parse_waypoints
+
+
+class LegTable:
+    """Structure-of-arrays store for flight legs.
+
+    Each column is a contiguous float64 array with one row per leg. Legs of a
+    flight are stored contiguously and in route order; ``offsets[i]`` to
+    ``offsets[i + 1]`` is the row range of flight ``i``.
+    """
+
+    COLUMNS = (
+        "lat0",
+        "lon0",
+        "lat1",
+        "lon1",
+        "t0",
+        "t1",
+        "duration",
+        "alt",
+        "dist",
+        "vlon",
+        "vlat",
+    )
+
+    def __init__(self, columns, flight, offsets, acids):
+        for name in self.COLUMNS:
+            setattr(self, name, np.ascontiguousarray(columns[name], dtype=np.float64))
+        self.flight = np.ascontiguousarray(flight, dtype=np.int64)
+        self.offsets = np.ascontiguousarray(offsets, dtype=np.int64)
+        self.acids = acids
+
+    @classmethod
+    def from_flights(cls, flights, airport_coords):
+        """Builds the legs of every flight in one vectorized pass."""
+        routes = [f["route"] or "" for f in flights]
+        n_wp, wp_lat, wp_lon = route_waypoints(routes)
+        return cls.from_columns(
+            [f["ACID"] for f in flights],
+            np.array([f["departure time"] for f in flights], dtype=np.float64),
+            np.array([f["aircraft speed"] for f in flights], dtype=np.float64),
+            np.array([f["altitude"] for f in flights], dtype=np.float64),
+            [f["departure airport"] for f in flights],
+            [f["arrival airport"] for f in flights],
+            n_wp,
+            wp_lat,
+            wp_lon,
+            airport_coords,
+        )
+
+    @classmethod
+    def from_columns(
+        cls,
+        acids,
+        dep_time,
+        speed,
+        alt,
+        dep_codes,
+        arr_codes,
+        n_wp,
+        wp_lat,
+        wp_lon,
+        airport_coords,
+    ):
+        """Builds legs from per-flight columns and concatenated waypoints."""
+        n = len(acids)
+        dep_time = np.asarray(dep_time, dtype=np.float64)
+        speed = np.asarray(speed, dtype=np.float64)
+        alt = np.asarray(alt, dtype=np.float64)
+        n_wp = np.asarray(n_wp, dtype=np.int64)
+
+        # 1. Route points: departure airport, waypoints, arrival airport
+        dep_lat, dep_lon, has_dep = cls._airport_columns(dep_codes, airport_coords)
+        arr_lat, arr_lon, has_arr = cls._airport_columns(arr_codes, airport_coords)
+
+        n_points = has_dep + n_wp + has_arr
+        point_start = np.cumsum(n_points) - n_points
+        total = int(n_points.sum())
+        lat = np.empty(total)
+        lon = np.empty(total)
+
+        dep_rows = point_start[has_dep == 1]
+        lat[dep_rows] = dep_lat[has_dep == 1]
+        lon[dep_rows] = dep_lon[has_dep == 1]
+        wp_flight = np.repeat(np.arange(n), n_wp)
+        wp_rank = np.arange(len(wp_flight)) - np.repeat(np.cumsum(n_wp) - n_wp, n_wp)
+        wp_rows = point_start[wp_flight] + has_dep[wp_flight] + wp_rank
+        lat[wp_rows] = wp_lat
+        lon[wp_rows] = wp_lon
+        arr_rows = (point_start + n_points - 1)[has_arr == 1]
+        lat[arr_rows] = arr_lat[has_arr == 1]
+        lon[arr_rows] = arr_lon[has_arr == 1]
+
+        return cls._from_points(lat, lon, n_points, dep_time, speed, alt, list(acids))
+
+    @classmethod
+    def _from_points(cls, lat, lon, n_points, dep_time, speed, alt, acids):
+        """Builds legs from concatenated per-flight route points."""
+        n = len(n_points)
+        point_start = np.cumsum(n_points) - n_points
+
+        # 2. Legs join consecutive points of the same flight
+        n_legs = np.maximum(n_points - 1, 0)
+        flight = np.repeat(np.arange(n), n_legs)
+        leg_start = np.cumsum(n_legs) - n_legs
+        rank = np.arange(len(flight)) - leg_start[flight]
+        p = point_start[flight] + rank
+
+        cols = {
+            "lat0": lat[p],
+            "lon0": lon[p],
+            "lat1": lat[p + 1],
+            "lon1": lon[p + 1],
+            "alt": alt[flight],
+        }
+        cols["dist"] = haversine_vec(
+            cols["lat0"], cols["lon0"], cols["lat1"], cols["lon1"]
+        )
+        leg_speed = speed[flight]
+        moving = leg_speed > 0
+        cols["duration"] = np.where(
+            moving, cols["dist"] / np.where(moving, leg_speed, 1.0) * 3600, 0.0
+        )
+
+        # Accumulate start times leg by leg so rounding matches a running clock
+        t0 = dep_time[flight]
+        for k in range(1, int(n_legs.max()) if len(n_legs) else 0):
+            rows = np.nonzero(rank == k)[0]
+            t0[rows] = t0[rows - 1] + cols["duration"][rows - 1]
+        cols["t0"] = t0
+        cols["t1"] = t0 + cols["duration"]
+
+        # Velocity in deg/sec (Approximate for detection phase)
+        has_dur = cols["duration"] > 0
+        safe_dur = np.where(has_dur, cols["duration"], 1.0)
+        cols["vlon"] = np.where(has_dur, (cols["lon1"] - cols["lon0"]) / safe_dur, 0.0)
+        cols["vlat"] = np.where(has_dur, (cols["lat1"] - cols["lat0"]) / safe_dur, 0.0)
+
+        offsets = np.concatenate([[0], np.cumsum(n_legs)])
+        return cls(cols, flight, offsets, acids)
+
+    @staticmethod
+    def _airport_columns(codes, airport_coords):
+        """Maps airport codes to (lat, lon, known) arrays via the unique codes."""
+        if len(codes) == 0:
+            return np.empty(0), np.empty(0), np.empty(0, dtype=np.int64)
+        uniq, inverse = np.unique(np.asarray(codes, dtype=np.str_), return_inverse=True)
+        coords = [airport_coords.get(str(c)) for c in uniq]
+        known = np.array([c is not None for c in coords], dtype=np.int64)
+        lat = np.array([c[0] if c else 0.0 for c in coords], dtype=np.float64)
+        lon = np.array([c[1] if c else 0.0 for c in coords], dtype=np.float64)
+        return lat[inverse], lon[inverse], known[inverse]
+
+    def __len__(self):
+        return len(self.t0)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("leg index out of range")
+        return Leg._view(self, i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield Leg._view(self, i)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, c).nbytes for c in self.COLUMNS) + self.flight.nbytes
+
+    def copy(self):
+        """Independent in-memory copy (e.g. of a memory-mapped table)."""
+        return LegTable(
+            {name: np.array(getattr(self, name)) for name in self.COLUMNS},
+            np.array(self.flight),
+            np.array(self.offsets),
+            list(self.acids),
+        )
+
+    def rows_for_flight(self, flight_idx):
+        return range(int(self.offsets[flight_idx]), int(self.offsets[flight_idx + 1]))
+
+    def flight_legs(self, flight_idx):
+        return [Leg._view(self, i) for i in self.rows_for_flight(flight_idx)]
+
+    def replace_flight(self, flight_idx, new):
+        """Swaps in the legs of a single-flight table ``new`` for flight ``flight_idx``.
+
+        Returns True when the rows were overwritten in place (same leg count),
+        False when the columns had to be reallocated.
+        """
+        rows = self.rows_for_flight(flight_idx)
+        self.acids[flight_idx] = new.acids[0]
+        if len(new) == len(rows):
+            for name in self.COLUMNS:
+                getattr(self, name)[rows.start : rows.stop] = getattr(new, name)
+            return True
+
+        for name in self.COLUMNS:
+            col = getattr(self, name)
+            setattr(
+                self,
+                name,
+                np.concatenate(
+                    [col[: rows.start], getattr(new, name), col[rows.stop :]]
+                ),
+            )
+        self.flight = np.concatenate(
+            [
+                self.flight[: rows.start],
+                np.full(len(new), flight_idx, dtype=np.int64),
+                self.flight[rows.stop :],
+            ]
+        )
+        self.offsets[flight_idx + 1 :] += len(new) - len(rows)
+        return False
+
+    def position_at(self, rows, t):
+        """Great circle positions of legs ``rows`` at times ``t`` as (lat, lon)."""
+        rows = np.asarray(rows, dtype=np.int64)
+        dur = self.duration[rows]
+        frac = np.where(dur > 0, (t - self.t0[rows]) / np.where(dur > 0, dur, 1.0), 0.0)
+        return interpolate_position_vec(
+            self.lat0[rows], self.lon0[rows], self.lat1[rows], self.lon1[rows], frac
+        )
+
+    def to_dicts(self, rows=None):
+        """Leg dicts for the API, as produced by ``Leg.to_dict``."""
+        if rows is None:
+            rows = range(len(self))
+        rows = np.asarray(rows, dtype=np.int64)
+        return [
+            {
+                "start": [lon0, lat0],
+                "end": [lon1, lat1],
+                "t0": t0,
+                "t1": t1,
+                "alt": alt,
+                "dist": dist,
+            }
+            for lon0, lat0, lon1, lat1, t0, t1, alt, dist in zip(
+                self.lon0[rows].tolist(),
+                self.lat0[rows].tolist(),
+                self.lon1[rows].tolist(),
+                self.lat1[rows].tolist(),
+                self.t0[rows].tolist(),
+                self.t1[rows].tolist(),
+                self.alt[rows].tolist(),
+                self.dist[rows].tolist(),
+            )
+        ]
+
+
+def route_waypoints(routes):
+    """Parses route strings into (waypoint count per route, lat, lon) arrays."""
+    if len(routes) == 0:
+        return np.zeros(0, dtype=np.int64), np.empty(0), np.empty(0)
+    n_wp = np.strings.count(np.asarray(routes, dtype=np.str_), "/").astype(np.int64)
+    wp_lat, wp_lon = parse_waypoints(" ".join(routes).split())
+    return n_wp, wp_lat, wp_lon
+
+
+class Leg:
+    """A single leg, viewed as one row of a ``LegTable``."""
+
+    __slots__ = ("table", "row")
+
+    def __init__(self, acid, start_pt, end_pt, start_time, speed_kts, alt):
+        self.table = LegTable._from_points(
+            np.array([start_pt[0], end_pt[0]], dtype=np.float64),
+            np.array([start_pt[1], end_pt[1]], dtype=np.float64),
+            np.array([2]),
+            np.array([start_time], dtype=np.float64),
+            np.array([speed_kts], dtype=np.float64),
+            np.array([alt], dtype=np.float64),
+            [acid],
+        )
+        self.row = 0
+
+    @classmethod
+    def _view(cls, table, row):
+        leg = object.__new__(cls)
+        leg.table = table
+        leg.row = row
+        return leg
+
+    @property
+    def acid(self):
+        return self.table.acids[self.table.flight[self.row]]
+
+    @property
+    def start_lat(self):
+        return float(self.table.lat0[self.row])
+
+    @property
+    def start_lon(self):
+        return float(self.table.lon0[self.row])
+
+    @property
+    def end_lat(self):
+        return float(self.table.lat1[self.row])
+
+    @property
+    def end_lon(self):
+        return float(self.table.lon1[self.row])
+
+    @property
+    def p0(self):
+        return np.array([self.start_lon, self.start_lat])  # [lon, lat]
+
+    @property
+    def p1(self):
+        return np.array([self.end_lon, self.end_lat])
+
+    @property
+    def v(self):
+        return np.array([self.table.vlon[self.row], self.table.vlat[self.row]])
+
+    @property
+    def t0(self):
+        return float(self.table.t0[self.row])
+
+    @property
+    def t1(self):
+        return float(self.table.t1[self.row])
+
+    @property
+    def duration(self):
+        return float(self.table.duration[self.row])
+
+    @property
+    def dist(self):
+        return float(self.table.dist[self.row])
+
+    @property
+    def alt(self):
+        return float(self.table.alt[self.row])
+
+    def to_dict(self):
+        return self.table.to_dicts([self.row])[0]
@@ -0,0 +1,234 @@
+import cProfile
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Set PLANNAV_METRICS=0 to turn every counter and timer into a no-op
+ENABLED = os.getenv("PLANNAV_METRICS", "1") != "0"
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        if not ENABLED:
+            return
+        key = tuple(labels.get(n, "") for n in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(n, "") for n in self.label_names), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield self.name, _labels(self.label_names, key), value
+
+
+class Gauge:
+    """Value read from ``fn`` at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, fn):
+        self.name = name
+        self.help = help
+        self.fn = fn
+
+    def samples(self):
+        yield self.name, "", self.fn()
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        if not ENABLED:
+            return
+        key = tuple(labels.get(n, "") for n in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        if not ENABLED:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        series = self._series.get(tuple(labels.get(n, "") for n in self.label_names))
+        return 0 if series is None else series[2]
+
+    def samples(self):
+        with self._lock:
+            items = sorted(
+                (k, (list(s[0]), s[1], s[2])) for k, s in self._series.items()
+            )
+        names = self.label_names + ("le",)
+        for key, (counts, total, n) in items:
+            running = 0
+            for bound, c in zip(self.buckets, counts):
+                running += c
+                yield self.name + "_bucket", _labels(
+                    names, key + (f"{bound:g}",)
+                ), running
+            yield self.name + "_bucket", _labels(names, key + ("+Inf",)), n
+            yield self.name + "_sum", _labels(self.label_names, key), total
+            yield self.name + "_count", _labels(self.label_names, key), n
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, fn):
+        return self.register(Gauge(name, help, fn))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(
+                    f"{name}{labels} {value:g}"
+                    if isinstance(value, float)
+                    else f"{name}{labels} {value}"
+                )
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Detection internals (counted per batch, not per pair)
+PAIRS = REGISTRY.counter(
+    "plannav_leg_pairs_total",
+    "Candidate leg pairs by evaluation stage "
+    "(considered, pruned_time, pruned_altitude, pruned_screen, refined, conflicting).",
+    labels=("stage",),
+)
+SEPARATION_EVALS = REGISTRY.counter(
+    "plannav_separation_evaluations_total",
+    "Pair separation evaluations made while refining conflict intervals.",
+)
+INTERVAL_MERGES = REGISTRY.counter(
+    "plannav_interval_merges_total",
+    "Loss-of-separation intervals folded into a neighbouring interval.",
+)
+PHASE_SECONDS = REGISTRY.histogram(
+    "plannav_engine_phase_seconds",
+    "Engine phase durations (legs, detection, stats).",
+    labels=("phase",),
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "plannav_request_seconds",
+    "HTTP request latency by route.",
+    labels=("method", "route", "status"),
+)
+PROFILES = REGISTRY.counter(
+    "plannav_profiles_written_total", "cProfile dumps written for slow calls."
+)
+
+
+class SlowCallProfiler:
+    """Profiles calls and keeps a cProfile dump of the ones slower than a threshold.
+
+    Disabled (a plain call) unless ``slow_ms`` is set, e.g. from the
+    PLANNAV_PROFILE_SLOW_MS environment variable. Dumps are written to
+    ``directory`` as ``<name>-<unix ms>.prof`` for ``python -m pstats`` or
+    snakeviz. The interpreter runs one profiler at a time, so calls made
+    while another is being profiled run unprofiled.
+    """
+
+    def __init__(self, slow_ms=None, directory=".cache/profiles"):
+        self.slow_ms = slow_ms
+        self.directory = directory
+        self._active = threading.Lock()
+
+    @classmethod
+    def from_env(cls, directory=".cache/profiles"):
+        slow_ms = os.getenv("PLANNAV_PROFILE_SLOW_MS")
+        return cls(float(slow_ms) if slow_ms else None, directory)
+
+    def call(self, name, fn, *args):
+        if self.slow_ms is None or not self._active.acquire(blocking=False):
+            return fn(*args)
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            profile.enable()
+            try:
+                return fn(*args)
+            finally:
+                profile.disable()
+        finally:
+            self._active.release()
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if elapsed_ms >= self.slow_ms:
+                os.makedirs(self.directory, exist_ok=True)
+                safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in name)
+                profile.dump_stats(
+                    os.path.join(
+                        self.directory, f"{safe}-{int(time.time() * 1000)}.prof"
+                    )
+                )
+                PROFILES.inc()
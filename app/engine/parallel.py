@@ -0,0 +1,141 @@
+import threading
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from app.engine.legs import LegTable
+from app.engine.pairs import evaluate_pairs
+
+# Per-process state: the shared blocks this worker has mapped, by role
+_worker = {}
+
+
+def _share(array):
+    """Copies an array into a new shared memory block."""
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[:] = array
+    return shm
+
+
+def _attach(name, shape, dtype):
+    shm = shared_memory.SharedMemory(name=name, track=False)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _mapped(role, name, shape, dtype):
+    """Array in shared block ``name``, mapped once per worker until it changes."""
+    current = _worker.get(role)
+    if current is None or current[0] != name:
+        if current is not None:
+            current[1].close()
+        shm, array = _attach(name, shape, dtype)
+        if role == "legs":
+            columns = dict(zip(LegTable.COLUMNS, array))
+            array = LegTable(columns, np.empty(0), np.zeros(1), [])
+        current = _worker[role] = (name, shm, array)
+    return current[2]
+
+
+def _evaluate_chunk(legs_block, pairs_block, start, stop, options):
+    legs = _mapped("legs", *legs_block, np.float64)
+    pairs = _mapped("pairs", *pairs_block, np.int64)
+    return evaluate_pairs(
+        legs, pairs[0, start:stop], legs, pairs[1, start:stop], **options
+    )
+
+
+class ParallelEvaluator:
+    """``evaluate_pairs`` over leg pairs of a single table, on a process pool.
+
+    The pool is started on first use and kept. Leg columns are copied into
+    shared memory once per ``(legs, version)`` and reused until the table
+    changes; each call only shares its candidate pairs, and each task carries
+    the bounds of its block of pairs. Blocks are merged in submission order,
+    so the result is identical to the serial call.
+
+    After ``close`` the workers are gone and pairs are evaluated in-process.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.closed = False
+        self._executor = None
+        self._legs_shm = None
+        self._legs_key = None
+        self._legs_shape = None
+        self._lock = threading.Lock()
+
+    def _legs_block(self, legs, version):
+        key = self._legs_key
+        if key is None or key[0] is not legs or key[1] != version:
+            block = np.stack([getattr(legs, c) for c in LegTable.COLUMNS])
+            self._release_legs()
+            self._legs_shm = _share(block)
+            self._legs_shape = block.shape
+            self._legs_key = (legs, version)
+        return self._legs_shm.name, self._legs_shape
+
+    def _release_legs(self):
+        if self._legs_shm is not None:
+            self._legs_shm.close()
+            self._legs_shm.unlink()
+        self._legs_shm = self._legs_key = self._legs_shape = None
+
+    def evaluate(self, legs, rows_a, rows_b, version=0, chunk_size=None, **options):
+        """Exact test on pairs (rows_a[i], rows_b[i]) of ``legs``.
+
+        ``version`` must change whenever ``legs`` is modified in place.
+        ``options`` are passed on to ``evaluate_pairs``.
+        """
+        n = len(rows_a)
+        with self._lock:
+            if n == 0 or self.workers <= 1 or self.closed:
+                return evaluate_pairs(legs, rows_a, legs, rows_b, **options)
+            if chunk_size is None:
+                # A few blocks per worker keeps the pool balanced
+                chunk_size = -(-n // (self.workers * 4))
+            bounds = [(s, min(s + chunk_size, n)) for s in range(0, n, chunk_size)]
+
+            legs_block = self._legs_block(legs, version)
+            pairs = np.stack([rows_a, rows_b]).astype(np.int64)
+            pairs_shm = _share(pairs)
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            try:
+                results = list(
+                    self._executor.map(
+                        _evaluate_chunk,
+                        [legs_block] * len(bounds),
+                        [(pairs_shm.name, pairs.shape)] * len(bounds),
+                        [b[0] for b in bounds],
+                        [b[1] for b in bounds],
+                        [options] * len(bounds),
+                    )
+                )
+            finally:
+                pairs_shm.close()
+                pairs_shm.unlink()
+
+        starts = np.concatenate([r[0] for r in results])
+        ends = np.concatenate([r[1] for r in results])
+        found = np.concatenate([r[2] for r in results])
+        return starts, ends, found
+
+    def close(self):
+        """Stops the workers and frees the shared leg block."""
+        with self._lock:
+            self.closed = True
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            self._release_legs()
+
+
+def evaluate_pairs_parallel(legs, rows_a, rows_b, workers, chunk_size=None, **options):
+    """One-off ``ParallelEvaluator.evaluate`` on a pool of its own."""
+    evaluator = ParallelEvaluator(workers)
+    try:
+        return evaluator.evaluate(
+            legs, rows_a, rows_b, chunk_size=chunk_size, **options
+        )
+    finally:
+        evaluator.close()
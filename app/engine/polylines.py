@@ -0,0 +1,131 @@
+import numpy as np
+from math import hypot
+from app.engine.geometry import interpolate_position_vec
+
+# Seconds of flight between samples along a leg, before simplification
+SAMPLE_SEC = 30.0
+# Web map tile size in pixels (Mapbox GL)
+TILE_SIZE = 512
+# Web Mercator is undefined at the poles
+MAX_MERCATOR_LAT = 85.051129
+# Douglas-Peucker spans up to this long are scanned in plain Python, which
+# beats numpy's per-call overhead
+SCAN_SPAN = 256
+
+
+def mercator(lat, lon):
+    """Web Mercator world coordinates in [0, 1], as (x east, y south)."""
+    lat = np.radians(np.clip(lat, -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT))
+    x = (np.asarray(lon, dtype=np.float64) + 180.0) / 360.0
+    y = 0.5 - np.log(np.tan(np.pi / 4 + lat / 2)) / (2 * np.pi)
+    return x, y
+
+
+def zoom_tolerance(zoom, pixels=0.5):
+    """Mercator world distance covered by ``pixels`` screen pixels at ``zoom``."""
+    return pixels / (TILE_SIZE * 2.0**zoom)
+
+
+def _farthest(x, y, xs, ys, i, j):
+    """Index and distance of the vertex in (i, j) farthest from segment i-j."""
+    ax, ay, bx, by = xs[i], ys[i], xs[j], ys[j]
+    dx, dy = bx - ax, by - ay
+    length2 = dx * dx + dy * dy
+    if j - i > SCAN_SPAN:
+        px, py = x[i + 1 : j] - ax, y[i + 1 : j] - ay
+        f = np.clip((px * dx + py * dy) / length2, 0.0, 1.0) if length2 > 0 else 0.0
+        d = np.hypot(px - f * dx, py - f * dy)
+        k = int(np.argmax(d))
+        return i + 1 + k, float(d[k])
+    best, farthest = -1.0, i + 1
+    for k in range(i + 1, j):
+        px, py = xs[k] - ax, ys[k] - ay
+        f = (px * dx + py * dy) / length2 if length2 > 0 else 0.0
+        f = min(max(f, 0.0), 1.0)
+        d = hypot(px - f * dx, py - f * dy)
+        if d > best:
+            best, farthest = d, k
+    return farthest, best
+
+
+def simplification_error(x, y):
+    """Douglas-Peucker rank of every vertex of the polyline (x, y).
+
+    Keeping the vertices whose rank exceeds ``tol`` gives exactly what
+    Douglas-Peucker keeps at tolerance ``tol``, so every dropped vertex lies
+    within ``tol`` of the simplified line. Both ends rank infinite. Ranking
+    once lets any tolerance be served with a single comparison.
+    """
+    n = len(x)
+    error = np.zeros(n)
+    if n == 0:
+        return error
+    error[0] = error[-1] = np.inf
+    xs, ys = x.tolist(), y.tolist()
+    stack = [(0, n - 1, np.inf)]
+    while stack:
+        i, j, parent = stack.pop()
+        if j - i < 2:
+            continue
+        k, d = _farthest(x, y, xs, ys, i, j)
+        # A vertex is only reachable while its parent is kept
+        error[k] = min(d, parent)
+        stack.append((i, k, error[k]))
+        stack.append((k, j, error[k]))
+    return error
+
+
+class FlightPolyline:
+    """Great circle track of one flight as time-stamped samples.
+
+    Each leg is sampled at least every ``sample_sec`` seconds of flight,
+    plus its end point, so straight lines between samples on a Web Mercator
+    map stay on the great circle. ``error`` ranks samples for level of
+    detail (see ``simplification_error``, measured in Mercator world units);
+    samples where the altitude changes are always kept.
+    """
+
+    def __init__(self, lat, lon, alt, t):
+        self.lat = np.ascontiguousarray(lat, dtype=np.float64)
+        self.lon = np.ascontiguousarray(lon, dtype=np.float64)
+        self.alt = np.ascontiguousarray(alt, dtype=np.float64)
+        self.t = np.ascontiguousarray(t, dtype=np.float64)
+        self.error = simplification_error(*mercator(self.lat, self.lon))
+        step = np.nonzero(self.alt[1:] != self.alt[:-1])[0]
+        self.error[step] = self.error[step + 1] = np.inf
+
+    @classmethod
+    def from_legs(cls, legs, rows, sample_sec=SAMPLE_SEC):
+        """Samples the legs ``rows`` (a row range of one flight)."""
+        rows = np.arange(rows.start, rows.stop)
+        if len(rows) == 0:
+            empty = np.empty(0)
+            return cls(empty, empty, empty, empty)
+        steps = np.maximum(np.ceil(legs.duration[rows] / sample_sec), 1).astype(
+            np.int64
+        )
+        leg = np.repeat(rows, steps)
+        rank = np.arange(len(leg)) - np.repeat(np.cumsum(steps) - steps, steps)
+        frac = rank / np.repeat(steps, steps)
+        lat, lon = interpolate_position_vec(
+            legs.lat0[leg], legs.lon0[leg], legs.lat1[leg], legs.lon1[leg], frac
+        )
+        last = rows[-1]
+        return cls(
+            np.append(lat, legs.lat1[last]),
+            np.append(lon, legs.lon1[last]),
+            np.append(legs.alt[leg], legs.alt[last]),
+            np.append(legs.t0[leg] + frac * legs.duration[leg], legs.t1[last]),
+        )
+
+    def __len__(self):
+        return len(self.t)
+
+    @property
+    def nbytes(self):
+        return 5 * self.t.nbytes
+
+    def simplified(self, tolerance=0.0):
+        """(lat, lon, alt, t) of the samples kept at ``tolerance``."""
+        keep = np.nonzero(self.error > tolerance)[0]
+        return self.lat[keep], self.lon[keep], self.alt[keep], self.t[keep]
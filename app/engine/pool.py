@@ -0,0 +1,204 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from app.engine.trajectory import FlightEngine
+
+# Dataset names ending in an ISO date are days of a schedule, e.g.
+# "flights_2026-01-07"; the next day's file shares the prefix
+DAY_PATTERN = re.compile(r"^(?P<prefix>.*?)(?P<day>\d{4}-\d{2}-\d{2})$")
+
+
+class DatasetNotFound(LookupError):
+    def __init__(self, name):
+        super().__init__(f"unknown dataset: {name}")
+        self.name = name
+
+
+def next_day_name(name):
+    """Name of the following day's dataset, or None for undated names."""
+    match = DAY_PATTERN.match(name)
+    if match is None:
+        return None
+    try:
+        day = date.fromisoformat(match["day"])
+    except ValueError:
+        return None
+    return f"{match['prefix']}{(day + timedelta(days=1)).isoformat()}"
+
+
+class EnginePool:
+    """Flight engines for several datasets, loaded on demand.
+
+    A dataset is named by its file stem (``canadian_flights_1000``) or by a
+    path; either must resolve to a .json file inside one of ``roots``.
+    Loaded engines are kept least recently used first and evicted once
+    their combined ``FlightEngine.nbytes`` exceeds ``max_bytes``. The
+    ``default`` dataset, the engine just requested and engines holding
+    applied changes (``version`` > 0, which live only in memory) are never
+    evicted.
+    Loading a dated dataset also preloads the next day in the background.
+
+    ``on_evict(name, engine)`` is called for every engine dropped, which is
+    then closed. ``shutdown`` closes every engine still loaded.
+    """
+
+    def __init__(
+        self,
+        roots,
+        default,
+        max_bytes=1 << 30,
+        cache_root=".cache",
+        workers=1,
+        preload_next_day=True,
+        on_evict=None,
+    ):
+        self.roots = [os.path.realpath(r) for r in roots]
+        self.max_bytes = max_bytes
+        self.cache_root = cache_root
+        self.workers = workers
+        self.preload_next_day = preload_next_day
+        self.on_evict = on_evict
+        self._engines = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}
+        self._preloads = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="preload")
+        self.default = self.resolve(default)[0]
+
+    def resolve(self, dataset):
+        """(name, path) of a dataset given by name or path.
+
+        Names are looked up in ``roots`` in order, so file stems should be
+        unique across roots.
+        """
+        if os.sep in dataset or dataset.endswith(".json"):
+            candidates = [os.path.realpath(dataset)]
+        else:
+            candidates = [
+                os.path.realpath(os.path.join(root, dataset + ".json"))
+                for root in self.roots
+            ]
+        for path in candidates:
+            if os.path.dirname(path) in self.roots and os.path.isfile(path):
+                return os.path.splitext(os.path.basename(path))[0], path
+        raise DatasetNotFound(dataset)
+
+    def available(self):
+        """Names of all datasets under the roots."""
+        names = set()
+        for root in self.roots:
+            if os.path.isdir(root):
+                names.update(
+                    os.path.splitext(f)[0]
+                    for f in os.listdir(root)
+                    if f.endswith(".json")
+                )
+        return sorted(names)
+
+    def loaded(self):
+        """(name, nbytes) of loaded engines, least recently used first."""
+        with self._lock:
+            return [(name, engine.nbytes) for name, engine in self._engines.items()]
+
+    @property
+    def nbytes(self):
+        return sum(size for _, size in self.loaded())
+
+    def peek(self, dataset=None):
+        """The loaded engine for a dataset, or None; does not load."""
+        name = self.resolve(dataset or self.default)[0]
+        with self._lock:
+            engine = self._engines.get(name)
+            if engine is not None:
+                self._engines.move_to_end(name)
+            return engine
+
+    def get(self, dataset=None, preload_next_day=True, warm=True):
+        """Engine for a dataset (the default if None), loading it if needed.
+
+        A load warms the stats and hotspot cube unless ``warm`` is False
+        (for callers that run detection themselves, e.g. to stream it).
+        """
+        name, path = self.resolve(dataset or self.default)
+        with self._lock:
+            engine = self._engines.get(name)
+            if engine is not None:
+                self._engines.move_to_end(name)
+                return engine
+            # One load per dataset; concurrent callers wait for it
+            loading = self._loading.get(name)
+            if loading is None:
+                loading = self._loading[name] = threading.Lock()
+        with loading:
+            with self._lock:
+                engine = self._engines.get(name)
+            if engine is None:
+                engine = self._load(name, path, warm)
+                with self._lock:
+                    self._engines[name] = engine
+                    self._loading.pop(name, None)
+                    evicted = self._evict(keep=name)
+                for item in evicted:
+                    if self.on_evict is not None:
+                        self.on_evict(*item)
+                    item[1].close()
+                if self.preload_next_day and preload_next_day:
+                    self.preload(next_day_name(name))
+        return engine
+
+    def _load(self, name, path, warm=True):
+        engine = FlightEngine(
+            path,
+            workers=self.workers,
+            snapshot_dir=os.path.join(self.cache_root, "snapshots", name),
+            cache_dir=os.path.join(self.cache_root, "results"),
+        )
+        if warm:
+            # Warm what every page needs (restored from the result cache if known)
+            engine.get_stats()
+            engine.get_hotspot_cube()
+        return engine
+
+    def _evict(self, keep):
+        evicted = []
+        total = sum(engine.nbytes for engine in self._engines.values())
+        for name in list(self._engines):
+            if total <= self.max_bytes:
+                break
+            if name in (keep, self.default) or self._engines[name].version > 0:
+                continue
+            engine = self._engines.pop(name)
+            total -= engine.nbytes
+            evicted.append((name, engine))
+        return evicted
+
+    def preload(self, dataset):
+        """Loads a dataset in the background if it exists and is not loaded.
+
+        Returns the Future of the load, or None.
+        """
+        if dataset is None:
+            return None
+        try:
+            name, _ = self.resolve(dataset)
+        except DatasetNotFound:
+            return None
+        with self._lock:
+            if name in self._engines:
+                return None
+            future = self._preloads.get(name)
+            if future is None or future.done():
+                future = self._preloads[name] = self._executor.submit(
+                    self.get, name, False
+                )
+        return future
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            engines = list(self._engines.values())
+        for engine in engines:
+            engine.close()
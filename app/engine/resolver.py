@@ -0,0 +1,160 @@
+import time
+from collections import Counter
+from itertools import product
+
+# Options tried for each flight, relative to its filed schedule
+DELAY_STEPS_MIN = (2, 5, 10, 15, 20, 30, 45, 60)
+LEVEL_STEPS_FT = (-4000, -2000, 2000, 4000)
+
+# Cost in delay-minute equivalents. A flight level change scores like a
+# 5 minute delay, as in propose_resolutions (85 vs 100 - 3 per minute).
+DELAY_COST_PER_MIN = 1.0
+LEVEL_CHANGE_COST = 5.0
+
+
+def change_cost(delay_min, alt_change_ft):
+    return (
+        DELAY_COST_PER_MIN * delay_min + LEVEL_CHANGE_COST * abs(alt_change_ft) / 2000
+    )
+
+
+def _conflict_pairs(conflicts):
+    return {tuple(sorted((c["acid1"], c["acid2"]))) for c in conflicts}
+
+
+def _options(filed, constraints, delays_min, level_steps_ft):
+    """(delay, altitude change, cost) options for one flight, cheapest first."""
+    options = []
+    for delay, step in product((0,) + tuple(delays_min), (0,) + tuple(level_steps_ft)):
+        alt = filed["altitude"] + step
+        if step and not constraints["min_alt"] <= alt <= constraints["max_alt"]:
+            continue
+        options.append((delay, step, change_cost(delay, step)))
+    options.sort(key=lambda o: (o[2], o[0], abs(o[1]), o[1]))
+    return options
+
+
+def plan_resolutions(
+    engine,
+    time_budget_sec=5.0,
+    delays_min=DELAY_STEPS_MIN,
+    level_steps_ft=LEVEL_STEPS_FT,
+    progress=None,
+):
+    """Searches for departure delays and flight level changes that clear the day's conflicts.
+
+    Works on ``engine.fork()``, so the live schedule is untouched. Each step
+    takes the flight involved in the most conflict pairs and tries every
+    delay / level option (within ``get_constraints``) against all traffic in
+    one batch: the cheapest conflict-free option wins, otherwise the option
+    leaving it with the fewest conflicts, if that is an improvement. Applied
+    moves go through ``update_flight``, which refreshes only that flight's
+    conflicts, and each one strictly lowers the number of conflict pairs.
+    Stops when no pairs remain, no flight can improve, or the time budget is
+    spent. Options are relative to the filed schedule, so a flight moved
+    twice keeps only its final change.
+
+    ``progress(fraction, message)``, if given, is called before each step
+    with the share of conflict pairs cleared so far; an exception it raises
+    (e.g. a cancelled job) stops the search.
+    """
+    started = time.monotonic()
+    work = engine.fork()
+    pairs = _conflict_pairs(work.find_conflicts())
+    initial_pairs = len(pairs)
+    changes = {}
+    stuck = set()
+    timed_out = False
+
+    while pairs:
+        if progress is not None:
+            progress(
+                1 - len(pairs) / initial_pairs, f"{len(pairs)} conflict pairs left"
+            )
+        if time.monotonic() - started > time_budget_sec:
+            timed_out = True
+            break
+        counts = Counter(acid for pair in pairs for acid in pair)
+        movable = [acid for acid in counts if acid not in stuck]
+        if not movable:
+            break
+        # Most entangled flight first; among equals, the later departure
+        acid = max(
+            movable,
+            key=lambda a: (
+                counts[a],
+                work.store.get(a)["departure time"],
+                work.store.index_of(a),
+            ),
+        )
+
+        filed = engine.store.get(acid)
+        current = changes.get(acid, (0, 0, 0.0))[:2]
+        options = [
+            o
+            for o in _options(
+                filed,
+                engine.get_constraints(filed["Plane type"]),
+                delays_min,
+                level_steps_ft,
+            )
+            if o[:2] != current
+        ]
+        candidates = []
+        for delay, step, _ in options:
+            candidate = dict(filed)
+            candidate["departure time"] = filed["departure time"] + delay * 60
+            candidate["altitude"] = filed["altitude"] + step
+            candidates.append(candidate)
+        _, blocking = work._validate_candidates(work.store.index_of(acid), candidates)
+
+        best = min(range(len(options)), key=lambda k: (blocking[k], k), default=None)
+        if best is None or blocking[best] >= counts[acid]:
+            stuck.add(acid)
+            continue
+
+        delay, step, cost = options[best]
+        work.update_flight(
+            acid,
+            {
+                "departure_time": candidates[best]["departure time"],
+                "altitude": candidates[best]["altitude"],
+            },
+        )
+        if delay or step:
+            changes[acid] = (delay, step, cost)
+        else:
+            changes.pop(acid, None)
+        before = {other for pair in pairs if acid in pair for other in pair}
+        pairs = _conflict_pairs(work.find_conflicts())
+        # Flights that shared a conflict with the moved one may have new options
+        after = {other for pair in pairs if acid in pair for other in pair}
+        stuck -= before | after
+
+    plan = []
+    for acid, (delay, step, cost) in changes.items():
+        filed = engine.store.get(acid)
+        plan.append(
+            {
+                "acid": acid,
+                "departure_time": filed["departure time"] + delay * 60,
+                "altitude": filed["altitude"] + step,
+                "delay_mins": delay,
+                "altitude_change": step,
+                "cost": cost,
+            }
+        )
+    plan.sort(key=lambda c: engine.store.index_of(c["acid"]))
+
+    return {
+        "changes": plan,
+        "conflicts_before": initial_pairs,
+        "conflicts_after": len(pairs),
+        "unresolved": sorted(pairs),
+        "total_cost": sum(c["cost"] for c in plan),
+        "total_delay_mins": sum(c["delay_mins"] for c in plan),
+        "level_changes": sum(1 for c in plan if c["altitude_change"]),
+        "complete": not pairs,
+        "timed_out": timed_out,
+        "elapsed_sec": round(time.monotonic() - started, 3),
+    }
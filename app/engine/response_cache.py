@@ -0,0 +1,183 @@
+import gzip
+import hashlib
+import json
+import struct
+import threading
+import numpy as np
+from collections import OrderedDict
+
+# Bodies smaller than this are sent uncompressed
+GZIP_MIN_BYTES = 1024
+
+LEGS_MAGIC = b"PNL1"
+TRACKS_MAGIC = b"PNT1"
+
+
+class CachedBody:
+    """A serialized response body, its gzip form and its ETag."""
+
+    __slots__ = ("body", "gzipped", "etag", "media_type")
+
+    def __init__(self, body, media_type, tag):
+        self.body = body
+        self.media_type = media_type
+        digest = hashlib.blake2b(body, digest_size=8).hexdigest()
+        self.etag = f'"{tag}-{digest}"'
+        self.gzipped = (
+            gzip.compress(body, compresslevel=6, mtime=0)
+            if len(body) >= GZIP_MIN_BYTES
+            else None
+        )
+
+    def matches(self, if_none_match):
+        """True if an If-None-Match header value names this body."""
+        if not if_none_match:
+            return False
+        tags = [t.strip() for t in if_none_match.split(",")]
+        return "*" in tags or self.etag in tags or f"W/{self.etag}" in tags
+
+
+class ResponseCache:
+    """Serialized API responses keyed by request and engine data version.
+
+    Entries for older data versions are dropped as soon as a newer version
+    is seen, and at most ``max_entries`` bodies are kept (least recently
+    used first out).
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _sync(self, version):
+        if version != self.version:
+            self._entries.clear()
+            self.version = version
+
+    def get(self, key, version):
+        with self._lock:
+            self._sync(version)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, version, body, media_type="application/json"):
+        entry = CachedBody(body, media_type, f"v{version}")
+        with self._lock:
+            # Bodies built from data older than the newest seen are not kept
+            if self.version is None or version >= self.version:
+                self._sync(version)
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def dump_json(payload):
+    return json.dumps(payload, separators=(",", ":")).encode()
+
+
+def _legs_block(legs):
+    block = np.empty((8, len(legs)), dtype="<f8")
+    for k, leg in enumerate(legs):
+        block[:, k] = (
+            *leg["start"],
+            *leg["end"],
+            leg["t0"],
+            leg["t1"],
+            leg["alt"],
+            leg["dist"],
+        )
+    return block
+
+
+def pack_conflict_data(data):
+    """Compact little-endian encoding of a ``get_conflict_pair_data`` payload.
+
+    Layout: magic ``PNL1``; uint32 counts of legs1, legs2 and intervals;
+    then, for legs1 and legs2, eight float64 columns of that many values
+    (start lon, start lat, end lon, end lat, t0, t1, alt, dist); then the
+    intervals as (start, end) float64 pairs.
+    """
+    legs1 = _legs_block(data["legs1"])
+    legs2 = _legs_block(data["legs2"])
+    intervals = np.asarray(data["intervals"], dtype="<f8").reshape(-1, 2)
+    header = LEGS_MAGIC + struct.pack(
+        "<III", legs1.shape[1], legs2.shape[1], len(intervals)
+    )
+    return header + legs1.tobytes() + legs2.tobytes() + intervals.tobytes()
+
+
+def unpack_conflict_data(body):
+    """Inverse of ``pack_conflict_data``."""
+    if body[:4] != LEGS_MAGIC:
+        raise ValueError("not a packed conflict payload")
+    n1, n2, n_int = struct.unpack_from("<III", body, 4)
+    values = np.frombuffer(body, dtype="<f8", offset=16)
+
+    def legs(block):
+        return [
+            {
+                "start": [lon0, lat0],
+                "end": [lon1, lat1],
+                "t0": t0,
+                "t1": t1,
+                "alt": alt,
+                "dist": dist,
+            }
+            for lon0, lat0, lon1, lat1, t0, t1, alt, dist in block.T.tolist()
+        ]
+
+    legs1 = values[: 8 * n1].reshape(8, n1)
+    legs2 = values[8 * n1 : 8 * (n1 + n2)].reshape(8, n2)
+    intervals = values[8 * (n1 + n2) :].reshape(n_int, 2)
+    return {
+        "legs1": legs(legs1),
+        "legs2": legs(legs2),
+        "intervals": intervals.tolist(),
+    }
+
+
+def pack_trajectories(tracks):
+    """Little-endian float32 encoding of flight tracks for typed arrays.
+
+    ``tracks`` is a list of (lat, lon, alt, t) array tuples. Layout: magic
+    ``PNT1``; uint32 track count F; float64 base time; uint32 sample
+    offsets (F + 1 values, track k is samples offsets[k] to offsets[k + 1]);
+    then four float32 columns of all samples: lon, lat, alt and seconds
+    since the base time. Columns start 4-byte aligned, so a browser can view
+    them with ``new Float32Array(buffer, offset, count)``.
+    """
+    offsets = np.zeros(len(tracks) + 1, dtype="<u4")
+    offsets[1:] = np.cumsum([len(track[3]) for track in tracks])
+    columns = [
+        np.concatenate([track[k] for track in tracks]) if tracks else np.empty(0)
+        for k in range(4)
+    ]
+    lat, lon, alt, t = columns
+    base = float(t.min()) if len(t) else 0.0
+    block = np.stack([lon, lat, alt, t - base]).astype("<f4")
+    header = TRACKS_MAGIC + struct.pack("<Id", len(tracks), base)
+    return header + offsets.tobytes() + block.tobytes()
+
+
+def unpack_trajectories(body):
+    """Inverse of ``pack_trajectories`` (float32 precision)."""
+    if body[:4] != TRACKS_MAGIC:
+        raise ValueError("not a packed trajectory payload")
+    count, base = struct.unpack_from("<Id", body, 4)
+    offsets = np.frombuffer(body, dtype="<u4", count=count + 1, offset=16)
+    n = int(offsets[-1])
+    block = np.frombuffer(body, dtype="<f4", offset=16 + offsets.nbytes)
+    lon, lat, alt, dt = block.reshape(4, n).astype(np.float64)
+    return [
+        (lat[a:b], lon[a:b], alt[a:b], dt[a:b] + base)
+        for a, b in zip(offsets[:-1].tolist(), offsets[1:].tolist())
+    ]
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import time
+
+
+def dataset_key(flights, *parts):
+    """Content hash of the flight records plus any extra key ``parts``.
+
+    Records are hashed field by field in sorted key order, so the key depends
+    only on the data, not on how it was loaded (JSON or snapshot).
+    """
+    h = hashlib.sha256()
+    h.update(json.dumps(parts, sort_keys=True, default=str).encode())
+    for f in flights:
+        h.update(json.dumps(dict(f), sort_keys=True).encode())
+        h.update(b"\n")
+    return h.hexdigest()
+
+
+class ResultCache:
+    """Pickled results in a directory, one file per key.
+
+    Writes go to a temporary file in the same directory and are renamed into
+    place, so a reader sees either the old entry or the new one, never a
+    partial file. Reading an entry marks it as recently used; beyond
+    ``max_entries`` the least recently used entries are deleted.
+    """
+
+    SUFFIX = ".pkl"
+
+    def __init__(self, directory, max_entries=8):
+        self.directory = directory
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def get(self, key):
+        """Cached value for ``key``, or None if missing or unreadable."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Truncated or from an incompatible version: drop it
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def put(self, key, value):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            self._remove(tmp)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Deletes entries beyond ``max_entries`` and abandoned temp files."""
+        entries = []
+        now = time.time_ns()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            if name.endswith(self.SUFFIX):
+                entries.append((mtime, path))
+            elif name.endswith(".tmp") and now - mtime > 3600 * 10**9:
+                self._remove(path)
+        entries.sort(reverse=True)
+        for _, path in entries[self.max_entries :]:
+            self._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
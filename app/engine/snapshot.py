@@ -0,0 +1,293 @@
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+from collections.abc import MutableMapping
+from app.engine.legs import LegTable, route_waypoints
+
+SNAPSHOT_VERSION = 2
+
+# Flight record key -> (column file, dtype)
+FLIGHT_FIELDS = {
+    "ACID": ("acid", np.str_),
+    "Plane type": ("plane_type", np.str_),
+    "route": ("route", np.str_),
+    "altitude": ("altitude", np.int64),
+    "departure airport": ("departure_airport", np.str_),
+    "arrival airport": ("arrival_airport", np.str_),
+    "departure time": ("departure_time", np.float64),
+    "aircraft speed": ("aircraft_speed", np.float64),
+    "passengers": ("passengers", np.int64),
+    "is_cargo": ("is_cargo", np.bool_),
+}
+# Float columns read back as int when whole, like the JSON numbers they hold
+WHOLE_NUMBER_FIELDS = {"departure time"}
+
+
+def normalize_record(record):
+    """Makes a flight dict from JSON match its snapshot row.
+
+    A missing route (null) becomes "" and a whole-number departure time an
+    int, so ``dataset_key`` (and the results cached under it) is the same
+    whether the data was loaded from JSON or from a snapshot.
+    """
+    if record.get("route") is None:
+        record["route"] = ""
+    t = record.get("departure time")
+    if isinstance(t, float) and t.is_integer():
+        record["departure time"] = int(t)
+    return record
+
+
+def iter_json_array(path, chunk_size=1 << 20):
+    """Yields the elements of a top-level JSON array one at a time.
+
+    The file is read in ``chunk_size`` pieces, so only the current element
+    and a small buffer are held in memory.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r") as f:
+        buf = ""
+        pos = 0
+        eof = False
+        started = False
+
+        def fill():
+            nonlocal buf, pos, eof
+            chunk = f.read(chunk_size)
+            if not chunk:
+                eof = True
+            buf = buf[pos:] + chunk
+            pos = 0
+
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                if buf[pos] == "," and not started:
+                    raise ValueError("expected '[' at start of JSON array")
+                pos += 1
+            if pos >= len(buf):
+                if eof:
+                    raise ValueError("unterminated JSON array")
+                fill()
+                continue
+            if not started:
+                if buf[pos] != "[":
+                    raise ValueError("expected '[' at start of JSON array")
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+                continue
+            if end == len(buf) and not eof:
+                # A number may continue in the next chunk
+                fill()
+                continue
+            pos = end
+            yield item
+
+
+def _flight_chunk(records):
+    """Columns for a batch of flight dicts."""
+    cols = {}
+    for key, (name, dtype) in FLIGHT_FIELDS.items():
+        default = "" if dtype is np.str_ else 0
+        values = [r.get(key, default) for r in records]
+        if key == "route":
+            values = [v or "" for v in values]
+        cols[name] = np.array(values, dtype=dtype)
+    return cols
+
+
+def _save(directory, name, array):
+    np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(array))
+
+
+def write_snapshot(records, out_dir, airport_coords, batch_size=50000, source=None):
+    """Writes flight, waypoint and leg columns for ``records`` to ``out_dir``.
+
+    ``records`` may be any iterable of flight dicts (e.g. ``iter_json_array``);
+    it is consumed in batches of ``batch_size`` so the dicts never all exist
+    at once. The directory is written next to ``out_dir`` and renamed into
+    place, so readers never see a partial snapshot.
+    """
+    batches = []
+    batch = []
+    for r in records:
+        batch.append(r)
+        if len(batch) >= batch_size:
+            batches.append(_flight_chunk(batch))
+            batch = []
+    if batch or not batches:
+        batches.append(_flight_chunk(batch))
+
+    flights = {
+        name: np.concatenate([b[name] for b in batches])
+        for name, _ in FLIGHT_FIELDS.values()
+    }
+    n_wp, wp_lat, wp_lon = route_waypoints(flights["route"])
+    legs = LegTable.from_columns(
+        flights["acid"],
+        flights["departure_time"],
+        flights["aircraft_speed"],
+        flights["altitude"],
+        flights["departure_airport"],
+        flights["arrival_airport"],
+        n_wp,
+        wp_lat,
+        wp_lon,
+        airport_coords,
+    )
+
+    parent = os.path.dirname(os.path.abspath(out_dir))
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=parent, prefix=".snapshot-")
+    try:
+        for sub in ("flights", "waypoints", "legs"):
+            os.makedirs(os.path.join(tmp, sub))
+        for name, array in flights.items():
+            _save(os.path.join(tmp, "flights"), name, array)
+        _save(
+            os.path.join(tmp, "waypoints"),
+            "offsets",
+            np.concatenate([[0], np.cumsum(n_wp)]),
+        )
+        _save(os.path.join(tmp, "waypoints"), "lat", wp_lat)
+        _save(os.path.join(tmp, "waypoints"), "lon", wp_lon)
+        for name in LegTable.COLUMNS:
+            _save(os.path.join(tmp, "legs"), name, getattr(legs, name))
+        _save(os.path.join(tmp, "legs"), "flight", legs.flight)
+        _save(os.path.join(tmp, "legs"), "offsets", legs.offsets)
+        meta = {
+            "version": SNAPSHOT_VERSION,
+            "flights": len(flights["acid"]),
+            "legs": len(legs),
+            "airports": {k: list(v) for k, v in airport_coords.items()},
+            "source": source,
+        }
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+
+        if os.path.exists(out_dir):
+            shutil.rmtree(out_dir)
+        os.rename(tmp, out_dir)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+
+def convert_json(json_path, out_dir, airport_coords, batch_size=50000):
+    """Streams a JSON flight file into a snapshot without loading it whole."""
+    st = os.stat(json_path)
+    source = {
+        "path": os.path.abspath(json_path),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+    }
+    write_snapshot(
+        iter_json_array(json_path), out_dir, airport_coords, batch_size, source
+    )
+
+
+def snapshot_is_current(snapshot_dir, json_path, airport_coords):
+    """True if ``snapshot_dir`` was built from the current ``json_path``."""
+    try:
+        with open(os.path.join(snapshot_dir, "meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    st = os.stat(json_path)
+    source = meta.get("source") or {}
+    return (
+        meta.get("version") == SNAPSHOT_VERSION
+        and source.get("size") == st.st_size
+        and source.get("mtime_ns") == st.st_mtime_ns
+        and meta.get("airports") == {k: list(v) for k, v in airport_coords.items()}
+    )
+
+
+class FlightRecord(MutableMapping):
+    """Dict-like view of one row of a ``FlightColumns`` table.
+
+    Reads and writes go straight to the column arrays, so records behave
+    like the flight dicts loaded from JSON.
+    """
+
+    __slots__ = ("table", "row")
+
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+
+    def __getitem__(self, key):
+        try:
+            name, _ = FLIGHT_FIELDS[key]
+        except KeyError:
+            raise KeyError(key) from None
+        value = self.table.columns[name][self.row].item()
+        if key in WHOLE_NUMBER_FIELDS and value.is_integer():
+            return int(value)
+        return value
+
+    def __setitem__(self, key, value):
+        try:
+            name, _ = FLIGHT_FIELDS[key]
+        except KeyError:
+            raise KeyError(f"{key!r} is not a snapshot column") from None
+        self.table.columns[name][self.row] = value
+
+    def __delitem__(self, key):
+        raise TypeError("snapshot flight fields cannot be deleted")
+
+    def __iter__(self):
+        return iter(FLIGHT_FIELDS)
+
+    def __len__(self):
+        return len(FLIGHT_FIELDS)
+
+    def copy(self):
+        return dict(self)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class FlightColumns:
+    """Memory-mapped flight columns of a snapshot."""
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns["acid"])
+
+    def records(self):
+        return [FlightRecord(self, i) for i in range(len(self))]
+
+
+def load_snapshot(snapshot_dir):
+    """Opens a snapshot with memory-mapped columns.
+
+    Arrays are mapped copy-on-write: edits (e.g. applied fixes) stay in this
+    process and never touch the files. Returns (flight records, LegTable).
+    """
+
+    def load(sub, name):
+        return np.load(os.path.join(snapshot_dir, sub, f"{name}.npy"), mmap_mode="c")
+
+    columns = {name: load("flights", name) for name, _ in FLIGHT_FIELDS.values()}
+    flights = FlightColumns(columns)
+    legs = LegTable(
+        {name: load("legs", name) for name in LegTable.COLUMNS},
+        load("legs", "flight"),
+        load("legs", "offsets"),
+        columns["acid"].tolist(),
+    )
+    return flights.records(), legs
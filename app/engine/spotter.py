@@ -1,16 +1,48 @@
-import os
-import json
+import asyncio
 import time
+from urllib.parse import urljoin
 import requests
 from bs4 import BeautifulSoup
+from app.engine.image_cache import ImageCache
+
+PLANESPOTTERS_URL = "https://www.planespotters.net"
+# Where .cache/aircraft_images is served (see app/main.py)
+IMAGES_URL = "/static/cache/aircraft_images"
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+# Failed lookups are retried after a day
+RETRY_AFTER_SEC = 86400
 
 
 class SpotterEngine:
-    def __init__(self, cache_dir=".cache"):
+    """Aircraft photos from Planespotters, cached on disk.
+
+    ``get_image`` is a coroutine. Downloads run in worker threads, at most
+    ``max_concurrent`` at a time and with request starts at least
+    ``min_interval`` seconds apart, so the event loop never waits on the
+    network and the site is not hammered. Concurrent calls for the same
+    plane type share one fetch. ``base_url`` points the fetcher at another
+    server (e.g. a local stand-in in tests).
+
+    Images and lookup results live in an ``ImageCache`` under ``cache_dir``,
+    holding at most ``max_bytes`` of images.
+    """
+
+    def __init__(
+        self,
+        cache_dir=".cache",
+        base_url=PLANESPOTTERS_URL,
+        max_concurrent=2,
+        min_interval=1.0,
+        timeout=10.0,
+        max_bytes=64 << 20,
+    ):
         self.cache_dir = cache_dir
-        self.images_dir = os.path.join(cache_dir, "aircraft_images")
-        self.registry_path = os.path.join(cache_dir, "registry.json")
-        os.makedirs(self.images_dir, exist_ok=True)
+        self.cache = ImageCache(cache_dir, max_bytes=max_bytes)
+        self.base_url = base_url.rstrip("/")
+        self.min_interval = min_interval
+        self.timeout = timeout
 
         # Mapping from flight data "Plane type" to Planespotters "actype"
         self.mapping = {
@@ -28,102 +60,110 @@ class SpotterEngine:
             "Boeing 777-300ER": "s_boeing-777-300er",
         }
 
-        self.registry = self._load_registry()
-
-    def _load_registry(self):
-        if os.path.exists(self.registry_path):
-            try:
-                with open(self.registry_path, "r") as f:
-                    return json.load(f)
-            except:
-                return {}
-        return {}
-
-    def _save_registry(self):
-        with open(self.registry_path, "w") as f:
-            json.dump(self.registry, f, indent=2)
+        self._in_flight = {}
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._slot_lock = asyncio.Lock()
+        self._next_slot = 0.0
 
-    def get_image(self, plane_type):
+    async def get_image(self, plane_type):
         """Returns the local path to the aircraft image, fetching if necessary."""
-        if plane_type in self.registry:
-            entry = self.registry[plane_type]
+        # The lookup reads the log and touches the file; keep it off the loop
+        entry = await asyncio.to_thread(self.cache.get, plane_type)
+        if entry is not None:
             if entry["status"] == "success":
                 return entry["local_path"]
-            # If failed, only retry after 24 hours
-            if entry["status"] in ["not_found", "error"]:
-                if time.time() - entry.get("last_attempt", 0) < 86400:
-                    return None
-
-        return self._fetch_and_cache(plane_type)
+            if time.time() - entry.get("last_attempt", 0) < RETRY_AFTER_SEC:
+                return None
 
-    def _fetch_and_cache(self, plane_type):
+        task = self._in_flight.get(plane_type)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_and_cache(plane_type))
+            self._in_flight[plane_type] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(plane_type, None))
+        # A caller giving up (e.g. on its deadline) leaves the fetch running
+        return await asyncio.shield(task)
+
+    async def prefetch(self, plane_types=None):
+        """Fetches the images of all mapped plane types (or ``plane_types``).
+
+        Returns {plane type: local path or None}.
+        """
+        types = list(self.mapping if plane_types is None else plane_types)
+        paths = await asyncio.gather(*(self.get_image(t) for t in types))
+        return dict(zip(types, paths))
+
+    async def _polite(self):
+        # Reserve the next start slot, then wait for it without holding a thread
+        async with self._slot_lock:
+            now = time.monotonic()
+            start = max(now, self._next_slot)
+            self._next_slot = start + self.min_interval
+        await asyncio.sleep(start - now)
+
+    async def _get(self, url):
+        await self._polite()
+        response = await asyncio.to_thread(
+            requests.get, url, headers=HEADERS, timeout=self.timeout
+        )
+        retry_after = response.headers.get("Retry-After", "")
+        if response.status_code in (429, 503) and retry_after.isdigit():
+            # Asked to back off: hold every later request
+            self._next_slot = max(self._next_slot, time.monotonic() + int(retry_after))
+        if response.status_code != 200:
+            raise Exception(f"HTTP {response.status_code}")
+        return response
+
+    async def _record(self, plane_type, entry):
+        entry["last_attempt"] = time.time()
+        await asyncio.to_thread(self.cache.put, plane_type, entry)
+
+    async def _fetch_and_cache(self, plane_type):
         actype = self.mapping.get(plane_type)
         if not actype:
-            self.registry[plane_type] = {
-                "status": "error",
-                "message": "No mapping found for plane type",
-                "last_attempt": time.time(),
-            }
-            self._save_registry()
+            await self._record(
+                plane_type,
+                {"status": "error", "message": "No mapping found for plane type"},
+            )
             return None
 
-        search_url = f"https://www.planespotters.net/photo/search?actype={actype}&sort=latest&s=hq"
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
-
+        search_url = f"{self.base_url}/photo/search?actype={actype}&sort=latest&s=hq"
         try:
-            # Respectful delay before external call
-            time.sleep(1)
-            response = requests.get(search_url, headers=headers, timeout=10)
-            if response.status_code != 200:
-                raise Exception(f"HTTP {response.status_code}")
-
-            soup = BeautifulSoup(response.text, "html.parser")
-            photo_card = soup.find(class_="photo-card-clickable")
-
-            if not photo_card:
-                self.registry[plane_type] = {
-                    "status": "not_found",
-                    "last_attempt": time.time(),
-                }
-                self._save_registry()
-                return None
-
-            img_tag = photo_card.find("img")
-            if not img_tag:
-                return None
-
-            src = img_tag.get("src")
-            if not src or not isinstance(src, str):
-                return None
-
-            img_url: str = src
-
-            # Save image
-            slug = plane_type.lower().replace(" ", "-").replace("/", "-")
-            ext = img_url.split(".")[-1].split("?")[0]  # strip query params if any
-            local_filename = f"{slug}.{ext}"
-            local_path = os.path.join(self.images_dir, local_filename)
+            async with self._semaphore:
+                response = await self._get(search_url)
+                img_url = await asyncio.to_thread(_photo_url, response.text, search_url)
+                if img_url is None:
+                    await self._record(plane_type, {"status": "not_found"})
+                    return None
 
-            img_response = requests.get(img_url, headers=headers, timeout=10)
-            with open(local_path, "wb") as f:
-                f.write(img_response.content)
+                img_response = await self._get(img_url)
+                # Named by content; the extension comes from the URL
+                ext = img_url.split(".")[-1].split("?")[0]
+                local_filename = await asyncio.to_thread(
+                    self.cache.store, img_response.content, ext
+                )
+        except Exception as e:
+            await self._record(plane_type, {"status": "error", "message": str(e)})
+            return None
 
-            self.registry[plane_type] = {
+        local_path = f"{IMAGES_URL}/{local_filename}"
+        await self._record(
+            plane_type,
+            {
                 "status": "success",
                 "actype": actype,
-                "local_path": f"/static/cache/aircraft_images/{local_filename}",
-                "last_attempt": time.time(),
-            }
-            self._save_registry()
-            return self.registry[plane_type]["local_path"]
-
-        except Exception as e:
-            self.registry[plane_type] = {
-                "status": "error",
-                "message": str(e),
-                "last_attempt": time.time(),
-            }
-            self._save_registry()
-            return None
+                "file": local_filename,
+                "local_path": local_path,
+            },
+        )
+        return local_path
+
+
+def _photo_url(html, page_url):
+    """URL of the first photo on a search results page, or None."""
+    soup = BeautifulSoup(html, "html.parser")
+    photo_card = soup.find(class_="photo-card-clickable")
+    img_tag = photo_card.find("img") if photo_card else None
+    src = img_tag.get("src") if img_tag else None
+    if not src or not isinstance(src, str):
+        return None
+    return urljoin(page_url, src)
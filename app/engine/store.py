@@ -0,0 +1,113 @@
+import numpy as np
+from bisect import insort
+
+
+def airline_prefix(acid):
+    """Airline designator of a callsign, e.g. "ACA" for "ACA821"."""
+    return acid.rstrip("0123456789")
+
+
+class FlightStore:
+    """Flight records with O(1) lookup by ACID and secondary indexes.
+
+    Flights keep their file order; the position of a flight in ``flights`` is
+    its flight index, shared with the leg table (``legs.offsets``).
+    """
+
+    def __init__(self, flights):
+        self.flights = flights
+        self.legs = None
+        self._by_acid = {}
+        self._by_departure = {}
+        self._by_arrival = {}
+        self._by_airline = {}
+        for i, f in enumerate(flights):
+            self._by_acid[f["ACID"]] = i
+            self._add_secondary(i, f)
+        self._dep_order = None
+        self._dep_sorted = None
+
+    def _secondary_keys(self, f):
+        return (
+            (self._by_departure, f["departure airport"]),
+            (self._by_arrival, f["arrival airport"]),
+            (self._by_airline, airline_prefix(f["ACID"])),
+        )
+
+    def _add_secondary(self, i, f):
+        # Buckets stay sorted by flight index (file order)
+        for index, key in self._secondary_keys(f):
+            insort(index.setdefault(key, []), i)
+
+    def _remove_secondary(self, i, f):
+        for index, key in self._secondary_keys(f):
+            index[key].remove(i)
+
+    def __len__(self):
+        return len(self.flights)
+
+    def __iter__(self):
+        return iter(self.flights)
+
+    def __getitem__(self, i):
+        return self.flights[i]
+
+    def __contains__(self, acid):
+        return acid in self._by_acid
+
+    def index_of(self, acid):
+        """Flight index for an ACID, or None."""
+        return self._by_acid.get(acid)
+
+    def get(self, acid):
+        """Flight record for an ACID, or None."""
+        i = self._by_acid.get(acid)
+        return None if i is None else self.flights[i]
+
+    def attach_legs(self, legs):
+        """Links the leg table built from these flights (same flight order)."""
+        self.legs = legs
+
+    def leg_rows(self, acid):
+        """Row range of the flight's legs in the attached leg table."""
+        i = self._by_acid.get(acid)
+        if i is None or self.legs is None:
+            return range(0)
+        return self.legs.rows_for_flight(i)
+
+    def reindex(self, i, old_flight):
+        """Refreshes the indexes of flight ``i`` after its record changed."""
+        new_flight = self.flights[i]
+        if old_flight["ACID"] != new_flight["ACID"]:
+            del self._by_acid[old_flight["ACID"]]
+            self._by_acid[new_flight["ACID"]] = i
+        self._remove_secondary(i, old_flight)
+        self._add_secondary(i, new_flight)
+        if old_flight["departure time"] != new_flight["departure time"]:
+            self._dep_order = None
+
+    def departing(self, airport):
+        return [self.flights[i] for i in self._by_departure.get(airport, [])]
+
+    def arriving(self, airport):
+        return [self.flights[i] for i in self._by_arrival.get(airport, [])]
+
+    def by_airline(self, prefix):
+        return [self.flights[i] for i in self._by_airline.get(prefix, [])]
+
+    def departure_order(self):
+        """Flight indexes sorted by departure time, and the sorted times."""
+        if self._dep_order is None:
+            times = np.array(
+                [f["departure time"] for f in self.flights], dtype=np.float64
+            )
+            self._dep_order = np.argsort(times, kind="stable")
+            self._dep_sorted = times[self._dep_order]
+        return self._dep_order, self._dep_sorted
+
+    def departing_between(self, start, end):
+        """Flights departing in [start, end), ordered by departure time."""
+        order, times = self.departure_order()
+        lo = np.searchsorted(times, start, "left")
+        hi = np.searchsorted(times, end, "left")
+        return [self.flights[i] for i in order[lo:hi].tolist()]
@@ -0,0 +1,195 @@
+import json
+import numpy as np
+from app.engine.trajectory import AIRPORTS, FlightEngine
+
+# Fixes used by the sample flight plans
+WAYPOINTS = (
+    (44.55, -75.22),
+    (45.88, -78.031),
+    (46.15, -84.33),
+    (47.50, -69.88),
+    (48.22, -118.55),
+    (49.64, -92.114),
+    (49.82, -86.449),
+    (49.97, -110.935),
+    (50.18, -71.405),
+    (50.77, -115.66),
+    (51.33, -100.44),
+    (52.45, -105.22),
+)
+
+# Aircraft type -> (speed range kts, passenger range; (0, 0) for freighters)
+AIRCRAFT = {
+    "Boeing 787-9": ((485, 505), (223, 303)),
+    "Boeing 777-300ER": ((480, 500), (338, 427)),
+    "Boeing 737-800": ((465, 485), (126, 179)),
+    "Boeing 737 MAX 8": ((465, 485), (141, 179)),
+    "Airbus A320": ((451, 470), (120, 150)),
+    "Airbus A321": ((450, 470), (150, 189)),
+    "Airbus A220-300": ((420, 439), (103, 127)),
+    "Embraer E195-E2": ((440, 440), (99, 125)),
+    "Dash 8-400": ((360, 360), (58, 74)),
+    "Boeing 767-300F": ((460, 480), (0, 0)),
+    "Boeing 757-200F": ((461, 480), (0, 0)),
+    "Airbus A300-600F": ((452, 469), (0, 0)),
+}
+
+# Airline -> (share of traffic, {aircraft type: share of the airline's fleet})
+AIRLINES = {
+    "ACA": (
+        0.27,
+        {
+            "Boeing 787-9": 41,
+            "Boeing 767-300F": 45,
+            "Airbus A320": 40,
+            "Boeing 777-300ER": 36,
+            "Airbus A321": 45,
+            "Airbus A220-300": 34,
+            "Boeing 737-800": 29,
+        },
+    ),
+    "FLE": (0.224, {"Boeing 737-800": 120, "Boeing 737 MAX 8": 104}),
+    "PAL": (0.209, {"Dash 8-400": 99, "Embraer E195-E2": 110}),
+    "WJA": (
+        0.203,
+        {"Boeing 737 MAX 8": 61, "Boeing 737-800": 75, "Boeing 787-9": 67},
+    ),
+    "CCA": (0.033, {"Boeing 767-300F": 20, "Boeing 757-200F": 13}),
+    "FDX": (0.032, {"Boeing 757-200F": 21, "Boeing 767-300F": 11}),
+    "UPS": (0.029, {"Airbus A300-600F": 14, "Boeing 767-300F": 15}),
+}
+
+# Relative departure traffic per airport (hubs busier)
+AIRPORT_WEIGHTS = {
+    "CYYZ": 171,
+    "CYVR": 129,
+    "CYYC": 117,
+    "CYUL": 116,
+    "CYOW": 98,
+    "CYEG": 86,
+    "CYHZ": 64,
+    "CYYJ": 52,
+    "CYWG": 50,
+    "CYQB": 47,
+    "CYXE": 36,
+    "CYYT": 34,
+}
+
+DAY_START = 1767780000  # first departure of the sample day (UTC)
+DAY_SPAN_SEC = 19 * 3600
+FLIGHTS_PER_DAY = 1000
+
+
+def _format_fix(lat, lon):
+    return (
+        f"{abs(lat):g}{'N' if lat >= 0 else 'S'}/{abs(lon):g}{'E' if lon >= 0 else 'W'}"
+    )
+
+
+def _fixes_between(dep, arr):
+    """Fixes whose longitude lies between two airports, in travel order."""
+    lon_a, lon_b = AIRPORTS[dep][1], AIRPORTS[arr][1]
+    lo, hi = min(lon_a, lon_b), max(lon_a, lon_b)
+    between = [w for w in WAYPOINTS if lo < w[1] < hi] or list(WAYPOINTS)
+    between.sort(key=lambda w: w[1], reverse=lon_b < lon_a)
+    return [_format_fix(lat, lon) for lat, lon in between]
+
+
+def _weighted(rng, weights, size):
+    weights = np.asarray(weights, dtype=np.float64)
+    return rng.choice(len(weights), size, p=weights / weights.sum())
+
+
+def generate_flights(n, seed=0, start_time=DAY_START, span_sec=None):
+    """``n`` flight plans in the format of the sample data files.
+
+    The same ``seed`` always gives the same flights. Airlines, fleets,
+    airports and fixes follow the sample day; speeds, altitudes and
+    passengers stay within each type's range and ``get_constraints``.
+    Departures are spread over ``span_sec`` on whole minutes. By default
+    the span grows with ``n`` to keep the sample's traffic density
+    (FLIGHTS_PER_DAY per 19 hour day); pass ``span_sec`` to pack more
+    flights into one day.
+    """
+    if span_sec is None:
+        span_sec = int(DAY_SPAN_SEC * max(1.0, n / FLIGHTS_PER_DAY))
+    rng = np.random.default_rng(seed)
+    airlines = list(AIRLINES)
+    types = list(AIRCRAFT)
+    airports = list(AIRPORT_WEIGHTS)
+
+    airline_idx = _weighted(rng, [AIRLINES[a][0] for a in airlines], n)
+    dep_minutes = np.sort(rng.integers(0, span_sec // 60, n))
+
+    # Aircraft type from each airline's fleet mix; unique flight numbers
+    # per airline (4 digits while they last)
+    type_idx = np.empty(n, dtype=np.int64)
+    numbers = np.empty(n, dtype=np.int64)
+    for k, airline in enumerate(airlines):
+        rows = np.nonzero(airline_idx == k)[0]
+        fleet = AIRLINES[airline][1]
+        fleet_types = np.array([types.index(t) for t in fleet])
+        type_idx[rows] = fleet_types[_weighted(rng, list(fleet.values()), len(rows))]
+        pool = max(9999, 2 * len(rows))
+        numbers[rows] = rng.choice(np.arange(1, pool + 1), len(rows), replace=False)
+
+    # Distinct departure and arrival airports, hubs busier
+    weights = [AIRPORT_WEIGHTS[a] for a in airports]
+    dep_idx = _weighted(rng, weights, n)
+    arr_idx = _weighted(rng, weights, n)
+    same = dep_idx == arr_idx
+    while same.any():
+        arr_idx[same] = _weighted(rng, weights, int(same.sum()))
+        same = dep_idx == arr_idx
+
+    # Per-type speed, passenger and flight level ranges
+    speed = np.empty(n)
+    pax = np.empty(n, dtype=np.int64)
+    level = np.empty(n, dtype=np.int64)
+    for k, plane in enumerate(types):
+        rows = np.nonzero(type_idx == k)[0]
+        (speed_lo, speed_hi), (pax_lo, pax_hi) = AIRCRAFT[plane]
+        limits = FlightEngine.get_constraints(plane)
+        speed[rows] = rng.integers(speed_lo, speed_hi + 1, len(rows))
+        pax[rows] = rng.integers(pax_lo, pax_hi + 1, len(rows))
+        level[rows] = rng.integers(
+            limits["min_alt"] // 1000, limits["max_alt"] // 1000 + 1, len(rows)
+        )
+
+    # 1-3 fixes along the way
+    n_fixes = _weighted(rng, [0.54, 0.41, 0.05], n) + 1
+    keys = rng.random((n, len(WAYPOINTS)))
+    fixes = {}
+
+    flights = []
+    for i in range(n):
+        dep, arr = airports[dep_idx[i]], airports[arr_idx[i]]
+        between = fixes.get((dep, arr))
+        if between is None:
+            between = fixes[(dep, arr)] = _fixes_between(dep, arr)
+        k = min(len(between), n_fixes[i])
+        picked = sorted(np.argsort(keys[i, : len(between)])[:k].tolist())
+        plane = types[type_idx[i]]
+        flights.append(
+            {
+                "ACID": f"{airlines[airline_idx[i]]}{numbers[i]}",
+                "Plane type": plane,
+                "route": " ".join(between[j] for j in picked),
+                "altitude": int(level[i]) * 1000,
+                "departure airport": dep,
+                "arrival airport": arr,
+                "departure time": int(start_time + dep_minutes[i] * 60),
+                "aircraft speed": float(speed[i]),
+                "passengers": int(pax[i]),
+                "is_cargo": AIRCRAFT[plane][1][1] == 0,
+            }
+        )
+    return flights
+
+
+def write_flights(path, n, seed=0, span_sec=None):
+    """Generates ``n`` flights and writes them as a JSON data file."""
+    flights = generate_flights(n, seed, span_sec=span_sec)
+    with open(path, "w") as f:
+        json.dump(flights, f, indent=2)
+    return path
@@ -1,110 +1,124 @@
 import json
+import threading
 import numpy as np
-import pandas as pd
-from datetime import datetime
-from math import radians, cos, sin, asin, sqrt, atan2, degrees
-
-
-def haversine(lat1, lon1, lat2, lon2):
-    """Calculate the great circle distance between two points in nautical miles."""
-    # Convert decimal degrees to radians
-    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-    # Haversine formula
-    dlon = lon2 - lon1
-    dlat = lat2 - lat1
-    a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
-    c = 2 * asin(sqrt(a))
-    # Radius of Earth in nautical miles is approximately 3440.06
-    nm = 3440.06 * c
-    return nm
-
-
-def interpolate_position(start_lat, start_lon, end_lat, end_lon, fraction):
-    """Interpolate position along a great circle path."""
-    if fraction <= 0:
-        return start_lat, start_lon
-    if fraction >= 1:
-        return end_lat, end_lon
-
-    lat1, lon1, lat2, lon2 = map(radians, [start_lat, start_lon, end_lat, end_lon])
-
-    # Distance between points
-    d = 2 * asin(
-        sqrt(
-            sin((lat1 - lat2) / 2) ** 2
-            + cos(lat1) * cos(lat2) * sin((lon1 - lon2) / 2) ** 2
-        )
-    )
-
-    A = sin((1 - fraction) * d) / sin(d)
-    B = sin(fraction * d) / sin(d)
-
-    x = A * cos(lat1) * cos(lon1) + B * cos(lat2) * cos(lon2)
-    y = A * cos(lat1) * sin(lon1) + B * cos(lat2) * sin(lon2)
-    z = A * sin(lat1) + B * sin(lat2)
-
-    lat = atan2(z, sqrt(x**2 + y**2))
-    lon = atan2(y, x)
-
-    return degrees(lat), degrees(lon)
-
-
-class Leg:
-    def __init__(self, acid, start_pt, end_pt, start_time, speed_kts, alt):
-        self.acid = acid
-        self.start_lat, self.start_lon = start_pt
-        self.end_lat, self.end_lon = end_pt
-        self.p0 = np.array([start_pt[1], start_pt[0]])  # [lon, lat]
-        self.p1 = np.array([end_pt[1], end_pt[0]])
-        self.t0 = start_time
-        self.alt = alt
-
-        # Distance in NM
-        self.dist = haversine(
-            self.start_lat, self.start_lon, self.end_lat, self.end_lon
-        )
-        # Duration in seconds
-        self.duration = (self.dist / speed_kts) * 3600 if speed_kts > 0 else 0
-        self.t1 = self.t0 + self.duration
-
-        # Velocity in deg/sec (Approximate for detection phase)
-        if self.duration > 0:
-            self.v = (self.p1 - self.p0) / self.duration
-        else:
-            self.v = np.array([0.0, 0.0])
-
-    def to_dict(self):
-        return {
-            "start": [self.start_lon, self.start_lat],
-            "end": [self.end_lon, self.end_lat],
-            "t0": self.t0,
-            "t1": self.t1,
-            "alt": self.alt,
-            "dist": self.dist,
-        }
+from collections import OrderedDict
+from app.engine import metrics
+from app.engine.aggregates import StatsAggregator
+from app.engine.broadphase import SpatioTemporalIndex
+from app.engine.congestion import airborne_intervals, occupancy_series, peak_occupancy
+from app.engine.flight_table import FlightTable
+from app.engine.geometry import haversine, interpolate_position
+from app.engine.hotspots import HotspotCube
+from app.engine.intervals import IntervalIndex
+from app.engine.legs import Leg, LegTable
+from app.engine.pairs import (
+    SEPARATION_METHOD,
+    SEPARATION_NM,
+    TOLERANCE_SEC,
+    VERTICAL_SEPARATION_FT,
+    evaluate_pairs,
+    closest_approach,
+    cross_rows,
+    merge_intervals,
+)
+from app.engine.parallel import ParallelEvaluator
+from app.engine.polylines import FlightPolyline
+from app.engine.result_cache import ResultCache, dataset_key
+from app.engine.snapshot import (
+    convert_json,
+    load_snapshot,
+    normalize_record,
+    snapshot_is_current,
+)
+from app.engine.store import FlightStore
+
+# Airport reference points (lat, lon)
+AIRPORTS = {
+    "CYYZ": (43.68, -79.63),
+    "CYVR": (49.19, -123.18),
+    "CYUL": (45.47, -73.74),
+    "CYYC": (51.11, -114.02),
+    "CYOW": (45.32, -75.67),
+    "CYWG": (49.91, -97.24),
+    "CYHZ": (44.88, -63.51),
+    "CYEG": (53.31, -113.58),
+    "CYQB": (46.79, -71.39),
+    "CYYJ": (48.65, -123.43),
+    "CYYT": (47.62, -52.75),
+    "CYXE": (52.17, -106.70),
+}
+
+# Bump when conflict or stats results change for the same input data, so
+# results persisted by older versions are no longer used
+ENGINE_VERSION = 2
 
 
 class FlightEngine:
-    def __init__(self, data_path):
-        with open(data_path, "r") as f:
-            self.flights = json.load(f)
-        self.airport_coords = {
-            "CYYZ": (43.68, -79.63),
-            "CYVR": (49.19, -123.18),
-            "CYUL": (45.47, -73.74),
-            "CYYC": (51.11, -114.02),
-            "CYOW": (45.32, -75.67),
-            "CYWG": (49.91, -97.24),
-            "CYHZ": (44.88, -63.51),
-            "CYEG": (53.31, -113.58),
-            "CYQB": (46.79, -71.39),
-            "CYYJ": (48.65, -123.43),
-            "CYYT": (47.62, -52.75),
-            "CYXE": (52.17, -106.70),
-        }
-        self.legs = self._precalculate_legs()
+    # Below this many candidate leg pairs a process pool costs more than it saves
+    parallel_min_pairs = 20000
+    # Horizontal separation test and its time tolerance (see evaluate_pairs)
+    separation_method = SEPARATION_METHOD
+    separation_tol_sec = TOLERANCE_SEC
+    # Approximate memory of one flight and one conflict record (dicts)
+    flight_record_bytes = 800
+    conflict_record_bytes = 700
+    # Flights whose sampled tracks are kept for playback (least recent out)
+    trajectory_cache_size = 4096
+
+    def __init__(self, data_path, workers=1, snapshot_dir=None, cache_dir=None):
+        self.workers = workers
+        # Process pool for large pair batches; its workers start on first use
+        self._parallel = ParallelEvaluator(workers)
+        self.airport_coords = dict(AIRPORTS)
+        if snapshot_dir is None:
+            with open(data_path, "r") as f:
+                self.flights = [normalize_record(r) for r in json.load(f)]
+            self.legs = self._precalculate_legs()
+        else:
+            # Columnar snapshot: rebuilt only when the JSON file changes
+            if not snapshot_is_current(snapshot_dir, data_path, self.airport_coords):
+                convert_json(data_path, snapshot_dir, self.airport_coords)
+            self.flights, self.legs = load_snapshot(snapshot_dir)
+        self._index = None
+        self._index_legs = None
+        # Bumped on every schedule change; keys caches of derived responses
+        self.version = 0
         self._cached_conflicts = None
         self._cached_stats = None
+        self._aggregates = None
+        self._aggregates_key = None
+        self._hotspots = None
+        self._hotspots_conflicts = None
+        self._timeline = None
+        self._timeline_key = None
+        self._conflict_timeline = None
+        self._conflict_timeline_conflicts = None
+        self._flight_table = None
+        self._flight_table_key = None
+        self._trajectories = OrderedDict()
+        self._trajectories_store = None
+        self._trajectories_lock = threading.Lock()
+        # Conflicts and stats persisted across restarts, keyed by data content
+        self._results = None if cache_dir is None else ResultCache(cache_dir)
+        self._results_stale = False
+        self._results_key = None
+        self._load_results()
+
+    @property
+    def flights(self):
+        return self.store.flights
+
+    @flights.setter
+    def flights(self, flights):
+        self.store = FlightStore(flights)
+
+    @property
+    def legs(self):
+        return self.store.legs
+
+    @legs.setter
+    def legs(self, legs):
+        self.store.attach_legs(legs)
 
     def parse_waypoint(self, wp_str):
         # Format: 49.97N/110.935W
@@ -134,27 +148,11 @@ class FlightEngine:
         return route_points
 
     def _calculate_legs_for_flight(self, f):
-        points = self.get_full_route(f)
-        current_time = f["departure time"]
-        legs = []
-        for i in range(len(points) - 1):
-            leg = Leg(
-                f["ACID"],
-                points[i],
-                points[i + 1],
-                current_time,
-                f["aircraft speed"],
-                f["altitude"],
-            )
-            legs.append(leg)
-            current_time += leg.duration
-        return legs
+        return LegTable.from_flights([f], self.airport_coords)
 
     def _precalculate_legs(self):
-        all_legs = []
-        for f in self.flights:
-            all_legs.extend(self._calculate_legs_for_flight(f))
-        return all_legs
+        with metrics.PHASE_SECONDS.time(phase="legs"):
+            return LegTable.from_flights(self.flights, self.airport_coords)
 
     def calculate_trajectory(self, flight, interval_sec=60):
         points = self.get_full_route(flight)
@@ -198,255 +196,515 @@ class FlightEngine:
         )
         return trajectory
 
+    def _get_index(self):
+        """Broad-phase index over ``self.legs``, rebuilt when the table is replaced."""
+        if self._index is None or self._index_legs is not self.legs:
+            legs = self.legs
+            self._index = SpatioTemporalIndex(
+                legs.t0,
+                legs.t1,
+                legs.alt,
+                legs.lat0,
+                legs.lon0,
+                legs.lat1,
+                legs.lon1,
+                legs.flight,
+                geodesic=self.separation_method == "exact",
+            )
+            self._index_legs = legs
+        return self._index
+
     def find_conflicts(self):
         """Find all conflicts across all flights."""
         if self._cached_conflicts is not None:
             return self._cached_conflicts
 
-        conflicts = []
-        # Group legs by flight
-        flight_legs = {}
-        for l in self.legs:
-            if l.acid not in flight_legs:
-                flight_legs[l.acid] = []
-            flight_legs[l.acid].append(l)
-
-        acids = list(flight_legs.keys())
-        processed_pairs = set()
-
-        for i in range(len(acids)):
-            for j in range(i + 1, len(acids)):
-                acid1, acid2 = acids[i], acids[j]
-                pair = tuple(sorted([acid1, acid2]))
-                if pair in processed_pairs:
-                    continue
-                processed_pairs.add(pair)
-
-                f1 = next(f for f in self.flights if f["ACID"] == acid1)
-                f2 = next(f for f in self.flights if f["ACID"] == acid2)
-
-                intervals = self.check_pair_conflict(f1, f2)
-                if not intervals:
-                    continue
-
-                # Calculate true min distance for the whole flight
-                min_dist = 9999.0
-                conflict_lat = 0.0
-                conflict_lon = 0.0
-                legs1 = flight_legs[acid1]
-                legs2 = flight_legs[acid2]
-
-                for l1 in legs1:
-                    for l2 in legs2:
-                        t_start = max(l1.t0, l2.t0)
-                        t_end = min(l1.t1, l2.t1)
-                        if t_start >= t_end:
-                            continue
-
-                        # Use quadratic to find local min time
-                        A = l1.p0 + l1.v * (t_start - l1.t0)
-                        B = l2.p0 + l2.v * (t_start - l2.t0)
-                        P0 = A - B
-                        Vrel = l1.v - l2.v
-                        lat_avg = (l1.start_lat + l2.start_lat) / 2
-                        cos_lat = cos(radians(lat_avg))
-                        scale = np.array([cos_lat, 1.0])
-                        P0_nm = P0 * 60.0 * scale
-                        Vrel_nm = Vrel * 60.0 * scale
-
-                        a = np.dot(Vrel_nm, Vrel_nm)
-                        if a > 1e-15:
-                            t_min_rel = -np.dot(P0_nm, Vrel_nm) / a
-                            t_min_seg = np.clip(t_min_rel, 0, t_end - t_start)
-                        else:
-                            t_min_seg = 0
-
-                        t_check = t_start + t_min_seg
-                        p1 = interpolate_position(
-                            l1.start_lat,
-                            l1.start_lon,
-                            l1.end_lat,
-                            l1.end_lon,
-                            (t_check - l1.t0) / l1.duration,
-                        )
-                        p2 = interpolate_position(
-                            l2.start_lat,
-                            l2.start_lon,
-                            l2.end_lat,
-                            l2.end_lon,
-                            (t_check - l2.t0) / l2.duration,
-                        )
-                        dist = haversine(p1[0], p1[1], p2[0], p2[1])
-                        if dist < min_dist:
-                            min_dist = dist
-                            # Capture the center point of the conflict
-                            conflict_lat = (p1[0] + p2[0]) / 2
-                            conflict_lon = (p1[1] + p2[1]) / 2
-
-                conflicts.append(
-                    {
-                        "time": int((intervals[0][0] + intervals[0][1]) / 2),
-                        "acid1": acid1,
-                        "acid2": acid2,
-                        "lat": conflict_lat,
-                        "lon": conflict_lon,
-                        "intervals": intervals,
-                        "duration": int(sum(i[1] - i[0] for i in intervals)),
-                        "dist": min_dist,
-                        "alt_diff": abs(f1["altitude"] - f2["altitude"]),
-                    }
-                )
+        with metrics.PHASE_SECONDS.time(phase="detection"):
+            # Broad phase: only co-located leg pairs reach the exact test
+            rows_a, rows_b = self._get_index().leg_pairs()
+            conflicts = self._conflicts_from_leg_pairs(rows_a, rows_b)
 
         self._cached_conflicts = conflicts
+        self._save_results()
         return conflicts
 
+    @property
+    def conflicts_ready(self):
+        """True once conflicts are known (found or restored from the cache)."""
+        return self._cached_conflicts is not None
+
+    def iter_conflicts(self, refresh=False, batch_pairs=20000):
+        """Finds all conflicts like ``find_conflicts``, a batch at a time.
+
+        Yields (conflicts, fraction done) for batches of about
+        ``batch_pairs`` candidate leg pairs, split between flights so the
+        batches concatenate to the ``find_conflicts`` list. That list is
+        cached when the sweep completes. Known conflicts come back as one
+        batch unless ``refresh`` is set. A sweep spanning a schedule change
+        (``version`` moved between batches) caches nothing; callers
+        releasing the engine lock between batches should restart it.
+        """
+        if self._cached_conflicts is not None and not refresh:
+            yield self._cached_conflicts, 1.0
+            return
+        version, legs = self.version, self.legs
+        rows_a, rows_b = self._get_index().leg_pairs()
+        # Pairs are sorted by row A, hence by flight A
+        flight_a = legs.flight[rows_a]
+        cuts = np.searchsorted(
+            flight_a, flight_a[batch_pairs::batch_pairs], "left"
+        ).tolist()
+        bounds = sorted({0, *cuts, len(rows_a)})
+        conflicts = []
+        if len(bounds) == 1:
+            yield conflicts, 1.0
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            batch = self._conflicts_from_leg_pairs(rows_a[lo:hi], rows_b[lo:hi])
+            conflicts.extend(batch)
+            yield batch, hi / len(rows_a)
+        if self.version == version and self.legs is legs:
+            self._cached_conflicts = conflicts
+            self._save_results()
+
+    @property
+    def nbytes(self):
+        """Approximate memory held: leg and index arrays plus records."""
+        total = self.legs.nbytes + len(self.flights) * self.flight_record_bytes
+        if self._index is not None:
+            total += self._index.nbytes
+        if self._timeline is not None:
+            total += self._timeline[0].nbytes + self._timeline[1].nbytes
+        if self._cached_conflicts is not None:
+            total += len(self._cached_conflicts) * self.conflict_record_bytes
+        total += sum(track.nbytes for track in list(self._trajectories.values()))
+        return total
+
+    def fork(self):
+        """Independent copy of the current schedule and conflicts.
+
+        Changes to the fork (e.g. what-if fixes via ``update_flight``) never
+        affect this engine. The fork persists nothing to disk.
+        """
+        other = object.__new__(type(self))
+        other.workers = 1
+        other._parallel = ParallelEvaluator(1)
+        other.separation_method = self.separation_method
+        other.separation_tol_sec = self.separation_tol_sec
+        other.version = self.version
+        other.airport_coords = self.airport_coords
+        other.flights = [dict(f) for f in self.flights]
+        other.legs = self.legs.copy()
+        other._index = None
+        other._index_legs = None
+        other._cached_conflicts = list(self.find_conflicts())
+        other._cached_stats = None
+        other._aggregates = None
+        other._aggregates_key = None
+        other._hotspots = None
+        other._hotspots_conflicts = None
+        other._timeline = None
+        other._timeline_key = None
+        other._conflict_timeline = None
+        other._conflict_timeline_conflicts = None
+        other._flight_table = None
+        other._flight_table_key = None
+        other._trajectories = OrderedDict()
+        other._trajectories_store = None
+        other._trajectories_lock = threading.Lock()
+        other._results = None
+        other._results_key = None
+        other._results_stale = True
+        return other
+
+    def close(self):
+        """Stops the worker processes of this engine, if any were started."""
+        self._parallel.close()
+
+    def _results_cache_key(self):
+        if self._results_key is None:
+            self._results_key = dataset_key(
+                self.flights,
+                ENGINE_VERSION,
+                SEPARATION_NM,
+                VERTICAL_SEPARATION_FT,
+                self.airport_coords,
+                self.separation_method,
+                self.separation_tol_sec,
+            )
+        return self._results_key
+
+    def _load_results(self):
+        """Restores conflicts and stats persisted for the current data."""
+        if self._results is None:
+            return
+        saved = self._results.get(self._results_cache_key())
+        if saved is None:
+            return
+        self._cached_conflicts = saved["conflicts"]
+        self._cached_stats = saved["stats"]
+
+    def _save_results(self):
+        if self._results is None or self._results_stale:
+            return
+        self._results.put(
+            self._results_cache_key(),
+            {
+                "conflicts": self._cached_conflicts,
+                "stats": self._cached_stats,
+            },
+        )
+
+    def _conflicts_for_flight(self, flight_idx):
+        """Conflicts between one flight and every other flight, via the index."""
+        legs = self.legs
+        rows = legs.rows_for_flight(flight_idx)
+        own = slice(rows.start, rows.stop)
+        query_rows, other_rows = self._get_index().query(
+            legs.t0[own],
+            legs.t1[own],
+            legs.alt[own],
+            legs.lat0[own],
+            legs.lon0[own],
+            legs.lat1[own],
+            legs.lon1[own],
+        )
+        query_rows = query_rows + rows.start
+        keep = legs.flight[other_rows] != flight_idx
+        query_rows, other_rows = query_rows[keep], other_rows[keep]
+
+        # Keep the flight that comes first in the schedule on side A
+        swap = legs.flight[other_rows] < flight_idx
+        rows_a = np.where(swap, other_rows, query_rows)
+        rows_b = np.where(swap, query_rows, other_rows)
+        return self._conflicts_from_leg_pairs(rows_a, rows_b)
+
+    def _separation(self):
+        return {"method": self.separation_method, "tol_sec": self.separation_tol_sec}
+
+    def _conflicts_from_leg_pairs(self, rows_a, rows_b):
+        """Runs the exact test on candidate leg pairs and builds conflict records.
+
+        Side A must belong to the earlier flight; conflicts come back ordered
+        by (flight index A, flight index B).
+        """
+        legs = self.legs
+        if self.workers > 1 and len(rows_a) >= self.parallel_min_pairs:
+            starts, ends, found = self._parallel.evaluate(
+                legs, rows_a, rows_b, self.version, **self._separation()
+            )
+        else:
+            starts, ends, found = evaluate_pairs(
+                legs, rows_a, legs, rows_b, **self._separation()
+            )
+
+        pair_intervals = {}
+        for fa, fb, t_s, t_e in zip(
+            legs.flight[rows_a[found]].tolist(),
+            legs.flight[rows_b[found]].tolist(),
+            starts[found].tolist(),
+            ends[found].tolist(),
+        ):
+            pair_intervals.setdefault((fa, fb), []).append([t_s, t_e])
+        pairs = sorted(pair_intervals)
+
+        # Calculate true min distance for the whole flight
+        first = np.array([p[0] for p in pairs], dtype=np.int64)
+        second = np.array([p[1] for p in pairs], dtype=np.int64)
+        ca, cb, k = cross_rows(legs.offsets, first, legs.offsets, second)
+        dist, mid_lat, mid_lon, overlaps = closest_approach(
+            legs, ca, legs, cb, self.separation_method
+        )
+        dist = np.where(overlaps, dist, np.inf)
+        closest = {}
+        for pair_k, d, lat, lon in zip(
+            k.tolist(), dist.tolist(), mid_lat.tolist(), mid_lon.tolist()
+        ):
+            if pair_k not in closest or d < closest[pair_k][0]:
+                closest[pair_k] = (d, lat, lon)
+
+        conflicts = []
+        for pair_k, (i, j) in enumerate(pairs):
+            f1 = self.flights[i]
+            f2 = self.flights[j]
+            intervals = merge_intervals(pair_intervals[(i, j)])
+            min_dist, conflict_lat, conflict_lon = 9999.0, 0.0, 0.0
+            if pair_k in closest and closest[pair_k][0] < min_dist:
+                min_dist, conflict_lat, conflict_lon = closest[pair_k]
+
+            conflicts.append(
+                {
+                    "time": int((intervals[0][0] + intervals[0][1]) / 2),
+                    "acid1": f1["ACID"],
+                    "acid2": f2["ACID"],
+                    "lat": conflict_lat,
+                    "lon": conflict_lon,
+                    "intervals": intervals,
+                    "duration": int(sum(i[1] - i[0] for i in intervals)),
+                    "dist": min_dist,
+                    "alt_diff": abs(f1["altitude"] - f2["altitude"]),
+                }
+            )
+        return conflicts
+
+    def update_flight(self, acid, changes):
+        """Applies schedule changes to one flight and refreshes only what depends on it.
+
+        ``changes`` may hold "departure_time" and/or "altitude". Legs, cached
+        conflicts and cached stats are patched for this flight alone instead of
+        being recomputed for the whole day. Returns False if the ACID is unknown.
+        """
+        flight_idx = self.store.index_of(acid)
+        if flight_idx is None:
+            return False
+
+        flight = self.flights[flight_idx]
+        old_flight = flight.copy()
+        if "departure_time" in changes:
+            flight["departure time"] = changes["departure_time"]
+        if "altitude" in changes:
+            flight["altitude"] = changes["altitude"]
+        self.store.reindex(flight_idx, old_flight)
+        self.version += 1
+        # Results now differ from the data on disk; keep them in memory only
+        self._results_stale = True
+
+        # 1. Legs of the changed flight only
+        new_legs = LegTable.from_flights([flight], self.airport_coords)
+        in_place = self.legs.replace_flight(flight_idx, new_legs)
+        if self._index is not None and self._index_legs is self.legs:
+            if in_place:
+                self._index.refresh_rows(self.legs.rows_for_flight(flight_idx))
+            else:
+                self._index = None
+
+        with self._trajectories_lock:
+            self._trajectories.pop(flight_idx, None)
+
+        # 2. Drop and recompute the conflict pairs involving this flight
+        old_conflicts = self._cached_conflicts
+        partners = None
+        if old_conflicts is not None:
+            conflicts = [
+                c
+                for c in self._cached_conflicts
+                if acid not in (c["acid1"], c["acid2"])
+            ]
+            own = self._conflicts_for_flight(flight_idx)
+            partners = [c["acid2"] if c["acid1"] == acid else c["acid1"] for c in own]
+            conflicts.extend(own)
+            position = self.store.index_of
+            conflicts.sort(key=lambda c: (position(c["acid1"]), position(c["acid2"])))
+            self._cached_conflicts = conflicts
+
+        # 3. Patch the running aggregates and the dashboard stats
+        key = self._aggregates_key
+        if (
+            partners is not None
+            and self._aggregates is not None
+            and key[0] is self.store
+            and key[1] is old_conflicts
+        ):
+            self._aggregates.replace_flight(old_flight, flight)
+            self._aggregates.set_partners(acid, partners)
+            self._aggregates_key = (self.store, self._cached_conflicts)
+        else:
+            self._aggregates = None
+            self._aggregates_key = None
+        if self._cached_stats is not None:
+            self._patch_stats()
+        return True
+
     def get_stats(self):
         """Returns pre-calculated statistics for the dashboard."""
         if self._cached_stats is not None:
             return self._cached_stats
 
-        df = pd.DataFrame(self.flights)
-        conflicts = self.find_conflicts()
+        aggregates = self.get_aggregates()
+        with metrics.PHASE_SECONDS.time(phase="stats"):
+            summary = aggregates.summary()
+            # Calculate peak congestion (exact sweep over takeoffs and landings)
+            peak_congestion, peak_time = peak_occupancy(*airborne_intervals(self.legs))
+            self._cached_stats = {
+                "total_flights": summary["total_flights"],
+                "total_passengers": summary["total_passengers"],
+                "cargo_flights": summary["cargo_flights"],
+                "avg_altitude": summary["avg_altitude"],
+                "peak_congestion": peak_congestion,
+                "peak_congestion_time": peak_time,
+                "safety_score": self._safety_score(
+                    summary["conflict_pairs"], summary["total_flights"]
+                ),
+            }
+        self._save_results()
+        return self._cached_stats
 
-        # Calculate peak congestion
-        trajectories = [
-            self.calculate_trajectory(f, interval_sec=600) for f in self.flights
-        ]
-        all_points = [p for t in trajectories for p in t]
-        time_series = pd.DataFrame(all_points).groupby("time").size()
-        peak_congestion = int(time_series.max()) if not time_series.empty else 0
-
-        # Calculate safety score
-        unique_conflicts_count = len(
-            {tuple(sorted([c["acid1"], c["acid2"]])) for c in conflicts}
+    def get_aggregates(self):
+        """Running totals, overall and per airport, airline and aircraft class.
+
+        Patched by ``update_flight``; built from scratch only when the flights
+        or the whole conflict list are replaced.
+        """
+        conflicts = self.find_conflicts()
+        key = self._aggregates_key
+        # By identity: comparing equal conflict lists would walk them whole
+        if (
+            self._aggregates is None
+            or key[0] is not self.store
+            or key[1] is not conflicts
+        ):
+            self._aggregates = StatsAggregator(self.flights, conflicts)
+            self._aggregates_key = (self.store, conflicts)
+        return self._aggregates
+
+    def get_grouped_stats(self, group):
+        """Dashboard totals per value of ``group`` ("airport", "airline", "class")."""
+        return self.get_aggregates().grouped(group)
+
+    def get_occupancy_series(self, step_sec=60):
+        """Number of airborne flights every ``step_sec`` seconds, as (times, counts)."""
+        return occupancy_series(*airborne_intervals(self.legs), step_sec=step_sec)
+
+    def get_flight_table(self):
+        """Indexed flight table, rebuilt when flights or conflicts change."""
+        conflicts = self.find_conflicts()
+        key = self._flight_table_key
+        if (
+            self._flight_table is None
+            or key[0] is not self.store
+            or key[1] != self.version
+            or key[2] is not conflicts
+        ):
+            involved = np.zeros(len(self.flights), dtype=bool)
+            for c in conflicts:
+                involved[self.store.index_of(c["acid1"])] = True
+                involved[self.store.index_of(c["acid2"])] = True
+            self._flight_table = FlightTable(self.flights, involved)
+            self._flight_table_key = (self.store, self.version, conflicts)
+        return self._flight_table
+
+    def get_hotspot_cube(self):
+        """Conflict density cube, rebuilt whenever the conflict list changes."""
+        conflicts = self.find_conflicts()
+        if self._hotspots is None or self._hotspots_conflicts is not conflicts:
+            self._hotspots = HotspotCube.from_conflicts(conflicts)
+            self._hotspots_conflicts = conflicts
+        return self._hotspots
+
+    def _get_timeline(self):
+        """Interval indexes over legs and flights, rebuilt after schedule changes.
+
+        Returns (leg index, flight index, flight ids); flight index ids are
+        positions in the flight ids array (flights without legs are left out).
+        """
+        key = (self.legs, self.version)
+        if self._timeline is None or self._timeline_key != key:
+            legs = self.legs
+            flying = np.nonzero(legs.offsets[1:] > legs.offsets[:-1])[0]
+            takeoff, landing = airborne_intervals(legs)
+            self._timeline = (
+                IntervalIndex(legs.t0, legs.t1),
+                IntervalIndex(takeoff, landing),
+                flying,
+            )
+            self._timeline_key = key
+        return self._timeline
+
+    def airspace_at(self, t):
+        """Positions of every flight airborne at time ``t``, as columns.
+
+        Returns a dict of arrays: flight (index), lat, lon, alt.
+        """
+        legs = self.legs
+        rows = self._get_timeline()[0].at(t)
+        # A flight between two legs is in both; keep its first
+        flight, first = np.unique(legs.flight[rows], return_index=True)
+        rows = rows[first]
+        lat, lon = legs.position_at(rows, t)
+        return {"flight": flight, "lat": lat, "lon": lon, "alt": legs.alt[rows]}
+
+    def flights_between(self, start, end):
+        """Flights airborne at any time in [start, end], in schedule order.
+
+        Returns (flight indexes, takeoff times, landing times) arrays.
+        """
+        index, flights = self._get_timeline()[1:]
+        ids = index.overlapping(start, end)
+        return flights[ids], index.start[ids], index.end[ids]
+
+    def conflicts_between(self, start, end):
+        """Conflicts with a loss-of-separation interval overlapping [start, end]."""
+        conflicts = self.find_conflicts()
+        if self._conflict_timeline_conflicts is not conflicts:
+            owner = [k for k, c in enumerate(conflicts) for _ in c["intervals"]]
+            bounds = [i for c in conflicts for i in c["intervals"]]
+            bounds = np.array(bounds, dtype=np.float64).reshape(-1, 2)
+            self._conflict_timeline = (
+                IntervalIndex(bounds[:, 0], bounds[:, 1]),
+                np.array(owner, dtype=np.int64),
+            )
+            self._conflict_timeline_conflicts = conflicts
+        index, owner = self._conflict_timeline
+        return [conflicts[k] for k in np.unique(owner[index.overlapping(start, end)])]
+
+    def _safety_score(self, unique_conflicts_count, total_flights):
+        safety_score = max(0, 100 - (unique_conflicts_count / total_flights * 100))
+        return round(safety_score, 1)
+
+    def _patch_stats(self):
+        """Refreshes cached stats from the running aggregates after a change."""
+        stats = self._cached_stats
+        summary = self.get_aggregates().summary()
+        stats["avg_altitude"] = summary["avg_altitude"]
+        stats["peak_congestion"], stats["peak_congestion_time"] = peak_occupancy(
+            *airborne_intervals(self.legs)
+        )
+        stats["safety_score"] = self._safety_score(
+            summary["conflict_pairs"], stats["total_flights"]
         )
-        safety_score = max(0, 100 - (unique_conflicts_count / len(df) * 100))
-
-        self._cached_stats = {
-            "total_flights": len(df),
-            "total_passengers": int(df["passengers"].sum()),
-            "cargo_flights": int(df["is_cargo"].sum()),
-            "avg_altitude": round(df["altitude"].mean(), 0),
-            "peak_congestion": peak_congestion,
-            "safety_score": round(safety_score, 1),
-        }
-        return self._cached_stats
 
     def check_pair_conflict(self, f1, f2):
-        legs1 = self._calculate_legs_for_flight(f1)
-        legs2 = self._calculate_legs_for_flight(f2)
-        intervals = []
-
-        for l1 in legs1:
-            for l2 in legs2:
-                t_start = max(l1.t0, l2.t0)
-                t_end = min(l1.t1, l2.t1)
-                if t_start >= t_end:
-                    continue
-                if abs(l1.alt - l2.alt) >= 2000:
-                    continue
-
-                # 1. Fast Quadratic Pruning
-                A = l1.p0 + l1.v * (t_start - l1.t0)
-                B = l2.p0 + l2.v * (t_start - l2.t0)
-                P0 = A - B
-                Vrel = l1.v - l2.v
-                lat_avg = (l1.start_lat + l2.start_lat) / 2
-                cos_lat = cos(radians(lat_avg))
-                scale = np.array([cos_lat, 1.0])
-                P0_nm = P0 * 60.0 * scale
-                Vrel_nm = Vrel * 60.0 * scale
-
-                a = np.dot(Vrel_nm, Vrel_nm)
-                b = 2 * np.dot(P0_nm, Vrel_nm)
-                c = np.dot(P0_nm, P0_nm) - (5.0**2)
-
-                candidate = None
-                if a > 1e-15:
-                    disc = b**2 - 4 * a * c
-                    if disc >= 0:
-                        t1_r = (-b - np.sqrt(disc)) / (2 * a)
-                        t2_r = (-b + np.sqrt(disc)) / (2 * a)
-                        r0 = max(0, t1_r)
-                        r1 = min(t_end - t_start, t2_r)
-                        if r0 < r1:
-                            candidate = [t_start + r0, t_start + r1]
-                elif c <= 0:
-                    candidate = [t_start, t_end]
-
-                if not candidate:
-                    continue
-
-                # 2. Precision Refinement (Sub-second Bisection)
-                # We find the exact moments using Haversine + Great Circle
-                def get_dist(t):
-                    p1 = interpolate_position(
-                        l1.start_lat,
-                        l1.start_lon,
-                        l1.end_lat,
-                        l1.end_lon,
-                        (t - l1.t0) / l1.duration,
-                    )
-                    p2 = interpolate_position(
-                        l2.start_lat,
-                        l2.start_lon,
-                        l2.end_lat,
-                        l2.end_lon,
-                        (t - l2.t0) / l2.duration,
-                    )
-                    return haversine(p1[0], p1[1], p2[0], p2[1])
-
-                # Narrow the window to where it's truly < 5NM
-                refined_start = candidate[0]
-                refined_end = candidate[1]
-
-                # Binary search for start
-                low, high = t_start, t_end
-                found_s = False
-                for _ in range(15):  # ~0.03s precision over 1000s
-                    mid = (low + high) / 2
-                    if get_dist(mid) < 5.0:
-                        high = mid
-                        refined_start = mid
-                        found_s = True
-                    else:
-                        low = mid
-
-                # Binary search for end
-                low, high = refined_start, t_end
-                found_e = False
-                for _ in range(15):
-                    mid = (low + high) / 2
-                    if get_dist(mid) < 5.0:
-                        low = mid
-                        refined_end = mid
-                        found_e = True
-                    else:
-                        high = mid
-
-                if found_s and found_e and refined_start < refined_end:
-                    intervals.append([refined_start, refined_end])
-
-        # Merge overlapping intervals
-        intervals.sort()
-        merged = []
-        if intervals:
-            cs, ce = intervals[0]
-            for ns, ne in intervals[1:]:
-                if ns <= ce + 1:
-                    ce = max(ce, ne)
-                else:
-                    merged.append([cs, ce])
-                    cs, ce = ns, ne
-            merged.append([cs, ce])
-        return merged
+        legs = LegTable.from_flights([f1, f2], self.airport_coords)
+        rows_a, rows_b, _ = cross_rows(legs.offsets, [0], legs.offsets, [1])
+        starts, ends, found = evaluate_pairs(
+            legs, rows_a, legs, rows_b, **self._separation()
+        )
+        return merge_intervals(
+            [[s, e] for s, e in zip(starts[found].tolist(), ends[found].tolist())]
+        )
+
+    def get_trajectory(self, acid):
+        """Sampled great circle track of one flight (a FlightPolyline), or None.
+
+        Tracks are cached per flight and dropped only when that flight
+        changes, so edits elsewhere in the schedule keep them.
+        """
+        flight_idx = self.store.index_of(acid)
+        if flight_idx is None:
+            return None
+        # Readers share the engine, so the cache has its own lock
+        with self._trajectories_lock:
+            if self._trajectories_store is not self.store:
+                self._trajectories = OrderedDict()
+                self._trajectories_store = self.store
+            track = self._trajectories.get(flight_idx)
+            if track is not None:
+                self._trajectories.move_to_end(flight_idx)
+                return track
+        track = FlightPolyline.from_legs(
+            self.legs, self.legs.rows_for_flight(flight_idx)
+        )
+        with self._trajectories_lock:
+            self._trajectories[flight_idx] = track
+            while len(self._trajectories) > self.trajectory_cache_size:
+                self._trajectories.popitem(last=False)
+        return track
 
     def get_legs_for_flight(self, acid):
-        return [l.to_dict() for l in self.legs if l.acid == acid]
+        return self.legs.to_dicts(self.store.leg_rows(acid))
 
     def get_conflict_pair_data(self, acid1, acid2):
-        f1 = next((f for f in self.flights if f["ACID"] == acid1), None)
-        f2 = next((f for f in self.flights if f["ACID"] == acid2), None)
+        f1 = self.store.get(acid1)
+        f2 = self.store.get(acid2)
         if not f1 or not f2:
             return None
 
@@ -458,20 +716,40 @@ class FlightEngine:
 
     def propose_resolutions(self, acid1, acid2):
         """Generates resolution options for a conflict pair."""
-        f1 = next((f for f in self.flights if f["ACID"] == acid1), None)
-        f2 = next((f for f in self.flights if f["ACID"] == acid2), None)
+        f1 = self.store.get(acid1)
+        f2 = self.store.get(acid2)
         if not f1 or not f2:
             return []
 
-        resolutions = []
-        other_flights = [f for f in self.flights if f["ACID"] not in [acid1, acid2]]
-
         # Strategy 1: Delay Departure of Flight 1
+        options = []
         for delay_mins in [2, 5, 10]:
             candidate = f1.copy()
             candidate["departure time"] += delay_mins * 60
+            options.append(("delay", delay_mins, candidate))
 
-            if self._is_safe_resolution(candidate, f2, other_flights):
+        # Strategy 2: Altitude Change for Flight 1
+        constraints = self.get_constraints(f1["Plane type"])
+        current_alt = f1["altitude"]
+        for alt_diff in [-2000, 2000]:
+            new_alt = current_alt + alt_diff
+            if constraints["min_alt"] <= new_alt <= constraints["max_alt"]:
+                candidate = f1.copy()
+                candidate["altitude"] = new_alt
+                options.append(("alt", new_alt, candidate))
+
+        # Every option is validated against all traffic in one batch
+        candidate_legs, blocking = self._validate_candidates(
+            self.store.index_of(acid1), [c for _, _, c in options]
+        )
+
+        resolutions = []
+        for k, (kind, value, candidate) in enumerate(options):
+            if blocking[k]:
+                continue
+            proposed_legs = candidate_legs.to_dicts(candidate_legs.rows_for_flight(k))
+            if kind == "delay":
+                delay_mins = value
                 resolutions.append(
                     {
                         "id": f"delay_{delay_mins}",
@@ -482,10 +760,7 @@ class FlightEngine:
                             "departure_time": candidate["departure time"],
                             "altitude": candidate["altitude"],
                         },
-                        "proposed_legs": [
-                            l.to_dict()
-                            for l in self._calculate_legs_for_flight(candidate)
-                        ],
+                        "proposed_legs": proposed_legs,
                         "metrics": {
                             "efficiency_score": 100 - (delay_mins * 3),
                             "fuel_impact_usd": 0,
@@ -494,61 +769,65 @@ class FlightEngine:
                         "is_recommended": delay_mins <= 5,
                     }
                 )
-
-        # Strategy 2: Altitude Change for Flight 1
-        constraints = self.get_constraints(f1["Plane type"])
-        current_alt = f1["altitude"]
-
-        for alt_diff in [-2000, 2000]:
-            new_alt = current_alt + alt_diff
-            if constraints["min_alt"] <= new_alt <= constraints["max_alt"]:
-                candidate = f1.copy()
-                candidate["altitude"] = new_alt
-
-                if self._is_safe_resolution(candidate, f2, other_flights):
-                    # Fuel penalty heuristic: $150 per 2000ft deviation from planned
-                    fuel_penalty = 150
-                    resolutions.append(
-                        {
-                            "id": f"alt_{new_alt}",
-                            "type": "ALTITUDE",
-                            "title": f"Vertical Re-routing (FL{int(new_alt / 100)})",
-                            "description": f"Assign {acid1} to a different flight level to maintain vertical separation.",
-                            "changes": {
-                                "departure_time": candidate["departure time"],
-                                "altitude": new_alt,
-                            },
-                            "proposed_legs": [
-                                l.to_dict()
-                                for l in self._calculate_legs_for_flight(candidate)
-                            ],
-                            "metrics": {
-                                "efficiency_score": 85,
-                                "fuel_impact_usd": fuel_penalty,
-                                "delay_impact_mins": 0,
-                            },
-                            "is_recommended": False,
-                        }
-                    )
+            else:
+                new_alt = value
+                # Fuel penalty heuristic: $150 per 2000ft deviation from planned
+                fuel_penalty = 150
+                resolutions.append(
+                    {
+                        "id": f"alt_{new_alt}",
+                        "type": "ALTITUDE",
+                        "title": f"Vertical Re-routing (FL{int(new_alt / 100)})",
+                        "description": f"Assign {acid1} to a different flight level to maintain vertical separation.",
+                        "changes": {
+                            "departure_time": candidate["departure time"],
+                            "altitude": new_alt,
+                        },
+                        "proposed_legs": proposed_legs,
+                        "metrics": {
+                            "efficiency_score": 85,
+                            "fuel_impact_usd": fuel_penalty,
+                            "delay_impact_mins": 0,
+                        },
+                        "is_recommended": False,
+                    }
+                )
 
         return sorted(
             resolutions, key=lambda x: x["metrics"]["efficiency_score"], reverse=True
         )
 
-    def _is_safe_resolution(self, candidate_f, target_f, others):
-        """Verifies if a proposed change is safe against the target and all other flights."""
-        # 1. Check against the original conflicting flight
-        if self.check_pair_conflict(candidate_f, target_f):
-            return False
+    def _validate_candidates(self, flight_idx, candidates):
+        """Checks replacement schedules for flight ``flight_idx`` against all traffic.
+
+        All candidates are built into one leg table and matched through the
+        spatio-temporal index, so only legs that can come within separation
+        are tested exactly. The flight's own current legs are ignored.
+        Returns (candidate LegTable, number of flights each candidate
+        conflicts with); a candidate is safe when its count is 0.
+        """
+        cand = LegTable.from_flights(candidates, self.airport_coords)
+        if len(cand) == 0:
+            return cand, np.zeros(len(candidates), dtype=np.int64)
+
+        query_rows, other_rows = self._get_index().query(
+            cand.t0, cand.t1, cand.alt, cand.lat0, cand.lon0, cand.lat1, cand.lon1
+        )
+        keep = self.legs.flight[other_rows] != flight_idx
+        query_rows, other_rows = query_rows[keep], other_rows[keep]
 
-        # 2. Check against global traffic (prevent chain-reaction conflicts)
-        # We only check a subset of 'others' for performance in this demo
-        for other in others[:50]:
-            if self.check_pair_conflict(candidate_f, other):
-                return False
-        return True
+        _, _, found = evaluate_pairs(
+            cand, query_rows, self.legs, other_rows, **self._separation()
+        )
+        pairs = np.unique(
+            cand.flight[query_rows[found]] * len(self.flights)
+            + self.legs.flight[other_rows[found]]
+        )
+        counts = np.bincount(pairs // len(self.flights), minlength=len(candidates))
+        return cand, counts
 
-    def get_constraints(self, plane_type):
+    @staticmethod
+    def get_constraints(plane_type):
         """Returns min/max altitude and speed for a given aircraft model."""
         if "Dash 8" in plane_type:
             return {
@@ -1,37 +1,336 @@
+import asyncio
 import os
+import time
+import weakref
+import numpy as np
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from fastapi import FastAPI, Request
-from fastapi.responses import RedirectResponse
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import (
+    JSONResponse,
+    RedirectResponse,
+    Response,
+    StreamingResponse,
+)
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from typing import Optional
-from app.engine.trajectory import FlightEngine
+from typing import Literal, Optional
+from urllib.parse import urlencode
+from app.engine import metrics
+from app.engine.aggregates import GROUPS
+from app.engine.dispatch import DeadlineExceeded, EngineDispatcher
+from app.engine.flight_table import FlightTable
+from app.engine.image_cache import HASHED_NAME
+from app.engine.jobs import JobManager, JobNotFound
+from app.engine.pool import DatasetNotFound, EnginePool
+from app.engine.resolver import plan_resolutions
+from app.engine.polylines import zoom_tolerance
+from app.engine.response_cache import (
+    ResponseCache,
+    dump_json,
+    pack_conflict_data,
+    pack_trajectories,
+)
 from app.engine.spotter import SpotterEngine
-import pandas as pd
-from datetime import datetime
+from datetime import UTC, datetime
 
 load_dotenv()
 MAPBOX_TOKEN = os.getenv("MAPBOX_ACCESS_TOKEN")
 
-app = FastAPI(title="planNAV")
+
+@asynccontextmanager
+async def lifespan(app):
+    # Fetch every aircraft image not cached yet, politely, in the background
+    prefetch = None
+    if os.getenv("PLANNAV_PREFETCH_IMAGES", "1") != "0":
+        prefetch = asyncio.create_task(spotter.prefetch())
+    yield
+    if prefetch is not None:
+        prefetch.cancel()
+    pool.shutdown()
+
+
+app = FastAPI(title="planNAV", lifespan=lifespan)
 
 # Mount static files
 # Ensure .cache directory exists before mounting
 os.makedirs(".cache", exist_ok=True)
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """Static files whose names change with their content (hash-named)."""
+
+    def file_response(self, full_path, *args, **kwargs):
+        response = super().file_response(full_path, *args, **kwargs)
+        # Anything else (e.g. a file from an older cache) may still change
+        if HASHED_NAME.match(os.path.basename(full_path)):
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+
+# Aircraft images are named by content hash, so browsers may keep them
+os.makedirs(".cache/aircraft_images", exist_ok=True)
+app.mount(
+    "/static/cache/aircraft_images",
+    ImmutableStaticFiles(directory=".cache/aircraft_images"),
+    name="aircraft_images",
+)
 app.mount("/static/cache", StaticFiles(directory=".cache"), name="cache")
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 
 templates = Jinja2Templates(directory="app/templates")
 
-# Initialize Engine
-DATA_FILE = "data/canadian_flights_250.json"
-engine = FlightEngine(DATA_FILE)
-spotter = SpotterEngine()
+# Datasets are the .json files in DATA_DIR and in the optional archive
+# directories (PLANNAV_ARCHIVE_DIRS, separated by os.pathsep). Routes take a
+# ?dataset= name; without one they use the default.
+DATA_DIR = "data"
+ARCHIVE_DIRS = [d for d in os.getenv("PLANNAV_ARCHIVE_DIRS", "").split(os.pathsep) if d]
+DEFAULT_DATASET = os.getenv("PLANNAV_DATASET", "canadian_flights_250")
+# Engines are loaded on first use (from a columnar snapshot under
+# .cache/snapshots after the first time) and kept within PLANNAV_POOL_MB.
+# Worker processes for conflict detection (1 = run in-process)
+pool = EnginePool(
+    [DATA_DIR, *ARCHIVE_DIRS],
+    DEFAULT_DATASET,
+    max_bytes=int(os.getenv("PLANNAV_POOL_MB", "1024")) << 20,
+    cache_root=".cache",
+    workers=int(os.getenv("PLANNAV_WORKERS", "1")),
+)
+# Planespotters requests: at most 2 at once, started at least 1s apart;
+# downloaded images kept within PLANNAV_IMAGE_CACHE_MB
+spotter = SpotterEngine(
+    ".cache",
+    max_concurrent=2,
+    min_interval=1.0,
+    max_bytes=int(os.getenv("PLANNAV_IMAGE_CACHE_MB", "64")) << 20,
+)
+# Longest a page waits for an image fetch; the fetch itself carries on
+IMAGE_DEADLINE_SEC = 15.0
+
+# Engine calls run on a thread pool so one slow request never stalls the
+# event loop. Limits cap concurrent calls per operation; deadlines (seconds)
+# bound how long a request waits, including time queued for a slot.
+dispatcher = EngineDispatcher(
+    max_workers=int(os.getenv("PLANNAV_THREADS", "4")),
+    limits={"resolve": 2, "plan": 1, "apply": 1, "load": 1},
+    deadlines={"resolve": 20.0, "apply": 30.0, "load": 120.0},
+    default_deadline=10.0,
+    # PLANNAV_PROFILE_SLOW_MS=<ms> keeps a cProfile dump of slower engine calls
+    profiler=metrics.SlowCallProfiler.from_env(".cache/profiles"),
+)
+
+# Operations too long for a request (dataset loads, full re-analysis, batch
+# resolution) run as background jobs; clients poll /api/jobs/{id} or follow
+# its events over SSE
+jobs = JobManager(max_workers=int(os.getenv("PLANNAV_JOB_WORKERS", "2")))
+
+
+def _analyze_job(job, name, refresh):
+    """Loads a dataset and streams its conflicts as "conflict" events.
+
+    Detection runs in batches, holding the engine read lock for one batch at
+    a time so fixes can be applied meanwhile. A fix applied mid-sweep
+    restarts it, announced by a "reset" event.
+    """
+    engine = pool.peek(name)
+    if engine is None:
+        job.report(0.0, f"loading {name}")
+        engine = pool.get(name, warm=False)
+    while True:
+        job.report(0.0, "detecting conflicts")
+        version = engine.version
+        sweep = engine.iter_conflicts(refresh)
+        found = 0
+        while True:
+            with dispatcher.lock_for(engine).reading():
+                batch = next(sweep, None)
+                changed = engine.version != version
+            if changed or batch is None:
+                break
+            conflicts, done = batch
+            for conflict in conflicts:
+                job.emit("conflict", conflict)
+            found += len(conflicts)
+            job.report(0.9 * done)
+        if not changed:
+            break
+        job.emit("reset")
+
+    job.report(0.9, "computing statistics")
+    with dispatcher.lock_for(engine).reading():
+        stats = dict(engine.get_stats())
+        engine.get_hotspot_cube()
+    return {"dataset": name, "version": version, "conflicts": found, "stats": stats}
+
+
+def _plan_job(job, name, budget):
+    # Plans on a snapshot, so the engine lock is held only while copying it
+    engine = pool.get(name)
+    job.report(0.0, "copying schedule")
+    with dispatcher.lock_for(engine).reading():
+        base = engine.fork()
+    plan = plan_resolutions(base, budget, progress=job.report)
+    plan["version"] = base.version
+    return plan
+
+
+# Load the default dataset in the background; requests for it wait for the
+# load, and the conflicts page streams detection as it runs
+startup_job = jobs.submit(
+    "load",
+    _analyze_job,
+    pool.default,
+    False,
+    key=("load", pool.default),
+    params={"dataset": pool.default},
+)
+print(f"Loading {pool.default} (progress at /api/jobs/{startup_job.id})")
+
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded(request: Request, exc: DeadlineExceeded):
+    return JSONResponse(
+        {"error": str(exc)}, status_code=503, headers={"Retry-After": "1"}
+    )
+
+
+@app.exception_handler(DatasetNotFound)
+@app.exception_handler(JobNotFound)
+async def not_found(request: Request, exc: LookupError):
+    return JSONResponse({"error": str(exc)}, status_code=404)
+
+
+async def get_engine(dataset):
+    """(name, engine) for a request's dataset; loads it off the event loop."""
+    name, _ = pool.resolve(dataset or pool.default)
+    engine = pool.peek(name)
+    if engine is None:
+        engine = await dispatcher.run("load", pool.get, name, key=name)
+    return name, engine
+
 
-# Pre-compute expensive data on startup
-print("Initializing Flight Engine data (Conflicts & Stats)...")
-engine.get_stats()
-print("Initialization complete.")
+# Serialized API bodies per engine and data version (bumped by apply-fix);
+# dropped with the engine when the pool evicts it
+response_caches = weakref.WeakKeyDictionary()
+
+metrics.REGISTRY.gauge(
+    "plannav_engines_loaded",
+    "Datasets with a loaded engine.",
+    lambda: len(pool.loaded()),
+)
+metrics.REGISTRY.gauge(
+    "plannav_engine_pool_bytes",
+    "Approximate memory held by loaded engines.",
+    lambda: pool.nbytes,
+)
+metrics.REGISTRY.gauge(
+    "plannav_engine_calls_in_flight",
+    "Coalesced engine calls in flight.",
+    dispatcher.in_flight,
+)
+metrics.REGISTRY.gauge(
+    "plannav_jobs_running",
+    "Background jobs queued or running.",
+    jobs.running,
+)
+metrics.REGISTRY.gauge(
+    "plannav_response_cache_entries",
+    "Serialized responses held for the current data versions.",
+    lambda: sum(len(c) for c in list(response_caches.values())),
+)
+
+
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    if not metrics.ENABLED:
+        return await call_next(request)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Route templates, not raw paths, keep the label set bounded
+        route = request.scope.get("route")
+        metrics.REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status,
+        )
+
+
+@app.get("/metrics")
+async def get_metrics():
+    return Response(
+        metrics.REGISTRY.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+async def cached_response(request, dataset, op, key, build, *args, encode=dump_json):
+    """Serves ``encode(build(engine, *args))`` from the response cache.
+
+    ``dataset`` is the (name, engine) pair of ``get_engine``. On a miss the
+    payload is built and serialized on the dispatcher. Bodies carry an ETag
+    (304 on If-None-Match) and are gzipped when accepted. ``encode`` returns
+    bytes, or (bytes, media type).
+    """
+    name, engine = dataset
+    response_cache = response_caches.get(engine)
+    if response_cache is None:
+        response_cache = response_caches[engine] = ResponseCache()
+    entry = response_cache.get(key, engine.version)
+    if entry is None:
+        version, body = await dispatcher.run(
+            op, _build_body, engine, build, args, encode, key=(name, key), engine=engine
+        )
+        media_type = "application/json"
+        if isinstance(body, tuple):
+            body, media_type = body
+        entry = response_cache.put(key, version, body, media_type)
+
+    headers = {
+        "ETag": entry.etag,
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    if entry.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    if entry.gzipped is not None and "gzip" in request.headers.get(
+        "accept-encoding", ""
+    ):
+        headers["Content-Encoding"] = "gzip"
+        return Response(entry.gzipped, media_type=entry.media_type, headers=headers)
+    return Response(entry.body, media_type=entry.media_type, headers=headers)
+
+
+def _build_body(engine, build, args, encode):
+    # Runs under the engine read lock, so the version matches the payload
+    return engine.version, encode(build(engine, *args))
+
+
+async def _unique_conflicts(dataset):
+    name, engine = await get_engine(dataset)
+    return await dispatcher.run(
+        "conflicts",
+        lambda: _unique_pairs(engine.find_conflicts()),
+        key=(name, "unique"),
+        engine=engine,
+    )
+
+
+def _unique_pairs(conflicts):
+    # First conflict of each flight pair
+    unique_conflicts = []
+    seen = set()
+    for c in conflicts:
+        pair = tuple(sorted([c["acid1"], c["acid2"]]))
+        if pair not in seen:
+            unique_conflicts.append(c)
+            seen.add(pair)
+    return unique_conflicts
 
 
 @app.get("/")
@@ -39,44 +338,173 @@ async def read_root(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 
+@app.get("/api/datasets")
+async def list_datasets():
+    loaded = dict(pool.loaded())
+    return {
+        "default": pool.default,
+        "datasets": [
+            {"name": name, "loaded": name in loaded, "nbytes": loaded.get(name)}
+            for name in pool.available()
+        ],
+    }
+
+
 @app.get("/dashboard")
-async def dashboard(request: Request, page: int = 1):
+async def dashboard(
+    request: Request,
+    page: int = 1,
+    sort: str = "departure",
+    dep: Optional[str] = None,
+    arr: Optional[str] = None,
+    airport: Optional[str] = None,
+    airline: Optional[str] = None,
+    type: Optional[str] = None,
+    alt_min: Optional[str] = None,
+    alt_max: Optional[str] = None,
+    time_from: Optional[str] = None,
+    time_to: Optional[str] = None,
+    conflict: Optional[str] = None,
+    dataset: Optional[str] = None,
+):
+    name, engine = await get_engine(dataset)
     # Use cached stats from engine
-    stats = engine.get_stats()
+    stats = await dispatcher.run(
+        "stats", lambda: dict(engine.get_stats()), key=(name, "all"), engine=engine
+    )
+    groups = await dispatcher.run(
+        "stats", _group_breakdown, engine, key=(name, "groups"), engine=engine
+    )
 
-    # Pagination
-    per_page = 20
-    total_pages = (len(engine.flights) + per_page - 1) // per_page
-    page = max(1, min(page, total_pages))
-    start_idx = (page - 1) * per_page
-    end_idx = start_idx + per_page
-    paginated_flights = engine.flights[start_idx:end_idx]
+    # Filters arrive from a plain GET form, so blanks mean "any"
+    filters = {
+        "dep": dep or None,
+        "arr": arr or None,
+        "airport": airport or None,
+        "airline": airline or None,
+        "type": type or None,
+        "alt_min": _number(alt_min),
+        "alt_max": _number(alt_max),
+        "time_from": _time_of_day(time_from),
+        "time_to": _time_of_day(time_to),
+        "conflict": {"yes": True, "no": False}.get(conflict),
+    }
+    descending = sort.startswith("-")
+    sort_key = sort.lstrip("-")
+    if sort_key not in FlightTable.SORT_KEYS:
+        sort_key, descending = "departure", False
+    table = await dispatcher.run(
+        "stats",
+        _flight_page,
+        engine,
+        filters,
+        sort_key,
+        descending,
+        page,
+        key=(name, "flights", tuple(filters.items()), sort_key, descending, page),
+        engine=engine,
+    )
 
+    # Query string of the current filters, for sort and page links
+    params = [
+        (k, v)
+        for k, v in request.query_params.multi_items()
+        if k not in ("page", "sort", "dataset") and v
+    ]
+    params.append(("dataset", name))
     return templates.TemplateResponse(
         "dashboard.html",
         {
             "request": request,
+            "dataset": name,
             "stats": stats,
-            "flights": paginated_flights,
-            "page": page,
-            "total_pages": total_pages,
+            "groups": groups,
+            "sort": ("-" if descending else "") + sort_key,
+            "query": urlencode(params),
+            "filters": dict(request.query_params),
+            **table,
         },
     )
 
 
+# Flights per dashboard page
+PAGE_SIZE = 20
+# Rows per group in the dashboard breakdown
+BREAKDOWN_ROWS = 6
+
+
+def _group_breakdown(engine):
+    return {g: engine.get_grouped_stats(g)[:BREAKDOWN_ROWS] for g in GROUPS}
+
+
+def _flight_page(engine, filters, sort, descending, page):
+    table = engine.get_flight_table()
+    page = max(page, 1)
+    rows, total = table.query(
+        sort, descending, (page - 1) * PAGE_SIZE, PAGE_SIZE, **filters
+    )
+    total_pages = max(1, (total + PAGE_SIZE - 1) // PAGE_SIZE)
+    if page > total_pages:
+        page = total_pages
+        rows, _ = table.query(
+            sort, descending, (page - 1) * PAGE_SIZE, PAGE_SIZE, **filters
+        )
+    # Copies, so rendering never sees a fix applied mid-template
+    flights = [dict(engine.flights[i]) for i in rows.tolist()]
+    for f in flights:
+        f["dep_utc"] = datetime.fromtimestamp(f["departure time"], UTC).strftime(
+            "%H:%M"
+        )
+    options = {name: table.values(name) for name in FlightTable.CATEGORIES}
+    options["airport"] = sorted(set(options["dep"]) | set(options["arr"]))
+    return {
+        "flights": flights,
+        "matches": total,
+        "page": page,
+        "total_pages": total_pages,
+        "options": options,
+    }
+
+
+def _number(text):
+    try:
+        return float(text) if text else None
+    except ValueError:
+        return None
+
+
+def _time_of_day(text):
+    """Seconds since midnight UTC for "HH:MM", or None."""
+    try:
+        hours, minutes = (int(part) for part in (text or "").split(":"))
+    except ValueError:
+        return None
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        return None
+    return hours * 3600 + minutes * 60
+
+
 @app.get("/hotspots")
-async def hotspots_page(request: Request):
+async def hotspots_page(request: Request, dataset: Optional[str] = None):
+    name, _ = pool.resolve(dataset or pool.default)
     return templates.TemplateResponse(
         "hotspots.html",
         {
             "request": request,
+            "dataset": name,
             "mapbox_token": MAPBOX_TOKEN,
         },
     )
 
 
 @app.get("/api/hotspots-data")
-async def get_hotspots_data():
+async def get_hotspots_data(request: Request, dataset: Optional[str] = None):
+    return await cached_response(
+        request, await get_engine(dataset), "conflicts", "hotspots", _hotspot_features
+    )
+
+
+def _hotspot_features(engine):
     conflicts = engine.find_conflicts()
     features = []
 
@@ -102,56 +530,464 @@ async def get_hotspots_data():
     return {"type": "FeatureCollection", "features": features}
 
 
+@app.get("/api/hotspots/cells")
+async def get_hotspot_cells(
+    request: Request,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    west: float = -180.0,
+    south: float = -90.0,
+    east: float = 180.0,
+    north: float = 90.0,
+    dataset: Optional[str] = None,
+):
+    # Conflict density aggregated per cell over [start, end] inside the bbox
+    return await cached_response(
+        request,
+        await get_engine(dataset),
+        "conflicts",
+        ("cells", start, end, west, south, east, north),
+        _hotspot_cells,
+        start,
+        end,
+        (west, south, east, north),
+    )
+
+
+def _hotspot_cells(engine, start, end, bbox):
+    cube = engine.get_hotspot_cube()
+    cells = cube.query(start, end, bbox)
+    weights = cells["weight"]
+    peak = float(weights.max()) if len(weights) else 0.0
+    intensity = weights / peak if peak else weights
+    features = [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [lon, lat]},
+            "properties": {"weight": weight, "intensity": level, "count": count},
+        }
+        for lat, lon, weight, level, count in zip(
+            cells["lat"].round(4).tolist(),
+            cells["lon"].round(4).tolist(),
+            weights.round(3).tolist(),
+            intensity.round(3).tolist(),
+            cells["count"].tolist(),
+        )
+    ]
+    return {
+        "type": "FeatureCollection",
+        "features": features,
+        "cell_deg": cube.cell_deg,
+        "bucket_sec": cube.bucket_sec,
+        "time_range": [cube.t_min, cube.t_max],
+        "max_weight": peak,
+    }
+
+
+@app.get("/api/occupancy")
+async def get_occupancy(
+    request: Request, step: int = 60, dataset: Optional[str] = None
+):
+    # Airborne flight count over the day, for the dashboard congestion chart
+    step = max(step, 1)
+    return await cached_response(
+        request,
+        await get_engine(dataset),
+        "stats",
+        ("occupancy", step),
+        _occupancy,
+        step,
+    )
+
+
+def _occupancy(engine, step):
+    times, counts = engine.get_occupancy_series(step_sec=step)
+    stats = engine.get_stats()
+    return {
+        "step": step,
+        "start": float(times[0]) if len(times) else None,
+        "counts": counts.tolist(),
+        "peak": stats["peak_congestion"],
+        "peak_time": stats["peak_congestion_time"],
+    }
+
+
+@app.get("/api/stats/groups")
+async def get_grouped_stats(
+    request: Request,
+    by: Literal["airport", "airline", "class"] = "airport",
+    dataset: Optional[str] = None,
+):
+    # Totals per airport, airline or aircraft class, busiest first
+    return await cached_response(
+        request, await get_engine(dataset), "stats", ("groups", by), _grouped, by
+    )
+
+
+def _grouped(engine, by):
+    return {"group": by, "rows": engine.get_grouped_stats(by)}
+
+
+@app.get("/api/airspace")
+async def get_airspace(request: Request, t: float, dataset: Optional[str] = None):
+    # Positions of every airborne flight at time t, for map playback
+    return await cached_response(
+        request, await get_engine(dataset), "timeline", ("airspace", t), _airspace, t
+    )
+
+
+def _airspace(engine, t):
+    positions = engine.airspace_at(t)
+    return {
+        "time": t,
+        "acid": [engine.flights[i]["ACID"] for i in positions["flight"].tolist()],
+        "lat": positions["lat"].round(5).tolist(),
+        "lon": positions["lon"].round(5).tolist(),
+        "alt": positions["alt"].tolist(),
+    }
+
+
+@app.get("/api/flights/active")
+async def get_active_flights(
+    request: Request, start: float, end: float, dataset: Optional[str] = None
+):
+    # Flights airborne at any time in [start, end]
+    return await cached_response(
+        request,
+        await get_engine(dataset),
+        "timeline",
+        ("active", start, end),
+        _active_flights,
+        start,
+        end,
+    )
+
+
+def _active_flights(engine, start, end):
+    flights, takeoff, landing = engine.flights_between(start, end)
+    return {
+        "start": start,
+        "end": end,
+        "flights": [
+            {"acid": engine.flights[i]["ACID"], "takeoff": t0, "landing": t1}
+            for i, t0, t1 in zip(flights.tolist(), takeoff.tolist(), landing.tolist())
+        ],
+    }
+
+
+@app.get("/api/conflicts/window")
+async def get_conflict_window(
+    request: Request, start: float, end: float, dataset: Optional[str] = None
+):
+    # Conflicts losing separation at any time in [start, end]
+    return await cached_response(
+        request,
+        await get_engine(dataset),
+        "conflicts",
+        ("window", start, end),
+        _conflict_window,
+        start,
+        end,
+    )
+
+
+def _conflict_window(engine, start, end):
+    return {
+        "start": start,
+        "end": end,
+        "conflicts": engine.conflicts_between(start, end),
+    }
+
+
 @app.get("/api/conflict-data/{acid1}/{acid2}")
-async def get_conflict_data(acid1: str, acid2: str):
-    data = engine.get_conflict_pair_data(acid1, acid2)
+async def get_conflict_data(
+    request: Request,
+    acid1: str,
+    acid2: str,
+    format: str = "json",
+    dataset: Optional[str] = None,
+):
+    # format=binary sends legs and intervals as packed float64 columns
+    binary = format == "binary"
+    return await cached_response(
+        request,
+        await get_engine(dataset),
+        "pair",
+        ("conflict-data", acid1, acid2, binary),
+        _conflict_pair_data,
+        acid1,
+        acid2,
+        encode=_encode_binary_conflict if binary else _encode_conflict,
+    )
+
+
+def _conflict_pair_data(engine, acid1, acid2):
+    return engine.get_conflict_pair_data(acid1, acid2)
+
+
+def _encode_conflict(data):
+    return dump_json(data or {"error": "Not found"})
+
+
+def _encode_binary_conflict(data):
     if not data:
-        return {"error": "Not found"}
-    return data
+        return _encode_conflict(data)
+    return pack_conflict_data(data), "application/octet-stream"
+
+
+# Flights per trajectory request
+MAX_TRAJECTORIES = 1000
+
+
+@app.get("/api/trajectories")
+async def get_trajectories(
+    request: Request,
+    acids: str,
+    zoom: Optional[float] = None,
+    format: str = "json",
+    dataset: Optional[str] = None,
+):
+    # Sampled great circle tracks of comma-separated flights, for playback.
+    # zoom drops samples within half a pixel at that map zoom; format=binary
+    # sends float32 columns (see pack_trajectories)
+    acid_list = tuple(a for a in acids.split(",") if a)[:MAX_TRAJECTORIES]
+    tolerance = 0.0 if zoom is None else zoom_tolerance(min(max(zoom, 0.0), 24.0))
+    binary = format == "binary"
+    return await cached_response(
+        request,
+        await get_engine(dataset),
+        "timeline",
+        ("trajectories", acid_list, tolerance, binary),
+        _trajectories,
+        acid_list,
+        tolerance,
+        encode=_encode_binary_tracks if binary else _encode_tracks,
+    )
+
+
+def _trajectories(engine, acids, tolerance):
+    # Unknown flights get an empty track, so positions match the request
+    tracks = []
+    for acid in acids:
+        track = engine.get_trajectory(acid)
+        if track is None:
+            tracks.append((acid, (np.empty(0),) * 4))
+        else:
+            tracks.append((acid, track.simplified(tolerance)))
+    return tracks
+
+
+def _encode_tracks(tracks):
+    return dump_json(
+        {
+            "tracks": [
+                {
+                    "acid": acid,
+                    "lat": lat.tolist(),
+                    "lon": lon.tolist(),
+                    "alt": alt.tolist(),
+                    "t": t.tolist(),
+                }
+                for acid, (lat, lon, alt, t) in tracks
+            ]
+        }
+    )
+
+
+def _encode_binary_tracks(tracks):
+    return (
+        pack_trajectories([columns for _, columns in tracks]),
+        "application/octet-stream",
+    )
 
 
 @app.get("/api/resolutions/{acid1}/{acid2}")
-async def get_resolutions(acid1: str, acid2: str):
+async def get_resolutions(
+    request: Request, acid1: str, acid2: str, dataset: Optional[str] = None
+):
+    return await cached_response(
+        request,
+        await get_engine(dataset),
+        "resolve",
+        ("resolutions", acid1, acid2),
+        _resolutions,
+        acid1,
+        acid2,
+    )
+
+
+def _resolutions(engine, acid1, acid2):
     resolutions = engine.propose_resolutions(acid1, acid2)
     return {"acid1": acid1, "acid2": acid2, "proposals": resolutions}
 
 
-@app.post("/api/apply-fix/{acid}")
-async def apply_fix(acid: str, request: Request):
-    data = await request.json()
-    # Find flight and apply changes
-    for f in engine.flights:
-        if f["ACID"] == acid:
-            if "departure_time" in data:
-                f["departure time"] = data["departure_time"]
-            if "altitude" in data:
-                f["altitude"] = data["altitude"]
-            break
+@app.get("/api/resolution-plan")
+async def get_resolution_plan(budget: float = 5.0, dataset: Optional[str] = None):
+    name, engine = await get_engine(dataset)
+    # Delays and flight level changes clearing the whole day's conflicts
+    budget = min(max(budget, 0.1), 60.0)
+    return await dispatcher.run(
+        "plan",
+        plan_resolutions,
+        engine,
+        budget,
+        key=(name, budget),
+        engine=engine,
+        timeout=budget + 10.0,
+    )
+
+
+@app.get("/api/jobs")
+async def list_jobs():
+    return {"jobs": [job.to_dict() for job in jobs.jobs()]}
+
+
+@app.post("/api/jobs/load")
+async def start_load(dataset: Optional[str] = None):
+    name, _ = pool.resolve(dataset or pool.default)
+    job = jobs.submit(
+        "load", _analyze_job, name, False, key=("load", name), params={"dataset": name}
+    )
+    return _job_accepted(job)
+
+
+@app.post("/api/jobs/analyze")
+async def start_analysis(dataset: Optional[str] = None):
+    # Full re-analysis: detection runs again even if conflicts are known
+    name, _ = pool.resolve(dataset or pool.default)
+    job = jobs.submit(
+        "analyze",
+        _analyze_job,
+        name,
+        True,
+        key=("analyze", name),
+        params={"dataset": name},
+    )
+    return _job_accepted(job)
+
+
+@app.post("/api/jobs/plan")
+async def start_plan(budget: float = 60.0, dataset: Optional[str] = None):
+    # Batch resolution with a longer budget than /api/resolution-plan
+    name, _ = pool.resolve(dataset or pool.default)
+    budget = min(max(budget, 0.1), 600.0)
+    job = jobs.submit(
+        "plan",
+        _plan_job,
+        name,
+        budget,
+        key=("plan", name, budget),
+        params={"dataset": name, "budget": budget},
+    )
+    return _job_accepted(job)
+
+
+def _job_accepted(job):
+    return JSONResponse(
+        job.to_dict(), status_code=202, headers={"Location": f"/api/jobs/{job.id}"}
+    )
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    return jobs.get(job_id).to_dict()
 
-    # Re-calculate engine data
-    engine.legs = engine._precalculate_legs()
-    engine._cached_conflicts = None
-    engine._cached_stats = None
-    engine.get_stats()  # Trigger re-calc
 
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    return jobs.cancel(job_id).to_dict()
+
+
+# Job event streams check for news this often, and send a comment line when
+# idle so proxies keep the connection open
+JOB_POLL_SEC = 0.2
+JOB_KEEPALIVE_SEC = 15.0
+
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(request: Request, job_id: str):
+    """Server-Sent Events of a job: its events, then "status" on changes.
+
+    Events carry their position as id, so a reconnecting EventSource
+    resumes after Last-Event-ID. The stream ends after the status event of
+    a finished job; clients should close their EventSource on it.
+    """
+    job = jobs.get(job_id)
+    last = request.headers.get("last-event-id", "")
+    cursor = int(last) + 1 if last.isdigit() else 0
+    return StreamingResponse(
+        _job_stream(job, cursor),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _sse(event, data, event_id=None):
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\n".encode() + b"data: " + dump_json(data) + b"\n\n"
+
+
+async def _job_stream(job, cursor):
+    status = None
+    idle = 0.0
+    while True:
+        # Read the state first: events emitted before it finished are all in
+        finished = job.done
+        chunks = []
+        for kind, data in job.events_since(cursor):
+            chunks.append(_sse(kind, data, cursor))
+            cursor += 1
+        current = (job.state, round(job.progress, 3), job.message)
+        if current != status:
+            status = current
+            chunks.append(_sse("status", job.to_dict()))
+        if chunks:
+            yield b"".join(chunks)
+            idle = 0.0
+        if finished:
+            return
+        await asyncio.sleep(JOB_POLL_SEC)
+        idle += JOB_POLL_SEC
+        if idle >= JOB_KEEPALIVE_SEC:
+            yield b": keepalive\n\n"
+            idle = 0.0
+
+
+@app.post("/api/apply-fix/{acid}")
+async def apply_fix(acid: str, request: Request, dataset: Optional[str] = None):
+    _, engine = await get_engine(dataset)
+    data = await request.json()
+    # Apply changes and refresh only the conflicts/stats touching this flight
+    if not await dispatcher.run(
+        "apply", engine.update_flight, acid, data, engine=engine, write=True
+    ):
+        raise HTTPException(404, f"unknown flight: {acid}")
     return {"status": "success"}
 
 
 @app.get("/analyze-conflict/{acid1}/{acid2}")
-async def analyze_conflict(request: Request, acid1: str, acid2: str):
-    f1 = next((f for f in engine.flights if f["ACID"] == acid1), None)
-    f2 = next((f for f in engine.flights if f["ACID"] == acid2), None)
+async def analyze_conflict(
+    request: Request, acid1: str, acid2: str, dataset: Optional[str] = None
+):
+    name, engine = await get_engine(dataset)
+    f1, f2, legs1, legs2 = await dispatcher.run(
+        "pair",
+        _pair_details,
+        engine,
+        acid1,
+        acid2,
+        key=(name, "details", acid1, acid2),
+        engine=engine,
+    )
 
     if not f1 or not f2:
         return "Not found"
 
-    legs1 = engine.get_legs_for_flight(acid1)
-    legs2 = engine.get_legs_for_flight(acid2)
-
     return templates.TemplateResponse(
         "partials/conflict_analysis.html",
         {
             "request": request,
+            "dataset": name,
             "acid1": acid1,
             "acid2": acid2,
             "flight1": f1,
@@ -163,12 +999,29 @@ async def analyze_conflict(request: Request, acid1: str, acid2: str):
     )
 
 
+def _pair_details(engine, acid1, acid2):
+    f1 = engine.store.get(acid1)
+    f2 = engine.store.get(acid2)
+    if not f1 or not f2:
+        return f1, f2, [], []
+    return (
+        dict(f1),
+        dict(f2),
+        engine.get_legs_for_flight(acid1),
+        engine.get_legs_for_flight(acid2),
+    )
+
+
 @app.get("/conflict-visualizer/{acid1}/{acid2}")
-async def conflict_visualizer(request: Request, acid1: str, acid2: str):
+async def conflict_visualizer(
+    request: Request, acid1: str, acid2: str, dataset: Optional[str] = None
+):
+    name, _ = pool.resolve(dataset or pool.default)
     return templates.TemplateResponse(
         "partials/visualizer.html",
         {
             "request": request,
+            "dataset": name,
             "acid1": acid1,
             "acid2": acid2,
             "mapbox_token": MAPBOX_TOKEN,
@@ -179,65 +1032,90 @@ async def conflict_visualizer(request: Request, acid1: str, acid2: str):
 @app.get("/conflicts")
 @app.get("/conflicts/{acid1}/{acid2}")
 async def conflicts_page(
-    request: Request, acid1: Optional[str] = None, acid2: Optional[str] = None
+    request: Request,
+    acid1: Optional[str] = None,
+    acid2: Optional[str] = None,
+    dataset: Optional[str] = None,
 ):
-    conflicts = engine.find_conflicts()
-    unique_conflicts = []
-    seen = set()
-    for c in conflicts:
-        pair = tuple(sorted([c["acid1"], c["acid2"]]))
-        if pair not in seen:
-            unique_conflicts.append(c)
-            seen.add(pair)
+    initial_analysis = None
+    if acid1 and acid2:
+        initial_analysis = {"acid1": acid1, "acid2": acid2}
+
+    name, _ = pool.resolve(dataset or pool.default)
+    engine = pool.peek(name)
+    if engine is None or not engine.conflicts_ready:
+        # Detection still to run: stream conflicts to the page as they are found
+        job = jobs.submit(
+            "load",
+            _analyze_job,
+            name,
+            False,
+            key=("load", name),
+            params={"dataset": name},
+        )
+        return templates.TemplateResponse(
+            "conflicts.html",
+            {
+                "request": request,
+                "dataset": name,
+                "conflicts": [],
+                "initial_analysis": initial_analysis,
+                "job": job.id,
+            },
+        )
+
+    unique_conflicts = await _unique_conflicts(name)
 
     if not acid1 or not acid2:
         if unique_conflicts:
             c = unique_conflicts[0]
-            return RedirectResponse(url=f"/conflicts/{c['acid1']}/{c['acid2']}")
-
-    initial_analysis = None
-    if acid1 and acid2:
-        initial_analysis = {"acid1": acid1, "acid2": acid2}
+            query = urlencode({"dataset": name})
+            return RedirectResponse(url=f"/conflicts/{c['acid1']}/{c['acid2']}?{query}")
 
     return templates.TemplateResponse(
         "conflicts.html",
         {
             "request": request,
+            "dataset": name,
             "conflicts": unique_conflicts,
             "initial_analysis": initial_analysis,
+            "job": None,
         },
     )
 
 
 @app.get("/analyze")
-async def analyze(request: Request):
-    conflicts = engine.find_conflicts()
+async def analyze(request: Request, dataset: Optional[str] = None):
     # Deduplicate and group conflicts
-    unique_conflicts = []
-    seen = set()
-    for c in conflicts:
-        pair = tuple(sorted([c["acid1"], c["acid2"]]))
-        if pair not in seen:
-            unique_conflicts.append(c)
-            seen.add(pair)
+    name, _ = pool.resolve(dataset or pool.default)
+    unique_conflicts = await _unique_conflicts(name)
 
     return templates.TemplateResponse(
-        "partials/conflicts.html", {"request": request, "conflicts": unique_conflicts}
+        "partials/conflicts.html",
+        {"request": request, "dataset": name, "conflicts": unique_conflicts},
     )
 
 
 @app.get("/flight/{acid}")
-async def flight_detail(request: Request, acid: str):
-    flight = next((f for f in engine.flights if f["ACID"] == acid), None)
+async def flight_detail(request: Request, acid: str, dataset: Optional[str] = None):
+    name, engine = await get_engine(dataset)
+    flight, _, legs, _ = await dispatcher.run(
+        "pair",
+        _pair_details,
+        engine,
+        acid,
+        acid,
+        key=(name, "details", acid, acid),
+        engine=engine,
+    )
     if not flight:
         return "Flight not found"
 
-    legs = engine.get_legs_for_flight(acid)
-
     return templates.TemplateResponse(
         "partials/flight_detail.html",
         {
             "request": request,
+            "dataset": name,
             "flight": flight,
             "legs_count": len(legs),
         },
@@ -246,7 +1124,13 @@ async def flight_detail(request: Request, acid: str):
 
 @app.get("/flight-image")
 async def flight_image(request: Request, plane_type: str):
-    image_url = spotter.get_image(plane_type)
+    # Network fetch on a miss, shared with concurrent requests for the type
+    try:
+        image_url = await asyncio.wait_for(
+            spotter.get_image(plane_type), IMAGE_DEADLINE_SEC
+        )
+    except asyncio.TimeoutError:
+        image_url = None
     return templates.TemplateResponse(
         "partials/aircraft_image.html",
         {
@@ -0,0 +1,181 @@
+"""Engine benchmarks on synthetic traffic.
+
+    python -m benchmarks.bench_engine                      # 1k and 10k flights
+    python -m benchmarks.bench_engine --scales 1000 100000 --day-scales 10000
+    python -m benchmarks.bench_engine --update-baseline
+
+Results are written as JSON (``--out``). Each timing is compared with
+``benchmarks/baseline.json``; the run exits with status 1 when any
+operation is slower than ``--tolerance`` times its baseline. Baselines are
+machine and interpreter specific: refresh them with ``--update-baseline``
+on the machine and Python version that run the check.
+
+The synthetic schedule spreads departures over more days as ``n`` grows,
+so the plain scales keep traffic density roughly constant. Each of
+``--day-scales`` is also run with all of its flights in a single day
+(reported as ``<n>/day``), where density, and so the conflict count,
+grows with ``n``.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import numpy as np
+from app.engine.traffic import DAY_SPAN_SEC, write_flights
+from app.engine.trajectory import FlightEngine
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+DEFAULT_SCALES = (1000, 10000)
+DEFAULT_DAY_SCALES = (10000,)
+
+# Timings below this many seconds over baseline are treated as noise
+MIN_DELTA_SEC = 0.005
+
+
+def _best(fn, repeats, setup=None):
+    """Best wall time of ``repeats`` calls, in seconds."""
+    best = float("inf")
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _per_call(fn, args_list):
+    """Mean seconds per call over ``args_list``."""
+    if not args_list:
+        return None
+    start = time.perf_counter()
+    for args in args_list:
+        fn(*args)
+    return (time.perf_counter() - start) / len(args_list)
+
+
+def bench_scale(n, seed=0, repeats=3, span_sec=None):
+    """Timings (seconds) of the engine's main operations on ``n`` flights.
+
+    ``span_sec`` fixes the departure window (see ``generate_flights``).
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_flights(os.path.join(tmp, "flights.json"), n, seed, span_sec)
+        engine = FlightEngine(path)
+
+    def reset_conflicts():
+        engine._cached_conflicts = None
+        engine._index = None
+
+    def reset_stats():
+        engine._cached_stats = None
+        engine._aggregates = None
+
+    results = {
+        "precalculate_legs": _best(engine._precalculate_legs, repeats),
+        "find_conflicts": _best(engine.find_conflicts, repeats, reset_conflicts),
+    }
+    conflicts = engine.find_conflicts()
+    # Conflicts stay cached: this times the stats themselves
+    results["get_stats"] = _best(engine.get_stats, repeats, reset_stats)
+
+    pairs = list(dict.fromkeys((c["acid1"], c["acid2"]) for c in conflicts))
+    store = engine.store
+    results["check_pair_conflict"] = _per_call(
+        engine.check_pair_conflict,
+        [(store.get(a), store.get(b)) for a, b in pairs[:100]],
+    )
+    results["propose_resolutions"] = _per_call(engine.propose_resolutions, pairs[:10])
+    results["conflicts"] = len(conflicts)
+    return results
+
+
+def run(scales, seed=0, repeats=3, day_scales=()):
+    results = {str(n): bench_scale(n, seed, repeats) for n in scales}
+    for n in day_scales:
+        results[f"{n}/day"] = bench_scale(n, seed, repeats, DAY_SPAN_SEC)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "platform": platform.platform(),
+            "seed": seed,
+            "repeats": repeats,
+            "time": int(time.time()),
+        },
+        "results": results,
+    }
+
+
+def compare_to_baseline(report, baseline, tolerance=2.0, min_delta=MIN_DELTA_SEC):
+    """Operations slower than ``tolerance`` x baseline.
+
+    Returns a list of (scale, operation, seconds, baseline seconds). Scales
+    and operations missing from either side are skipped.
+    """
+    regressions = []
+    for scale, timings in report["results"].items():
+        base = baseline.get("results", {}).get(scale, {})
+        for op, seconds in timings.items():
+            ref = base.get(op)
+            if op == "conflicts" or seconds is None or ref is None:
+                continue
+            if seconds > ref * tolerance and seconds - ref > min_delta:
+                regressions.append((scale, op, seconds, ref))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES)
+    parser.add_argument("--day-scales", type=int, nargs="*", default=DEFAULT_DAY_SCALES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=2.0)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    report = run(args.scales, args.seed, args.repeats, args.day_scales)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for scale, timings in report["results"].items():
+        for op, seconds in timings.items():
+            if op != "conflicts" and seconds is not None:
+                print(f"{scale:>9} flights  {op:<20} {seconds * 1000:10.2f} ms")
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    recorded = baseline.get("meta", {}).get("python", "")
+    if recorded.split(".")[:2] != platform.python_version().split(".")[:2]:
+        print(
+            f"WARNING baseline recorded on Python {recorded or '?'}, running "
+            f"{platform.python_version()}; refresh it with --update-baseline"
+        )
+    regressions = compare_to_baseline(report, baseline, args.tolerance)
+    for scale, op, seconds, ref in regressions:
+        print(
+            f"REGRESSION {scale} flights {op}: {seconds * 1000:.2f} ms "
+            f"vs baseline {ref * 1000:.2f} ms"
+        )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
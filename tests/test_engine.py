@@ -1,6 +1,53 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
 import pytest
 import numpy as np
-from app.engine.trajectory import haversine, interpolate_position, Leg, FlightEngine
+from app.engine.trajectory import (
+    AIRPORTS,
+    haversine,
+    interpolate_position,
+    Leg,
+    FlightEngine,
+)
+from app.engine.broadphase import SpatioTemporalIndex
+from app.engine.congestion import airborne_intervals, peak_occupancy
+from app.engine.dispatch import DeadlineExceeded, EngineDispatcher
+from app.engine import metrics
+from app.engine.aggregates import StatsAggregator, aircraft_class
+from app.engine.geometry import (
+    GreatCircleMotion,
+    haversine_vec,
+    interpolate_position_vec,
+)
+from app.engine.image_cache import HASHED_NAME, ImageCache
+from app.engine.intervals import IntervalIndex
+from app.engine.jobs import JobManager, JobNotFound
+from app.engine.legs import LegTable
+from app.engine.pairs import cross_rows, evaluate_pairs
+from app.engine.parallel import evaluate_pairs_parallel
+from app.engine.polylines import mercator, zoom_tolerance
+from app.engine.pool import DatasetNotFound, EnginePool, next_day_name
+from app.engine.resolver import plan_resolutions
+from app.engine.response_cache import (
+    ResponseCache,
+    dump_json,
+    pack_conflict_data,
+    pack_trajectories,
+    unpack_conflict_data,
+    unpack_trajectories,
+)
+from app.engine.result_cache import ResultCache
+from app.engine.snapshot import iter_json_array
+from app.engine.spotter import IMAGES_URL, SpotterEngine
+from app.engine.traffic import generate_flights, write_flights
+from benchmarks.bench_engine import compare_to_baseline
 
 
 def test_haversine():
@@ -30,6 +77,42 @@ def test_leg_initialization():
     )  # Latitude increasing (index 1 in p0 is lat) - wait Leg uses [lon, lat]
 
 
+def test_vectorized_geometry_matches_scalar():
+    lat1 = np.array([43.68, 45.0, 49.19])
+    lon1 = np.array([-79.63, -75.2, -123.18])
+    lat2 = np.array([49.19, 45.0, 53.31])
+    lon2 = np.array([-123.18, -74.8, -113.58])
+    frac = np.array([0.25, 0.5, 0.7])
+
+    dists = haversine_vec(lat1, lon1, lat2, lon2)
+    lats, lons = interpolate_position_vec(lat1, lon1, lat2, lon2, frac)
+    for k in range(3):
+        assert dists[k] == pytest.approx(haversine(lat1[k], lon1[k], lat2[k], lon2[k]))
+        lat, lon = interpolate_position(lat1[k], lon1[k], lat2[k], lon2[k], frac[k])
+        assert lats[k] == pytest.approx(lat)
+        assert lons[k] == pytest.approx(lon)
+
+
+def test_leg_table_matches_route():
+    engine = FlightEngine("data/canadian_flights_250.json")
+    table = LegTable.from_flights(engine.flights, engine.airport_coords)
+    assert len(table.offsets) == len(engine.flights) + 1
+
+    for idx in (0, 17, 249):
+        flight = engine.flights[idx]
+        points = engine.get_full_route(flight)
+        legs = table.flight_legs(idx)
+        assert len(legs) == len(points) - 1
+        assert legs[0].t0 == flight["departure time"]
+        for leg, p0, p1 in zip(legs, points, points[1:]):
+            assert leg.acid == flight["ACID"]
+            assert (leg.start_lat, leg.start_lon) == pytest.approx(p0)
+            assert (leg.end_lat, leg.end_lon) == pytest.approx(p1)
+            assert leg.to_dict()["dist"] == pytest.approx(haversine(*p0, *p1))
+        for prev, nxt in zip(legs, legs[1:]):
+            assert nxt.t0 == prev.t1
+
+
 def test_analytical_time_slice():
     # Head-on collision course
     # Plane A at 30,000ft, Plane B at 30,000ft
@@ -76,3 +159,950 @@ def test_analytical_time_slice():
     # Time = 10 NM / 0.166 NM/sec = 60 seconds
     assert 55 < conflict["duration"] < 65
     assert len(conflict["intervals"]) == 1
+
+
+@pytest.mark.parametrize("method", ["exact", "bisect"])
+def test_broadphase_keeps_all_conflicting_pairs(method):
+    engine = FlightEngine("data/canadian_flights_250.json")
+    legs = engine.legs
+    index = SpatioTemporalIndex(
+        legs.t0,
+        legs.t1,
+        legs.alt,
+        legs.lat0,
+        legs.lon0,
+        legs.lat1,
+        legs.lon1,
+        legs.flight,
+        geodesic=method == "exact",
+    )
+    candidates = set(zip(*(p.tolist() for p in index.flight_pairs())))
+
+    # Brute force over every flight pair
+    first, second = np.triu_indices(len(engine.flights), k=1)
+    rows_a, rows_b, k = cross_rows(legs.offsets, first, legs.offsets, second)
+    _, _, found = evaluate_pairs(legs, rows_a, legs, rows_b, method=method)
+    conflicting = set(zip(first[k[found]].tolist(), second[k[found]].tolist()))
+    assert conflicting
+    assert conflicting <= candidates
+
+
+def test_batch_evaluator_matches_pairwise_check():
+    engine = FlightEngine("data/canadian_flights_250.json")
+    for c in engine.find_conflicts()[:10]:
+        f1 = next(f for f in engine.flights if f["ACID"] == c["acid1"])
+        f2 = next(f for f in engine.flights if f["ACID"] == c["acid2"])
+        assert engine.check_pair_conflict(f1, f2) == c["intervals"]
+        data = engine.get_conflict_pair_data(c["acid1"], c["acid2"])
+        assert data["intervals"] == c["intervals"]
+
+
+def test_update_flight_matches_full_recompute():
+    engine = FlightEngine("data/canadian_flights_250.json")
+    engine.get_stats()
+    conflict = engine.find_conflicts()[3]
+    acid = conflict["acid1"]
+    flight = next(f for f in engine.flights if f["ACID"] == acid)
+    changes = {
+        "departure_time": flight["departure time"] + 300,
+        "altitude": flight["altitude"] + 2000,
+    }
+
+    assert engine.update_flight(acid, changes)
+    incremental = engine.find_conflicts()
+    incremental_stats = dict(engine.get_stats())
+
+    fresh = FlightEngine("data/canadian_flights_250.json")
+    fresh.update_flight(acid, changes)
+    assert incremental == fresh.find_conflicts()
+    assert incremental_stats == fresh.get_stats()
+    assert not engine.update_flight("NOPE000", changes)
+
+
+def test_flight_store_indexes():
+    engine = FlightEngine("data/canadian_flights_250.json")
+    store = engine.store
+    flight = engine.flights[42]
+
+    assert store.get(flight["ACID"]) is flight
+    assert store.get("NOPE000") is None
+    assert flight in store.departing(flight["departure airport"])
+    assert flight in store.arriving(flight["arrival airport"])
+    assert flight in store.by_airline(flight["ACID"][:3])
+    assert len(store.leg_rows(flight["ACID"])) == len(
+        engine.get_legs_for_flight(flight["ACID"])
+    )
+
+    t = flight["departure time"]
+    window = store.departing_between(t, t + 1)
+    assert flight in window
+    assert all(f["departure time"] == t for f in window)
+
+    engine.update_flight(flight["ACID"], {"departure_time": t + 3600})
+    assert flight not in store.departing_between(t, t + 1)
+    assert flight in store.departing_between(t + 3600, t + 3601)
+
+
+def test_parallel_detection_matches_serial():
+    serial = FlightEngine("data/canadian_flights_250.json")
+    parallel = FlightEngine("data/canadian_flights_250.json", workers=2)
+    parallel.parallel_min_pairs = 0
+    assert parallel.find_conflicts() == serial.find_conflicts()
+
+    # One pool and one shared leg block serve every call until the legs change
+    evaluator = parallel._parallel
+    executor, block = evaluator._executor, evaluator._legs_shm.name
+    parallel._cached_conflicts = None
+    assert parallel.find_conflicts() == serial.find_conflicts()
+    assert evaluator._executor is executor and evaluator._legs_shm.name == block
+    for engine in (serial, parallel):
+        engine.update_flight(serial.flights[0]["ACID"], {"altitude": 31000})
+    parallel._cached_conflicts = None
+    assert parallel.find_conflicts() == serial.find_conflicts()
+    assert evaluator._executor is executor and evaluator._legs_shm.name != block
+    parallel.close()
+    assert evaluator._executor is None and evaluator._legs_shm is None
+
+    legs = serial.legs
+    rows_a, rows_b = serial._get_index().leg_pairs()
+    expected = evaluate_pairs(legs, rows_a, legs, rows_b)
+    chunked = evaluate_pairs_parallel(legs, rows_a, rows_b, workers=3, chunk_size=97)
+    for want, got in zip(expected, chunked):
+        assert np.array_equal(want, got)
+
+
+def test_peak_congestion_is_exact():
+    engine = FlightEngine("data/canadian_flights_250.json")
+    takeoff, landing = airborne_intervals(engine.legs)
+    peak, peak_time = peak_occupancy(takeoff, landing)
+
+    # Occupancy only changes at takeoffs, so checking each takeoff is exhaustive
+    brute = max(int(((takeoff <= t) & (t < landing)).sum()) for t in takeoff)
+    assert peak == brute
+    assert int(((takeoff <= peak_time) & (peak_time < landing)).sum()) == peak
+    assert engine.get_stats()["peak_congestion"] == peak
+
+    times, counts = engine.get_occupancy_series(step_sec=60)
+    assert counts.max() <= peak
+    assert counts[0] == 0 or times[0] <= takeoff.min()
+
+    # Back-to-back flights do not overlap
+    assert peak_occupancy(np.array([0.0, 10.0]), np.array([10.0, 20.0]))[0] == 1
+
+
+def test_snapshot_matches_json(tmp_path):
+    path = "data/canadian_flights_250.json"
+    assert list(iter_json_array(path, chunk_size=7)) == FlightEngine(path).flights
+
+    source = FlightEngine(path)
+    snap = FlightEngine(path, snapshot_dir=str(tmp_path / "snap"))
+    assert [dict(f) for f in snap.flights] == source.flights
+    for name in LegTable.COLUMNS + ("flight", "offsets"):
+        assert np.array_equal(getattr(snap.legs, name), getattr(source.legs, name))
+    assert snap.find_conflicts() == source.find_conflicts()
+    assert snap.get_stats() == source.get_stats()
+
+    # Reopening maps the existing files; fixes stay in memory
+    reopened = FlightEngine(path, snapshot_dir=str(tmp_path / "snap"))
+    acid = reopened.flights[0]["ACID"]
+    reopened.update_flight(acid, {"altitude": 36000})
+    source.update_flight(acid, {"altitude": 36000})
+    assert reopened.find_conflicts() == source.find_conflicts()
+    again = FlightEngine(path, snapshot_dir=str(tmp_path / "snap"))
+    assert again.flights[0]["altitude"] == FlightEngine(path).flights[0]["altitude"]
+
+    # Null routes and fractional times load the same both ways
+    with open(path) as f:
+        flights = json.load(f)
+    flights[0]["route"] = None
+    flights[1]["departure time"] += 0.5
+    flights[2]["departure time"] = float(flights[2]["departure time"])
+    odd = str(tmp_path / "odd.json")
+    with open(odd, "w") as f:
+        json.dump(flights, f)
+    source = FlightEngine(odd)
+    snap = FlightEngine(odd, snapshot_dir=str(tmp_path / "odd"))
+    assert [dict(f) for f in snap.flights] == source.flights
+    assert snap.flights[1]["departure time"] == flights[1]["departure time"]
+    assert isinstance(snap.flights[2]["departure time"], int)
+    assert snap._results_cache_key() == source._results_cache_key()
+    acid = snap.flights[3]["ACID"]
+    departure = snap.flights[3]["departure time"] + 30.25
+    snap.update_flight(acid, {"departure_time": departure})
+    assert snap.store.get(acid)["departure time"] == departure
+
+
+def test_results_persist_across_restarts(tmp_path, monkeypatch):
+    path = "data/canadian_flights_250.json"
+    first = FlightEngine(path, cache_dir=str(tmp_path))
+    stats = first.get_stats()
+    conflicts = first.find_conflicts()
+
+    # A restart on the same data never runs detection
+    def fail(*args):
+        raise AssertionError("conflicts were recomputed")
+
+    monkeypatch.setattr(FlightEngine, "_conflicts_from_leg_pairs", fail)
+    restarted = FlightEngine(path, cache_dir=str(tmp_path))
+    assert restarted.find_conflicts() == conflicts
+    assert restarted.get_stats() == stats
+    monkeypatch.undo()
+
+    # Different data gets a different key
+    other = FlightEngine("data/canadian_flights_1000.json", cache_dir=str(tmp_path))
+    assert other._results_cache_key() != restarted._results_cache_key()
+
+    cache = ResultCache(str(tmp_path / "lru"), max_entries=2)
+    for key in "abc":
+        cache.put(key, key)
+    assert cache.get("a") is None
+    assert cache.get("c") == "c"
+
+
+def test_dispatcher_coalesces_and_enforces_deadlines():
+    calls = []
+
+    def slow(x):
+        calls.append(threading.current_thread().name)
+        time.sleep(0.05)
+        return x * 2
+
+    async def scenario():
+        dispatcher = EngineDispatcher(max_workers=2, limits={"slow": 1})
+        # Identical in-flight calls run once and share the result
+        results = await asyncio.gather(
+            *(dispatcher.run("slow", slow, 21, key="same") for _ in range(5))
+        )
+        assert results == [42] * 5
+        assert len(calls) == 1 and calls[0].startswith("engine")
+        assert dispatcher.in_flight() == 0
+
+        # The op limit queues the second call past a short deadline
+        with pytest.raises(DeadlineExceeded):
+            await asyncio.gather(
+                dispatcher.run("slow", slow, 1, key="a"),
+                dispatcher.run("slow", slow, 2, key="b", timeout=0.02),
+            )
+        dispatcher.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_dispatcher_locks_each_engine_separately():
+    class Engine:
+        pass
+
+    def double(x):
+        return x * 2
+
+    async def scenario():
+        dispatcher = EngineDispatcher(max_workers=4)
+        busy, idle = Engine(), Engine()
+        # A write queued behind a reader of one engine holds back new readers
+        # of that engine only
+        dispatcher.lock_for(busy).acquire_read()
+        write = asyncio.ensure_future(
+            dispatcher.run("apply", double, 3, engine=busy, write=True)
+        )
+        await asyncio.sleep(0.05)
+        assert await dispatcher.run("read", double, 4, engine=idle, timeout=1) == 8
+        with pytest.raises(DeadlineExceeded):
+            await dispatcher.run("read", double, 5, engine=busy, timeout=0.05)
+        assert not write.done()
+        dispatcher.lock_for(busy).release_read()
+        assert await asyncio.wait_for(write, 1) == 6
+        dispatcher.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_resolution_validation_checks_all_traffic():
+    engine = FlightEngine("data/canadian_flights_250.json")
+    c = engine.find_conflicts()[0]
+    f1 = engine.store.get(c["acid1"])
+    candidates = []
+    for delay in (0, 120, 600):
+        candidate = f1.copy()
+        candidate["departure time"] += delay
+        candidates.append(candidate)
+
+    _, blocking = engine._validate_candidates(
+        engine.store.index_of(c["acid1"]), candidates
+    )
+    safe = blocking == 0
+    others = [f for f in engine.flights if f["ACID"] != c["acid1"]]
+    for candidate, ok in zip(candidates, safe):
+        assert ok == (not any(engine.check_pair_conflict(candidate, f) for f in others))
+    # The unchanged schedule still conflicts
+    assert not safe[0]
+
+
+def test_resolution_plan_clears_conflicts():
+    engine = FlightEngine("data/canadian_flights_250.json")
+    before = engine.find_conflicts()
+    plan = plan_resolutions(engine, time_budget_sec=30)
+    assert engine.find_conflicts() == before  # planning works on a fork
+    assert plan["conflicts_after"] < plan["conflicts_before"] / 10
+
+    for change in plan["changes"]:
+        flight = engine.store.get(change["acid"])
+        limits = engine.get_constraints(flight["Plane type"])
+        if change["altitude_change"]:
+            assert limits["min_alt"] <= change["altitude"] <= limits["max_alt"]
+        engine.update_flight(change["acid"], change)
+
+    remaining = {
+        tuple(sorted((c["acid1"], c["acid2"]))) for c in engine.find_conflicts()
+    }
+    assert remaining == set(plan["unresolved"])
+
+
+def test_hotspot_cube_matches_brute_force():
+    engine = FlightEngine("data/canadian_flights_250.json")
+    conflicts = engine.find_conflicts()
+    cube = engine.get_hotspot_cube()
+    assert engine.get_hotspot_cube() is cube
+
+    everything = cube.query()
+    assert everything["count"].sum() == len(conflicts)
+
+    t = conflicts[len(conflicts) // 2]["time"]
+    start, end = t - 1800, t + 1800
+    bbox = (-100.0, 43.0, -70.0, 50.0)
+    cells = cube.query(start, end, bbox)
+    # Whole buckets and cells are selected
+    lo = np.floor(start / cube.bucket_sec) * cube.bucket_sec
+    hi = (np.floor(end / cube.bucket_sec) + 1) * cube.bucket_sec
+    deg = cube.cell_deg
+    expected = [
+        c
+        for c in conflicts
+        if lo <= c["time"] < hi
+        and np.floor((bbox[0] + 180) / deg) <= np.floor((c["lon"] + 180) / deg)
+        and np.floor((c["lon"] + 180) / deg) <= np.floor((bbox[2] + 180) / deg)
+        and np.floor((bbox[1] + 90) / deg) <= np.floor((c["lat"] + 90) / deg)
+        and np.floor((c["lat"] + 90) / deg) <= np.floor((bbox[3] + 90) / deg)
+    ]
+    assert cells["count"].sum() == len(expected) > 0
+    assert np.isclose(
+        cells["weight"].sum(), sum(max(0.1, (5 - c["dist"]) / 5) for c in expected)
+    )
+
+    # Changing the schedule rebuilds the cube from the new conflicts
+    engine.update_flight(conflicts[0]["acid1"], {"altitude": 45000})
+    assert engine.get_hotspot_cube() is not cube
+    assert engine.get_hotspot_cube().query()["count"].sum() == len(
+        engine.find_conflicts()
+    )
+
+
+def test_interval_index_matches_brute_force():
+    rng = np.random.default_rng(7)
+    start = rng.uniform(0, 86400, 5000).round()
+    end = start + rng.exponential(3000, 5000).round()
+    index = IntervalIndex(start, end, leaf_size=8)
+    for t0 in [-1.0, *start[:20], *end[:20], 90000.0]:
+        assert np.array_equal(index.at(t0), np.nonzero((start <= t0) & (end >= t0))[0])
+        t1 = t0 + rng.uniform(0, 5000)
+        expected = np.nonzero((start <= t1) & (end >= t0))[0]
+        assert np.array_equal(index.overlapping(t0, t1), expected)
+    assert len(IntervalIndex([], []).overlapping(0, 1)) == 0
+
+
+def test_time_window_queries():
+    engine = FlightEngine("data/canadian_flights_250.json")
+    takeoff, landing = airborne_intervals(engine.legs)
+    conflicts = engine.find_conflicts()
+    t = conflicts[len(conflicts) // 2]["time"]
+
+    positions = engine.airspace_at(t)
+    airborne = [
+        i
+        for i in range(len(engine.flights))
+        if any(leg.t0 <= t <= leg.t1 for leg in engine.legs.flight_legs(i))
+    ]
+    assert positions["flight"].tolist() == airborne
+    i = airborne[0]
+    trajectory = engine.calculate_trajectory(engine.flights[i], interval_sec=1)
+    point = min(trajectory, key=lambda p: abs(p["time"] - t))
+    assert abs(point["lat"] - positions["lat"][0]) < 0.05
+
+    flights, _, _ = engine.flights_between(t, t + 600)
+    assert (
+        flights.tolist()
+        == np.nonzero((takeoff <= t + 600) & (landing >= t))[0].tolist()
+    )
+
+    window = engine.conflicts_between(t, t + 600)
+    assert window == [
+        c for c in conflicts if any(s <= t + 600 and e >= t for s, e in c["intervals"])
+    ]
+
+    # Schedule changes rebuild the indexes
+    engine.update_flight(engine.flights[i]["ACID"], {"departure_time": 0})
+    assert i not in engine.airspace_at(t)["flight"].tolist()
+
+
+def test_response_cache_versions_and_binary_legs():
+    engine = FlightEngine("data/canadian_flights_250.json")
+    c = engine.find_conflicts()[0]
+    data = engine.get_conflict_pair_data(c["acid1"], c["acid2"])
+    packed = pack_conflict_data(data)
+    assert unpack_conflict_data(packed) == data
+    assert len(packed) < len(dump_json(data))
+
+    cache = ResponseCache(max_entries=2)
+    entry = cache.put("pair", engine.version, dump_json(data))
+    assert cache.get("pair", engine.version) is entry
+    assert entry.matches(entry.etag) and not entry.matches('"other"')
+    assert entry.gzipped is None or len(entry.gzipped) < len(entry.body)
+
+    # A schedule change bumps the version and retires old bodies
+    engine.update_flight(c["acid1"], {"altitude": 45000})
+    assert cache.get("pair", engine.version) is None
+    fresh = cache.put("pair", engine.version, dump_json(data))
+    assert fresh.etag != entry.etag
+
+
+def test_generated_traffic_is_seeded_and_valid():
+    flights = generate_flights(2000, seed=7)
+    assert flights == generate_flights(2000, seed=7)
+    assert flights != generate_flights(2000, seed=8)
+    assert len({f["ACID"] for f in flights}) == len(flights)
+    for f in flights:
+        limits = FlightEngine.get_constraints(f["Plane type"])
+        assert limits["min_alt"] <= f["altitude"] <= limits["max_alt"]
+        assert f["departure airport"] != f["arrival airport"]
+        assert f["is_cargo"] == (f["passengers"] == 0)
+
+    legs = LegTable.from_flights(flights, AIRPORTS)
+    assert len(legs) == sum(len(f["route"].split()) + 1 for f in flights)
+
+
+def test_benchmark_baseline_check():
+    baseline = {"results": {"1000": {"find_conflicts": 0.040, "conflicts": 261}}}
+    fast = {"results": {"1000": {"find_conflicts": 0.050, "conflicts": 261}}}
+    slow = {"results": {"1000": {"find_conflicts": 0.120, "conflicts": 261}}}
+    assert compare_to_baseline(fast, baseline) == []
+    assert compare_to_baseline(slow, baseline) == [
+        ("1000", "find_conflicts", 0.120, 0.040)
+    ]
+
+
+def test_metrics_count_detection_and_render(tmp_path):
+    engine = FlightEngine("data/canadian_flights_250.json")
+    considered = metrics.PAIRS.value(stage="considered")
+    detections = metrics.PHASE_SECONDS.count(phase="detection")
+    engine.find_conflicts()
+
+    stages = {
+        s: metrics.PAIRS.value(stage=s)
+        for s in ("considered", "pruned_time", "pruned_altitude")
+        + ("pruned_screen", "refined")
+    }
+    assert stages["considered"] > considered
+    # Every considered pair lands in exactly one stage
+    assert stages["considered"] == sum(
+        v for k, v in stages.items() if k != "considered"
+    )
+    assert metrics.PHASE_SECONDS.count(phase="detection") == detections + 1
+
+    text = metrics.REGISTRY.render()
+    assert 'plannav_leg_pairs_total{stage="refined"}' in text
+    assert 'plannav_engine_phase_seconds_bucket{phase="detection",le="+Inf"}' in text
+
+    # Only calls over the threshold leave a profile behind
+    profiler = metrics.SlowCallProfiler(slow_ms=20, directory=str(tmp_path))
+    assert profiler.call("fast", lambda x: x + 1, 1) == 2
+    assert profiler.call("slow", time.sleep, 0.03) is None
+    assert [p.name.split("-")[0] for p in tmp_path.iterdir()] == ["slow"]
+
+
+def test_exact_separation_agrees_with_bisection():
+    engine = FlightEngine("data/canadian_flights_250.json")
+    legs = engine.legs
+    rows_a, rows_b = engine._get_index().leg_pairs()
+
+    # The ECEF motion follows interpolate_position_vec
+    motion = GreatCircleMotion(
+        legs.lat0, legs.lon0, legs.lat1, legs.lon1, legs.t0, legs.duration
+    )
+    t = legs.t0 + 0.37 * legs.duration
+    lat, lon = motion.lat_lon(t)
+    want = interpolate_position_vec(legs.lat0, legs.lon0, legs.lat1, legs.lon1, 0.37)
+    assert np.allclose(lat, want[0], atol=1e-9)
+    assert np.allclose(lon, want[1], atol=1e-9)
+
+    bs, be, bf = evaluate_pairs(legs, rows_a, legs, rows_b, method="bisect")
+    xs, xe, xf = evaluate_pairs(legs, rows_a, legs, rows_b, tol_sec=1e-4)
+    _, _, pf = evaluate_pairs(legs, rows_a, legs, rows_b, method="planar")
+    # Every bisection conflict is found, with the documented accuracy
+    assert np.all(xf[bf]) and xf.sum() > bf.sum()
+    overlap = np.minimum(legs.t1[rows_a], legs.t1[rows_b]) - np.maximum(
+        legs.t0[rows_a], legs.t0[rows_b]
+    )
+    bound = (overlap / 2**15 + 1e-4)[bf]
+    assert np.all(np.abs(xs - bs)[bf] <= bound)
+    assert np.all(np.abs(xe - be)[bf] <= bound)
+    assert pf.sum() > 0
+
+    # Exact intervals really are the loss of separation
+    a = rows_a[xf]
+    b = rows_b[xf]
+    for when, inside in (((xs + xe) / 2, True), (xs - 0.01, False), (xe + 0.01, False)):
+        when = when[xf]
+        t_ok = (when > np.maximum(legs.t0[a], legs.t0[b])) & (
+            when < np.minimum(legs.t1[a], legs.t1[b])
+        )
+        lat_a, lon_a = legs.position_at(a, when)
+        lat_b, lon_b = legs.position_at(b, when)
+        close = haversine_vec(lat_a, lon_a, lat_b, lon_b) < 5.0
+        assert np.all(close[t_ok] == inside)
+
+
+def test_engine_pool_loads_evicts_and_preloads(tmp_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    days = ["day_2026-01-07", "day_2026-01-08", "day_2026-01-09", "day_2026-01-10"]
+    for k, day in enumerate(days):
+        write_flights(data / f"{day}.json", 60, seed=k)
+    (tmp_path / "outside.json").write_text("[]")
+    assert next_day_name("day_2026-01-31") == "day_2026-02-01"
+    assert next_day_name("canadian_flights_250") is None
+
+    pool = EnginePool([data], days[0], cache_root=tmp_path / "cache")
+    for bad in ("missing", str(tmp_path / "outside.json"), "../outside"):
+        with pytest.raises(DatasetNotFound):
+            pool.resolve(bad)
+
+    # Loading a day preloads the next one, without chaining further
+    pool.get(days[1])
+    pool._preloads[days[2]].result(timeout=30)
+    assert [name for name, _ in pool.loaded()] == days[1:3]
+    assert pool.get(str(data / f"{days[2]}.json")) is pool.peek(days[2])
+
+    # Over budget: least recently used goes first, but never the default or
+    # an engine holding applied changes
+    pool.preload_next_day = False
+    pool.max_bytes = 0
+    evicted = []
+    pool.on_evict = lambda name, engine: evicted.append(engine)
+    engine = pool.get(days[1])
+    engine.update_flight(engine.flights[0]["ACID"], {"altitude": 30000})
+    pool.get(days[0])
+    assert [name for name, _ in pool.loaded()] == [days[1], days[0]]
+    pool.get(days[3])
+    pool.get(days[2])
+    assert [name for name, _ in pool.loaded()] == [days[1], days[0], days[2]]
+    pool.shutdown()
+    assert evicted and all(engine._parallel.closed for engine in evicted)
+    assert all(pool.peek(name)._parallel.closed for name, _ in pool.loaded())
+
+
+def test_jobs_stream_conflicts_and_cancel():
+    engine = FlightEngine("data/canadian_flights_250.json")
+    expected = FlightEngine("data/canadian_flights_250.json").find_conflicts()
+
+    gate = threading.Event()
+
+    def sweep(job):
+        gate.wait(10)
+        for conflicts, done in engine.iter_conflicts(batch_pairs=200):
+            for conflict in conflicts:
+                job.emit("conflict", conflict)
+            job.report(done)
+        return len(engine.find_conflicts())
+
+    manager = JobManager(max_workers=2)
+    job = manager.submit("analyze", sweep, key="sweep")
+    assert manager.submit("analyze", sweep, key="sweep") is job
+    gate.set()
+    deadline = time.time() + 10
+    while not job.done and time.time() < deadline:
+        time.sleep(0.01)
+    assert job.state == "done" and job.result == len(expected)
+    assert [data for _, data in job.events_since(0)] == expected
+    assert engine.conflicts_ready
+
+    # Cancellation stops the resolution search at its next progress report
+    started = threading.Event()
+
+    def plan(job):
+        def progress(fraction, message):
+            started.set()
+            time.sleep(0.05)
+            job.report(fraction, message)
+
+        return plan_resolutions(engine, 30.0, progress=progress)
+
+    job = manager.submit("plan", plan)
+    assert started.wait(10)
+    manager.cancel(job.id)
+    while not job.done and time.time() < deadline + 10:
+        time.sleep(0.01)
+    assert job.state == "cancelled" and job.result is None
+    with pytest.raises(JobNotFound):
+        manager.get("missing")
+    manager.shutdown()
+
+
+class _StandInSpotter(BaseHTTPRequestHandler):
+    """Planespotters stand-in: one photo per actype, none for "s_unknown"."""
+
+    hits = []
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.hits.append((time.monotonic(), self.path))
+            cls.active += 1
+            cls.peak = max(cls.peak, cls.active)
+        time.sleep(0.05)
+        url = urlparse(self.path)
+        if url.path == "/photo/search":
+            actype = parse_qs(url.query)["actype"][0]
+            card = (
+                ""
+                if actype == "s_unknown"
+                else f'<div class="photo-card-clickable"><img src="/img/{actype}.jpg"></div>'
+            )
+            body = f"<html><body>{card}</body></html>".encode()
+        else:
+            body = b"JPEG" + url.path.encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with cls.lock:
+            cls.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+def test_spotter_coalesces_and_rate_limits(tmp_path):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StandInSpotter)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    async def scenario():
+        spotter = SpotterEngine(
+            str(tmp_path), base_url, max_concurrent=2, min_interval=0.02
+        )
+        spotter.mapping["Mystery"] = "s_unknown"
+        # Five viewers of the same type share one fetch
+        paths = await asyncio.gather(
+            *(spotter.get_image("Airbus A320") for _ in range(5))
+        )
+        assert len(set(paths)) == 1 and paths[0].endswith(".jpg")
+        fetched = await spotter.prefetch()
+        assert await spotter.get_image("Mystery") is None
+        assert await spotter.get_image("Cessna 172") is None
+        return spotter, paths[0], fetched
+
+    try:
+        spotter, path, fetched = asyncio.run(scenario())
+    finally:
+        server.shutdown()
+
+    hits = _StandInSpotter.hits
+    searches = [p for _, p in hits if p.startswith("/photo/search")]
+    assert len(searches) == len(spotter.mapping)
+    assert sum("s_airbus-a320-200" in p for p in searches) == 1
+    assert all(fetched[t] for t in spotter.mapping if t != "Mystery")
+    assert fetched["Airbus A320"] == path
+    assert _StandInSpotter.peak <= 2
+    # Request starts are spaced out (arrival times jitter, so check the span)
+    starts = sorted(t for t, _ in hits)
+    assert starts[-1] - starts[0] >= 0.9 * 0.02 * (len(starts) - 1)
+    # Results (including misses) are remembered across restarts
+    again = SpotterEngine(str(tmp_path), base_url)
+    assert again.cache.get("Mystery")["status"] == "not_found"
+    assert again.cache.get("Cessna 172")["status"] == "error"
+    assert asyncio.run(again.get_image("Airbus A320")) == path
+
+
+def _append_entries(directory, worker, count):
+    cache = ImageCache(directory, compact_factor=1)
+    for k in range(count):
+        cache.put(f"w{worker}-{k % 7}", {"status": "success", "n": k})
+
+
+def test_image_cache_log_survives_writers_and_evicts(tmp_path):
+    directory = str(tmp_path)
+    legacy = {
+        "Old": {"status": "not_found", "last_attempt": 1.0},
+        "Slug": {"status": "success", "local_path": f"{IMAGES_URL}/s_slug.jpg"},
+        "Gone": {"status": "success", "local_path": f"{IMAGES_URL}/s_gone.jpg"},
+    }
+    with open(tmp_path / "registry.json", "w") as f:
+        json.dump(legacy, f)
+    (tmp_path / "aircraft_images").mkdir()
+    (tmp_path / "aircraft_images" / "s_slug.jpg").write_bytes(b"old image")
+    cache = ImageCache(directory, max_bytes=2500)
+    assert cache.get("Old")["status"] == "not_found"
+    assert cache.get("Gone") is None
+
+    # Slug-named legacy images are re-stored under their content hash, and
+    # only hash-named files are served as immutable
+    slug = cache.get("Slug")
+    assert HASHED_NAME.match(slug["file"])
+    assert slug["local_path"] == f"{IMAGES_URL}/{slug['file']}"
+    assert os.listdir(tmp_path / "aircraft_images") == [slug["file"]]
+    (tmp_path / "aircraft_images" / "stray.jpg").write_bytes(b"stray")
+    from fastapi.testclient import TestClient
+    from app import main
+
+    client = TestClient(main.ImmutableStaticFiles(directory=cache.images_dir))
+    assert client.get(f"/{slug['file']}").content == b"old image"
+    assert "immutable" in client.get(f"/{slug['file']}").headers["cache-control"]
+    assert "cache-control" not in client.get("/stray.jpg").headers
+    os.remove(tmp_path / "aircraft_images" / "stray.jpg")
+
+    # Processes appending (and compacting) at once lose nothing
+    ctx = multiprocessing.get_context("spawn")
+    workers = [
+        ctx.Process(target=_append_entries, args=(directory, w, 200)) for w in range(3)
+    ]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join(30)
+    entries = cache.entries()
+    assert {f"w{w}-{k}" for w in range(3) for k in range(7)} <= set(entries)
+    # Later lines win: 199 is the last k with k % 7 == 3
+    assert entries["w2-3"]["n"] == 199
+
+    # A torn line costs only itself
+    with open(tmp_path / "registry.jsonl", "ab") as f:
+        f.write(b'{"key": "broken", "entr\n')
+    cache.put("after", {"status": "error"})
+    assert ImageCache(directory).get("after")["status"] == "error"
+    assert ImageCache(directory).get("w0-0") is not None
+
+    # A reader that slept through two compactions still sees every entry,
+    # even when the second hands the log its old inode back
+    reader = ImageCache(directory)
+    cache._compact()
+    reader.entries()
+    for k in range(2):
+        cache.put("w0-0", {"status": "success", "n": "x" * 500 * (k + 1)})
+        cache._compact()
+    assert reader.entries()["w0-0"]["n"] == "x" * 1000
+
+    # Content-addressed files; least recently used evicted past max_bytes
+    names = []
+    for k in range(3):
+        name = cache.store(bytes([k]) * 1000, "JPG")
+        cache.put(f"img{k}", {"status": "success", "file": name})
+        names.append(name)
+        time.sleep(0.01)
+    assert cache.store(bytes([2]) * 1000, "jpg") == names[2]
+    assert names[0].endswith(".jpg") and len(names[0]) == 36
+    assert cache.get("img0") is None and cache.get("img1") is not None
+    assert not os.path.exists(os.path.join(cache.images_dir, names[0]))
+    assert cache.nbytes() <= 2500
+
+
+def test_flight_table_filters_and_sorts_like_brute_force():
+    engine = FlightEngine("data/canadian_flights_250.json")
+    table = engine.get_flight_table()
+    assert engine.get_flight_table() is table
+    flights = engine.flights
+    involved = {c[k] for c in engine.find_conflicts() for k in ("acid1", "acid2")}
+
+    def tod(f):
+        return f["departure time"] % 86400
+
+    queries = [
+        ({}, lambda f: True),
+        (
+            {"dep": "CYYZ", "alt_min": 30000},
+            lambda f: f["departure airport"] == "CYYZ" and f["altitude"] >= 30000,
+        ),
+        (
+            {"airport": "CYVR", "conflict": True},
+            lambda f: "CYVR" in (f["departure airport"], f["arrival airport"])
+            and f["ACID"] in involved,
+        ),
+        (
+            {"airline": "ACA", "conflict": False},
+            lambda f: f["ACID"].rstrip("0123456789") == "ACA"
+            and f["ACID"] not in involved,
+        ),
+        (
+            {"time_from": 50000, "time_to": 56000, "alt_max": 35000},
+            lambda f: 50000 <= tod(f) <= 56000 and f["altitude"] <= 35000,
+        ),
+        (
+            {"time_from": 60000, "time_to": 3600},
+            lambda f: tod(f) >= 60000 or tod(f) <= 3600,
+        ),
+        ({"type": "Airbus A320", "arr": "NOPE"}, lambda f: False),
+    ]
+    for filters, keep in queries:
+        for sort, column in (("altitude", "altitude"), ("acid", "ACID")):
+            for descending in (False, True):
+                expected = [i for i in range(len(flights)) if keep(flights[i])]
+                expected.sort(key=lambda i: flights[i][column], reverse=descending)
+                rows, total = table.query(sort, descending, 5, 10, **filters)
+                assert total == len(expected)
+                got = [flights[i][column] for i in rows.tolist()]
+                assert got == [flights[i][column] for i in expected[5:15]]
+
+    engine.update_flight(flights[0]["ACID"], {"altitude": 99000})
+    assert table.query("altitude", True, 0, 1)[0][0] != 0
+    assert engine.get_flight_table().query("altitude", True, 0, 1)[0][0] == 0
+
+
+def test_stats_aggregates_follow_updates():
+    engine = FlightEngine("data/canadian_flights_250.json")
+    stats = engine.get_stats()
+    aggregates = engine.get_aggregates()
+    for c in engine.find_conflicts()[:6]:
+        flight = engine.store.get(c["acid1"])
+        engine.update_flight(
+            c["acid1"],
+            {
+                "departure_time": flight["departure time"] + 900,
+                "altitude": flight["altitude"] + 4000,
+            },
+        )
+    assert engine.get_aggregates() is aggregates
+    assert engine.get_stats() is stats
+
+    conflicts = engine.find_conflicts()
+    fresh = StatsAggregator(engine.flights, conflicts)
+    assert aggregates.summary() == fresh.summary()
+    pairs = {frozenset((c["acid1"], c["acid2"])) for c in conflicts}
+    assert aggregates.pairs == len(pairs)
+    involved = set().union(*pairs)
+    for group in ("airport", "airline", "class"):
+        assert aggregates.grouped(group) == fresh.grouped(group)
+    for row in engine.get_grouped_stats("class"):
+        members = [
+            f for f in engine.flights if aircraft_class(f["Plane type"]) == row["key"]
+        ]
+        assert row["flights"] == len(members)
+        assert row["passengers"] == sum(f["passengers"] for f in members)
+        assert row["conflict_flights"] == sum(f["ACID"] in involved for f in members)
+    cyyz = next(r for r in engine.get_grouped_stats("airport") if r["key"] == "CYYZ")
+    assert cyyz["flights"] == sum(
+        "CYYZ" in (f["departure airport"], f["arrival airport"]) for f in engine.flights
+    )
+
+    # A refresh sweep caches a new but equal list: rebuilt once, then reused
+    for _ in engine.iter_conflicts(refresh=True):
+        pass
+    refreshed = engine.get_aggregates()
+    assert refreshed is not aggregates and engine.get_aggregates() is refreshed
+    assert refreshed.summary() == fresh.summary()
+    # Dropped aggregates take their key with them
+    engine._cached_conflicts = engine._cached_stats = None
+    engine.update_flight(conflicts[0]["acid1"], {"altitude": 33000})
+    assert engine._aggregates is None and engine._aggregates_key is None
+    assert (
+        engine.get_aggregates().summary()
+        == StatsAggregator(engine.flights, engine.find_conflicts()).summary()
+    )
+
+
+def test_trajectory_levels_of_detail_and_binary_tracks():
+    engine = FlightEngine("data/canadian_flights_250.json")
+    acids = [f["ACID"] for f in engine.flights[:20]]
+    for acid in acids:
+        track = engine.get_trajectory(acid)
+        rows = engine.legs.rows_for_flight(engine.store.index_of(acid))
+        assert track.t[0] == engine.legs.t0[rows.start]
+        assert track.t[-1] == engine.legs.t1[rows.stop - 1]
+        assert np.diff(track.t).max() <= 30.0 + 1e-6
+
+        # Samples lie on the great circle track at their time stamps
+        leg = np.searchsorted(engine.legs.t1[rows.start : rows.stop], track.t)
+        leg = np.minimum(leg, len(rows) - 1) + rows.start
+        lat, lon = engine.legs.position_at(leg, track.t)
+        np.testing.assert_allclose(track.lat, lat, atol=1e-9)
+        np.testing.assert_allclose(track.lon, lon, atol=1e-9)
+
+        # Every dropped sample stays within the tolerance of the kept line
+        x, y = mercator(track.lat, track.lon)
+        for zoom in (2, 5, 8):
+            tol = zoom_tolerance(zoom)
+            kept = np.nonzero(track.error > tol)[0]
+            assert kept[0] == 0 and kept[-1] == len(track) - 1
+            for a, b in zip(kept[:-1], kept[1:]):
+                px, py = x[a + 1 : b], y[a + 1 : b]
+                dx, dy = x[b] - x[a], y[b] - y[a]
+                f = np.clip(
+                    ((px - x[a]) * dx + (py - y[a]) * dy) / (dx * dx + dy * dy), 0, 1
+                )
+                assert np.all(np.hypot(px - x[a] - f * dx, py - y[a] - f * dy) <= tol)
+        assert len(track.simplified(zoom_tolerance(2))[0]) < len(track)
+
+    # Only the changed flight's track is rebuilt
+    first, second = (engine.get_trajectory(a) for a in acids[:2])
+    engine.update_flight(
+        acids[0], {"departure_time": engine.flights[0]["departure time"] + 600}
+    )
+    assert engine.get_trajectory(acids[1]) is second
+    moved = engine.get_trajectory(acids[0])
+    assert moved is not first
+    np.testing.assert_allclose(moved.t, first.t + 600)
+
+    tracks = [engine.get_trajectory(a).simplified(zoom_tolerance(6)) for a in acids]
+    tracks.append((np.empty(0),) * 4)
+    body = pack_trajectories(tracks)
+    assert body[:4] == b"PNT1"
+    unpacked = unpack_trajectories(body)
+    assert len(unpacked) == len(tracks) and len(unpacked[-1][0]) == 0
+    for original, restored in zip(tracks, unpacked):
+        for a, b, atol in zip(original, restored, (1e-4, 1e-4, 0.5, 0.01)):
+            np.testing.assert_allclose(a, b, atol=atol)
+
+
+def test_non_default_dataset_survives_redirect_and_apply_fix(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    from app import main
+
+    data = tmp_path / "data"
+    data.mkdir()
+    shutil.copy("data/canadian_flights_250.json", data / "base.json")
+    write_flights(str(data / "other.json"), 300, seed=7)
+    pool = EnginePool([str(data)], "base", cache_root=str(tmp_path / "cache"))
+    monkeypatch.setattr(main, "pool", pool)
+    other = pool.get("other", preload_next_day=False)
+    conflicts = other.find_conflicts()
+    assert conflicts
+    client = TestClient(main.app)
+
+    response = client.get("/conflicts?dataset=other", follow_redirects=False)
+    assert response.status_code in (302, 307)
+    location = response.headers["location"]
+    assert location.endswith("?dataset=other")
+    page = client.get(location).text
+    assert "/analyze-conflict/" in page and "?dataset=other" in page
+
+    acid1, acid2 = location.split("?")[0].split("/")[-2:]
+    analysis = client.get(f"/analyze-conflict/{acid1}/{acid2}?dataset=other").text
+    assert f"/api/resolutions/{acid1}/{acid2}?dataset=other" in analysis
+    assert "/api/apply-fix/${acid}?dataset=other" in analysis
+    assert (
+        "/api/conflict-data/${CONFIG.acid1}/${CONFIG.acid2}?dataset=${CONFIG.dataset}"
+        in analysis
+    )
+
+    altitude = other.store.get(acid1)["altitude"] + 2000
+    response = client.post(
+        f"/api/apply-fix/{acid1}?dataset=other", json={"altitude": altitude}
+    )
+    assert response.status_code == 200
+    assert other.store.get(acid1)["altitude"] == altitude
+    assert pool.peek("base") is None
+
+    version = other.version
+    response = client.post("/api/apply-fix/NOPE000?dataset=other", json={})
+    assert response.status_code == 404
+    assert other.version == version